@@ -1,7 +1,16 @@
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+
+from lodging import loader, ui
+from lodging.figcache import figure_key
+from lodging.figures import overview_figure
+from lodging.incremental import LiveStore, invalidate_years
+from lodging.metrics import cagr_labels
+from lodging.partitions import PartitionedDataset
+from lodging.prerender import ArtifactStore, area_figure, municipality_figure
+from lodging.profiling import RerunProfile
+from lodging.regions import PREFECTURE, RegionIndex, municipality_names, region_markdown
+from lodging.schema import SchemaError
+from lodging.store import METRICS
 
 # -------------------------------------------------
 # ページ設定
@@ -15,13 +24,57 @@ st.set_page_config(
 # -------------------------------------------------
 # データ読み込み
 # -------------------------------------------------
-@st.cache_data
-def load_data():
+# 組み立て済みの図とデータテーブル用の集計表（全セッション共有の LRU）
+figures = ui.figure_cache()
+tables = ui.table_cache()
+
+# 再実行ごとの計測（URL に ?debug=1 を付けたときだけ）。
+# 環境変数 LODGING_PROFILE_LOG があれば記録を JSON Lines で追記する
+profile = RerunProfile(enabled="debug" in st.query_params)
+profile.watch("figures", figures)
+profile.watch("tables", tables)
+profile.watch("arrow_cache", loader.ARROW_CACHE)
+PROFILE_LABEL = "🛠️ 再実行の計測"
+
+# 都道府県 × 指標のパーティション（partitions/ があれば都道府県を選べる）。
+# 開かれた都道府県のストアだけを LRU で保持する
+@st.cache_resource
+def get_dataset():
+    return PartitionedDataset("partitions", max_prefectures=8)
+
+dataset = get_dataset()
+prefectures = dataset.prefectures()
+
+# 市町村 × 年の行列ストア（全セッション共有・読み取り専用）。
+# 初回だけ CSV を Arrow キャッシュへ変換し、以降はメモリマップで読む。
+# 増減数・前回比・CAGR などの派生指標もストアと一緒にキャッシュされる。
+# CSV に新しい年が追加されると、その年の分だけを取り込み、
+# その年にかかる図と表のキャッシュだけを捨てる。
+# 読み込み時にスキーマ（型・(市町村, 年) の重複・エリア定義の市町村）を検査する
+@st.cache_resource
+def get_live_store():
+    live = LiveStore(".", required=RegionIndex.build().municipalities)
+    live.subscribe(lambda first_year: invalidate_years(figures, first_year))
+    live.subscribe(lambda first_year: invalidate_years(tables, first_year))
+    return live
+
+if prefectures:
+    prefecture = st.sidebar.selectbox(
+        "都道府県を選択してください", prefectures,
+        index=prefectures.index(PREFECTURE) if PREFECTURE in prefectures else 0,
+    )
+    # 沖縄県はエリア定義の市町村がそろっているかも確かめる
+    required = RegionIndex.build().municipalities if prefecture == PREFECTURE else ()
+    try:
+        with profile.stage("load_data"):
+            store = dataset.store(prefecture, required=required)
+    except SchemaError as exc:
+        st.error(f"{prefecture}のパーティションを読み込めません。\n\n{exc}")
+        st.stop()
+    source = ("partitions", prefecture)
+else:
     try:
-        facilities = pd.read_csv("facilities_long.csv")
-        rooms      = pd.read_csv("rooms_long.csv")
-        capacity   = pd.read_csv("capacity_long.csv")
-        return facilities, rooms, capacity
+        live = get_live_store()
     except FileNotFoundError:
         st.error(
             "CSV ファイルが見つかりません。\n"
@@ -29,264 +82,238 @@ def load_data():
             "同じディレクトリにあることを確認してください。"
         )
         st.stop()
-
-facilities, rooms, capacity = load_data()
-
-# -------------------------------------------------
-# 増減数を計算（キャッシュ品を汚染しないよう copy()）
-# -------------------------------------------------
-def calculate_metrics(df: pd.DataFrame, col: str) -> pd.DataFrame:
-    df = df.copy()
-    df["増減数"] = (
-        df.groupby("市町村")[col]
-          .diff()
-          .fillna(0)
-          .astype(int)
-    )
-    return df
-
-facilities = calculate_metrics(facilities, "軒数")
-rooms      = calculate_metrics(rooms,      "客室数")
-capacity   = calculate_metrics(capacity,   "収容人数")
+    except SchemaError as exc:
+        st.error(f"CSV ファイルを読み込めません。\n\n{exc}")
+        st.stop()
+    prefecture = PREFECTURE
+    profile.watch("live_store", live.stats)
+    with profile.stage("load_data"):
+        store = live.refresh()
+    if live.error:
+        st.warning(f"更新された CSV に問題があるため、前回のデータを表示しています。\n\n{live.error}")
+    source = ("csv", live.version)
+
+# 県 → エリア → 市町村の階層とエリア合計（エリア定義があるのは沖縄県のみ）。
+# 市町村の値から一括集計し、CSV 側の集計行と食い違う箇所を控えておく
+@st.cache_resource(max_entries=4)
+def get_regions(_store, source: tuple):
+    index = RegionIndex.build()
+    region_store = index.rollup(_store)
+    return index, region_store, index.verify(_store, region_store)
+
+if prefecture == PREFECTURE:
+    with profile.stage("regions"):
+        region_index, region_store, region_mismatches = get_regions(store, source)
+else:
+    region_index, region_store, region_mismatches = None, None, []
+
+# 事前描画済みの図と表（python -m lodging.prerender で作る）。
+# 今のデータと指紋が一致する版だけを使い、無いものはその場で計算する
+@st.cache_resource(max_entries=4, ttl=60)
+def get_artifacts(fingerprint: str):
+    return ArtifactStore.open("artifacts", "app", fingerprint)
+
+artifacts = get_artifacts(store.fingerprint)
+profile.watch("artifacts", artifacts.stats)
+
+# st.fragment と同じ（フラグメントだけの再実行はその回を別に計測する）
+fragment = ui.profiled_fragment(profile, PROFILE_LABEL, app="app.py", prefecture=prefecture)
+
+def cagr_caption(element: str, names: list[str], years: tuple[int, int],
+                 source=store) -> None:
+    parts = cagr_labels(source, element, names, years)
+    if parts:
+        st.caption(f"年平均成長率（{years[0]}–{years[1]} 年）: " + "、".join(parts))
 
 # -------------------------------------------------
 # 画面タイトル
 # -------------------------------------------------
-st.title("🏨 沖縄県宿泊施設データ可視化アプリ")
+st.title(f"🏨 {prefecture}宿泊施設データ可視化アプリ")
 st.markdown("---")
 
 # -------------------------------------------------
 # サイドバー
 # -------------------------------------------------
+# ここで選ぶのは全セクションに効く期間と要素だけ。エリア・市町村の選択は
+# 各セクションのフラグメント内に置き、変えてもそのセクションだけを再実行する
 st.sidebar.header("📊 データ選択")
 
-regions = ["南部", "中部", "北部", "宮古", "八重山", "離島"]
-municipalities = sorted([
-    m for m in facilities["市町村"].unique()
-    if m not in regions and m != "沖縄県"
-])
+regions = list(region_index.regions) if region_index else []
+municipalities = municipality_names(store.names, prefecture)
 
-selected_regions = st.sidebar.multiselect(
-    "エリアを選択してください", regions, default=[]
-)
-selected_municipalities = st.sidebar.multiselect(
-    "市町村を選択してください", municipalities, default=[]
-)
 years = st.sidebar.slider(
     "期間を選択してください",
-    int(facilities["年"].min()),
-    int(facilities["年"].max()),
-    value=(2007, 2023)
+    int(store.years[0]),
+    int(store.years[-1]),
+    value=(max(2007, int(store.years[0])), int(store.years[-1]))
 )
 elements = st.sidebar.multiselect(
     "要素を選択してください",
-    ["軒数", "客室数", "収容人数"],
+    list(METRICS),
     default=["軒数"]
 )
+trend = ui.trend_sidebar()
 
 # -------------------------------------------------
-# 沖縄県全体の状況
+# 都道府県全体の状況
 # -------------------------------------------------
-st.header("📈 沖縄県全体の状況")
-
-okinawa_facilities = facilities[facilities["市町村"] == "沖縄県"].sort_values("年")
-okinawa_rooms      = rooms[rooms["市町村"] == "沖縄県"].sort_values("年")
-okinawa_capacity   = capacity[capacity["市町村"] == "沖縄県"].sort_values("年")
-
-if not okinawa_facilities.empty:
-    latest_year       = okinawa_facilities["年"].max()
-    latest_facilities = okinawa_facilities.loc[
-        okinawa_facilities["年"] == latest_year, "軒数"
-    ].iat[0]
-    latest_rooms      = okinawa_rooms.loc[
-        okinawa_rooms["年"] == latest_year, "客室数"
-    ].iat[0]
-    latest_capacity   = okinawa_capacity.loc[
-        okinawa_capacity["年"] == latest_year, "収容人数"
-    ].iat[0]
+# CSV に県合計の行が無ければ市町村からの集計を使う
+pref_source = store if prefecture in store.row or region_store is None else region_store
 
-    # ---------- メトリクス ----------
-    c1, c2, c3 = st.columns(3)
-    c1.metric("総施設数（2023年）", f"{latest_facilities:,} 軒")
-    c2.metric("総客室数（2023年）", f"{latest_rooms:,} 室")
-    c3.metric("総収容人数（2023年）", f"{latest_capacity:,} 人")
+@fragment
+def overview_section():
+    st.header(f"📈 {prefecture}全体の状況")
+    if prefecture not in pref_source.row:
+        return
 
-    # ---------- グラフ ----------
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
-
-    # 客室数
-    fig.add_trace(
-        go.Bar(
-            x=okinawa_rooms["年"],
-            y=okinawa_rooms["客室数"],
-            name="客室数（室）",
-            marker_color="lightblue",
-            opacity=0.7,
-        ),
-        secondary_y=False,
-    )
+    pref_row    = pref_source.row[prefecture]
+    latest_year = int(pref_source.years[-1])
 
-    # 収容人数
-    fig.add_trace(
-        go.Bar(
-            x=okinawa_capacity["年"],
-            y=okinawa_capacity["収容人数"],
-            name="収容人数（人）",
-            marker_color="cornflowerblue",
-            opacity=0.7,
-        ),
-        secondary_y=False,
-    )
+    def latest(col: str, unit: str) -> tuple[str, str]:
+        value = pref_source.values[col][pref_row, -1]
+        delta = pref_source.deltas[col][pref_row, -1]
+        return f"{value:,.0f} {unit}", f"{delta:+,.0f} {unit}"
 
-    # 軒数
-    fig.add_trace(
-        go.Scatter(
-            x=okinawa_facilities["年"],
-            y=okinawa_facilities["軒数"],
-            mode="lines+markers",
-            name="軒数（軒）",
-            line=dict(color="darkblue", width=3),
-            marker=dict(size=8),
-        ),
-        secondary_y=True,
-    )
+    # ---------- メトリクス ----------
+    c1, c2, c3 = st.columns(3)
+    c1.metric(f"総施設数（{latest_year}年）",   *latest("軒数", "軒"))
+    c2.metric(f"総客室数（{latest_year}年）",   *latest("客室数", "室"))
+    c3.metric(f"総収容人数（{latest_year}年）", *latest("収容人数", "人"))
 
-    # レイアウト
-    fig.update_xaxes(title_text="年")
-    fig.update_yaxes(title_text="客室数・収容人数", secondary_y=False)
-    fig.update_yaxes(title_text="軒数（軒）",       secondary_y=True)
-    fig.update_layout(
-        title=dict(text="沖縄県宿泊施設推移状況", x=0.5, xanchor="center"),
-        hovermode="x unified",
-        height=500,
-        margin=dict(l=60, r=30, t=80, b=40),
-    )
+    # ---------- グラフ ----------
+    with profile.stage("figures"):
+        fig = figures.get_or_build(
+            ("overview", prefecture), lambda: overview_figure(pref_source, prefecture),
+            prebuilt=artifacts.figure,
+        )
+    with profile.stage("plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True)
 
-    st.plotly_chart(fig, use_container_width=True)
+overview_section()
 
 # -------------------------------------------------
 # エリア別可視化
 # -------------------------------------------------
-if selected_regions:
+@fragment
+def area_section():
     st.header("🗺️ エリア別の状況")
+    selected_regions = st.multiselect(
+        "エリアを選択してください", regions, default=[], key=f"regions-{prefecture}"
+    )
+    if not selected_regions:
+        return
+
+    if region_mismatches:
+        m = region_mismatches[0]
+        st.warning(
+            f"エリア集計が CSV の集計行と {len(region_mismatches)} 箇所で一致しません"
+            f"（例: {m.year} 年 {m.name} の{m.metric} CSV={m.expected:,.0f} / "
+            f"市町村合計={m.actual:,.0f}）。市町村合計で表示しています。"
+        )
 
     for element in elements:
         st.subheader(f"選択エリアの {element} の推移")
 
-        # データソース選択
-        data_source = {
-            "軒数": facilities,
-            "客室数": rooms,
-            "収容人数": capacity,
-        }[element]
-
-        fig = go.Figure()
-        for reg in selected_regions:
-            reg_df = (
-                data_source[
-                    (data_source["市町村"] == reg)
-                    & (data_source["年"].between(years[0], years[1]))
-                ]
-                .sort_values("年")
+        key = figure_key("area", element, selected_regions, years, scope=prefecture)
+        with profile.stage("figures"):
+            fig = figures.get_or_build(
+                trend.key(key),
+                lambda: trend.apply(
+                    area_figure("app", region_store, element, key.selection, years),
+                    region_store, element, years,
+                ),
+                prebuilt=artifacts.figure,
             )
-            if not reg_df.empty:
-                fig.add_trace(
-                    go.Scatter(
-                        x=reg_df["年"],
-                        y=reg_df[element],
-                        mode="lines+markers",
-                        name=reg,
-                        line=dict(width=3),
-                    )
-                )
-
-        fig.update_layout(
-            title=f"{years[0]}-{years[1]} 年：選択エリアの {element} 推移",
-            xaxis_title="年",
-            yaxis_title=element,
-            hovermode="x unified",
-            height=400,
-            margin=dict(l=50, r=20, t=60, b=40),
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        with profile.stage("plotly_chart"):
+            st.plotly_chart(fig, use_container_width=True)
+        cagr_caption(element, selected_regions, years, source=region_store)
+
+if regions:
+    area_section()
+
+# -------------------------------------------------
+# 市町村 × 年のヒートマップ
+# -------------------------------------------------
+# 全市町村を 1 本の Heatmap トレースで比べる（行はエリアごとにまとめる）
+if region_index:
+    heatmap_groups, heatmap_names = region_index.grouped(store)
+else:
+    heatmap_groups, heatmap_names = None, municipalities
+
+fragment(ui.heatmap_section)(
+    store, figures, profile, years, heatmap_names, heatmap_groups,
+    header="🌡️ 市町村 × 年のヒートマップ", scope=prefecture,
+)
 
 # -------------------------------------------------
 # 市町村別可視化
 # -------------------------------------------------
-if selected_municipalities:
+# データテーブル（任意表示）。表示切り替えやページ送りは表だけを再実行する
+@fragment
+def table_section(element: str, key) -> None:
+    if not st.checkbox(f"{element} のデータテーブルを表示", key=element):
+        return
+    # 図と同じキーで集計表をキャッシュする
+    with profile.stage("pivot"):
+        tbl = tables.get_or_build(
+            key, lambda: store.pivot(element, key.selection, years),
+            prebuilt=artifacts.table,
+        )
+    with profile.stage("table"):
+        ui.show_table(tbl, f"table-{element}",
+                      f"{prefecture}_{element}_{years[0]}-{years[1]}")
+
+# 期間の増減ランキング。行を選ぶと下の市町村の選択に加える
+fragment(ui.leaderboard_section)(
+    store, profile, years, municipalities, header="🏆 増減ランキング",
+    table_key=f"leaderboard-{prefecture}", selection_key=f"municipalities-{prefecture}",
+)
+
+@fragment
+def municipality_section():
     st.header("🏘️ 市町村別の状況")
+    selected_municipalities = st.multiselect(
+        "市町村を選択してください", municipalities, default=[],
+        key=f"municipalities-{prefecture}",
+    )
+    if not selected_municipalities:
+        return
 
     for element in elements:
         st.subheader(f"選択市町村の {element} の推移")
 
-        data_source = {
-            "軒数": facilities,
-            "客室数": rooms,
-            "収容人数": capacity,
-        }[element]
-
-        fig = go.Figure()
-        for mun in selected_municipalities:
-            mun_df = (
-                data_source[
-                    (data_source["市町村"] == mun)
-                    & (data_source["年"].between(years[0], years[1]))
-                ]
-                .sort_values("年")
+        key = figure_key("municipality", element, selected_municipalities, years,
+                         scope=prefecture)
+        with profile.stage("figures"):
+            fig = figures.get_or_build(
+                trend.key(key),
+                lambda: trend.apply(
+                    municipality_figure("app", store, element, key.selection, years),
+                    store, element, years,
+                ),
+                prebuilt=artifacts.figure,
             )
-            if not mun_df.empty:
-                fig.add_trace(
-                    go.Scatter(
-                        x=mun_df["年"],
-                        y=mun_df[element],
-                        mode="lines+markers",
-                        name=mun,
-                        line=dict(width=3),
-                    )
-                )
-
-        fig.update_layout(
-            title=f"{years[0]}-{years[1]} 年：選択市町村の {element} 推移",
-            xaxis_title="年",
-            yaxis_title=element,
-            hovermode="x unified",
-            height=400,
-            margin=dict(l=50, r=20, t=60, b=40),
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        with profile.stage("plotly_chart"):
+            st.plotly_chart(fig, use_container_width=True)
+        cagr_caption(element, selected_municipalities, years)
 
-        # データテーブル（任意表示）
-        if st.checkbox(f"{element} のデータテーブルを表示", key=element):
-            tbl = (
-                data_source[
-                    (data_source["市町村"].isin(selected_municipalities))
-                    & (data_source["年"].between(years[0], years[1]))
-                ]
-                .pivot(index="市町村", columns="年", values=element)
-                .fillna(0)
-                .astype(int)
-            )
-            st.dataframe(tbl.style.format(thousands=","), use_container_width=True)
+        table_section(element, key)
+
+municipality_section()
 
 # -------------------------------------------------
 # エリア定義の説明
 # -------------------------------------------------
-st.markdown("---")
-st.header("🗾 エリアの内訳")
-
-col1, col2 = st.columns(2)
-with col1:
-    st.markdown(
-        "**南部**: 那覇市、糸満市、豊見城市、八重瀬町、南城市、与那原町、南風原町  \n"
-        "**中部**: 沖縄市、宜野湾市、浦添市、うるま市、読谷村、嘉手納町、北谷町、北中城村、中城村、西原町  \n"
-        "**北部**: 名護市、国頭村、大宜味村、東村、今帰仁村、本部町、恩納村、宜野座村、金武町"
-    )
-with col2:
-    st.markdown(
-        "**宮古**: 宮古島市、多良間村  \n"
-        "**八重山**: 石垣市、竹富町、与那国町  \n"
-        "**離島**: 久米島町、渡嘉敷村、座間味村、粟国村、渡名喜村、南大東村、北大東村、伊江村、伊平屋村、伊是名村"
-    )
+if region_index:
+    st.markdown("---")
+    st.header("🗾 エリアの内訳")
+
+    lines = region_markdown()
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("  \n".join(lines[:3]))
+    with col2:
+        st.markdown("  \n".join(lines[3:]))
 
 # -------------------------------------------------
 # データ出典
@@ -297,3 +324,9 @@ st.markdown(
     "(https://www.pref.okinawa.jp/shigoto/kankotokusan/1011671/1011816/"
     "1003416/1026290.html) を基に独自に集計・加工したものです。"
 )
+
+# -------------------------------------------------
+# デバッグ（?debug=1）
+# -------------------------------------------------
+if profile.enabled:
+    ui.show_profile(profile.finish(app="app.py", prefecture=prefecture), PROFILE_LABEL)
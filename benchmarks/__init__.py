@@ -0,0 +1 @@
+"""性能計測用のスクリプト群（アプリ本体からは使わない）。"""
@@ -0,0 +1,180 @@
+"""パイプライン各段の所要時間を合成データで計測する。
+
+    python -m benchmarks.bench_pipeline --municipalities 1000 10000 --years 50 \\
+        --out bench.json
+    python -m benchmarks.bench_pipeline --compare bench.json --out bench2.json
+
+段ごとに repeat 回実行し、最小値と中央値（秒）を JSON で出力する。
+--compare を付けると前回の結果と中央値の比を表示する。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from lodging import loader
+from lodging.figures import selection_figure
+from lodging.metrics import DerivedMetrics, calculate_metrics
+from lodging.store import METRICS, MetricStore
+
+from .synthetic import synthetic_frames, write_synthetic_csvs
+
+# これより多い系列では旧来のマスク方式（系列ごとに全行を走査）を計測しない
+LEGACY_SERIES_LIMIT = 100
+
+
+def timeit(fn: Callable[[], object], repeat: int,
+           setup: Callable[[], object] | None = None) -> dict:
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"min_s": min(times), "median_s": statistics.median(times),
+            "repeat": repeat}
+
+
+def selection_counts(n: int) -> list[tuple[str, int]]:
+    return [(label, k) for label, k in (("1", 1), ("10", 10), ("all", n)) if k <= n]
+
+
+def bench_size(n_municipalities: int, n_years: int, repeat: int,
+               workdir: Path) -> list[dict]:
+    frames = synthetic_frames(n_municipalities, n_years)
+    data_dir = workdir / f"m{n_municipalities}_y{n_years}"
+    write_synthetic_csvs(data_dir, frames)
+    cache_dir = data_dir / loader.CACHE_DIR
+    results = []
+
+    def record(stage: str, timing: dict, series: str | None = None) -> None:
+        results.append({"stage": stage, "series": series,
+                        "municipalities": n_municipalities, "years": n_years,
+                        **timing})
+        label = f"{stage}[{series}]" if series else stage
+        print(f"  {label:<28} median {timing['median_s'] * 1e3:10.2f} ms",
+              file=sys.stderr)
+
+    # ---------- 読み込み ----------
+    record("load_data_csv", timeit(lambda: loader.read_csv_frames(data_dir), repeat))
+    record("load_data_cold", timeit(
+        lambda: loader.load_frames(data_dir), repeat,
+        setup=lambda: shutil.rmtree(cache_dir, ignore_errors=True)))
+    record("load_data_warm", timeit(lambda: loader.load_frames(data_dir), repeat))
+
+    # ---------- ストアと派生指標 ----------
+    record("store_build", timeit(lambda: MetricStore.from_frames(frames), repeat))
+    store = MetricStore.from_frames(frames)
+    record("calculate_metrics", timeit(
+        lambda: [calculate_metrics(frames[c], c) for c in METRICS], repeat))
+    record("derived_metrics", timeit(lambda: DerivedMetrics.from_store(store), repeat))
+
+    # ---------- 選択・ピボット・図 ----------
+    element = METRICS[0]
+    df = frames[element]
+    years = (int(store.years[0]), int(store.years[-1]))
+    for label, k in selection_counts(n_municipalities):
+        names = list(store.names[:k])
+
+        if k <= LEGACY_SERIES_LIMIT:
+            def mask_select():
+                for m in names:
+                    df[(df["市町村"] == m) & df["年"].between(*years)].sort_values("年")
+
+            def mask_pivot():
+                (df[df["市町村"].isin(names) & df["年"].between(*years)]
+                 .pivot(index="市町村", columns="年", values=element)
+                 .fillna(0).astype(int))
+
+            record("selection_mask", timeit(mask_select, repeat), label)
+            record("pivot_mask", timeit(mask_pivot, repeat), label)
+
+        record("selection_store", timeit(
+            lambda: store.matrix(element, names, years), repeat), label)
+        record("pivot_store", timeit(
+            lambda: store.pivot(element, names, years), repeat), label)
+
+        fig_repeat = repeat if k <= LEGACY_SERIES_LIMIT else 1
+        record("figure_build", timeit(
+            lambda: selection_figure(store, "市町村", element, names, years),
+            fig_repeat), label)
+        fig = selection_figure(store, "市町村", element, names, years)
+        record("figure_to_json", {
+            **timeit(lambda: fig.to_json(validate=False), fig_repeat),
+            "bytes": len(fig.to_json(validate=False)),
+        }, label)
+
+    return results
+
+
+def compare(current: list[dict], previous: list[dict]) -> None:
+    key = lambda r: (r["stage"], r["series"], r["municipalities"], r["years"])  # noqa: E731
+    before = {key(r): r for r in previous}
+    print(f"{'stage':<28}{'size':>14}{'before ms':>12}{'after ms':>12}{'ratio':>8}")
+    for r in current:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        stage = f"{r['stage']}[{r['series']}]" if r["series"] else r["stage"]
+        size = f"{r['municipalities']}x{r['years']}"
+        ratio = r["median_s"] / old["median_s"] if old["median_s"] else float("nan")
+        print(f"{stage:<28}{size:>14}{old['median_s'] * 1e3:12.2f}"
+              f"{r['median_s'] * 1e3:12.2f}{ratio:8.2f}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--municipalities", type=int, nargs="+", default=[1000])
+    parser.add_argument("--years", type=int, nargs="+", default=[50])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", type=Path, help="結果 JSON の出力先（省略時は標準出力）")
+    parser.add_argument("--compare", type=Path, help="比較対象の前回結果 JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="lodging-bench-") as tmp:
+        for n in args.municipalities:
+            for y in args.years:
+                print(f"{n} municipalities x {y} years x {len(METRICS)} metrics",
+                      file=sys.stderr)
+                results += bench_size(n, y, args.repeat, Path(tmp))
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.compare:
+        previous = json.loads(args.compare.read_text(encoding="utf-8"))["results"]
+        compare(results, previous)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Streamlit アプリを AppTest でヘッドレスに動かす負荷試験。
+
+    python -m benchmarks.load_test --sessions 8 --steps 30 --out load.json
+    python -m benchmarks.load_test --app app.py --compare load.json
+
+アプリごとに別プロセスを起こし、その中で N 個のセッション（AppTest）を
+スレッドで同時に動かす。各セッションはエリア・市町村・期間・要素の操作を
+乱数で選んで再実行を繰り返す。ブラウザもネットワークも使わない。
+
+再実行の所要時間の p50/p95/p99、スループット（再実行/秒）、RSS の増分を
+JSON で出力する。--compare を付けると前回の結果との比を表示する。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+from lodging.store import METRICS
+
+ROOT = Path(__file__).resolve().parent.parent
+APPS = ("app.py", "streamlit-app/app.py")
+PERCENTILES = (50, 95, 99)
+ACTIONS = ("regions", "municipalities", "years", "elements")
+
+# 操作 → ウィジェットのラベルの書き出し
+LABELS = {
+    "regions": "エリア",
+    "municipalities": "市町村",
+    "years": "期間",
+    "elements": "要素",
+}
+MAX_PICK = {"regions": 3, "municipalities": 10}
+
+
+def rss_bytes() -> int:
+    """現在の RSS（/proc が無ければピーク RSS で代用）。"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def _widget(at, label: str):
+    for w in (*at.multiselect, *at.slider):
+        if w.label.startswith(label):
+            return w
+    return None
+
+
+def interact(at, rng: random.Random) -> str | None:
+    """ランダムな操作を 1 つ行い、その名前を返す（操作できなければ None）。"""
+    for action in rng.sample(ACTIONS, len(ACTIONS)):
+        w = _widget(at, LABELS[action])
+        if w is None:
+            continue
+        if action == "years":
+            lo, hi = sorted(rng.sample(range(int(w.min), int(w.max) + 1), 2))
+            w.set_value((lo, hi))
+        elif action == "elements":
+            w.set_value(rng.sample(list(METRICS), rng.randint(1, len(METRICS))))
+        else:
+            k = rng.randint(0, min(MAX_PICK[action], len(w.options)))
+            w.set_value(rng.sample(list(w.options), k))
+        return action
+    return None
+
+
+def run_session(app: Path, steps: int, seed: int, timeout: float) -> dict:
+    """1 セッション分。初回表示と操作ごとの再実行時間（秒）を返す。"""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(str(app), default_timeout=timeout)
+    t0 = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - t0
+
+    latencies, errors = [], len(at.exception)
+    for _ in range(steps):
+        if interact(at, rng) is None:
+            break
+        t0 = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - t0)
+        errors += len(at.exception)
+    return {"first_s": first, "latencies_s": latencies, "errors": errors}
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {f"p{p}_ms": None for p in PERCENTILES}
+    qs = np.percentile(values, PERCENTILES)
+    return {f"p{p}_ms": float(q) * 1e3 for p, q in zip(PERCENTILES, qs)}
+
+
+def run_app(app: str, sessions: int, steps: int, seed: int = 0,
+            timeout: float = 60.0) -> dict:
+    """sessions 個のセッションを同時に動かし、集計結果を返す。
+
+    同じプロセスのセッションは st.cache_resource などを共有するので、
+    1 ワーカープロセスに同時接続した状態に近い。
+    """
+    path = ROOT / app
+    rss_before = rss_bytes()
+    barrier = threading.Barrier(sessions)
+
+    def session(i: int) -> dict:
+        barrier.wait()
+        return run_session(path, steps, seed + i, timeout)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(session, range(sessions)))
+    wall = time.perf_counter() - t0
+
+    latencies = [t for r in results for t in r["latencies_s"]]
+    firsts = [r["first_s"] for r in results]
+    reruns = len(latencies) + len(firsts)
+    rss_after = rss_bytes()
+    return {
+        "app": app,
+        "sessions": sessions,
+        "steps": steps,
+        "reruns": reruns,
+        "errors": sum(r["errors"] for r in results),
+        "wall_s": wall,
+        "throughput_rps": reruns / wall if wall else None,
+        "first": percentiles(firsts),
+        "rerun": percentiles(latencies),
+        "rss_before_bytes": rss_before,
+        "rss_after_bytes": rss_after,
+        "rss_growth_bytes": rss_after - rss_before,
+    }
+
+
+def _run_isolated(app: str, sessions: int, steps: int, seed: int, timeout: float) -> dict:
+    # アプリは CSV をカレントディレクトリから読む
+    os.chdir(ROOT)
+    return run_app(app, sessions, steps, seed, timeout)
+
+
+def compare(current: list[dict], previous: list[dict]) -> None:
+    before = {(r["app"], r["sessions"]): r for r in previous}
+    print(f"{'app':<24}{'sessions':>9}{'metric':>10}{'before':>12}{'after':>12}{'ratio':>8}")
+    for r in current:
+        old = before.get((r["app"], r["sessions"]))
+        if old is None:
+            continue
+        rows = [(k, old["rerun"][k], r["rerun"][k]) for k in r["rerun"]]
+        rows.append(("rps", old["throughput_rps"], r["throughput_rps"]))
+        for name, a, b in rows:
+            if a is None or b is None:
+                continue
+            ratio = b / a if a else float("nan")
+            print(f"{r['app']:<24}{r['sessions']:>9}{name:>10}{a:12.2f}{b:12.2f}{ratio:8.2f}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", action="append", choices=APPS,
+                        help="対象アプリ（複数指定可。省略時は両方）")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[8],
+                        help="同時セッション数（複数指定で順に計測）")
+    parser.add_argument("--steps", type=int, default=20, help="セッションごとの操作回数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="1 回の再実行のタイムアウト（秒）")
+    parser.add_argument("--out", type=Path, help="結果 JSON の出力先（省略時は標準出力）")
+    parser.add_argument("--compare", type=Path, help="比較対象の前回結果 JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for app in args.app or APPS:
+        for n in args.sessions:
+            print(f"{app}: {n} sessions x {args.steps} steps", file=sys.stderr)
+            # キャッシュと RSS を分けるため、条件ごとに新しいプロセスで動かす
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as ex:
+                r = ex.submit(_run_isolated, app, n, args.steps, args.seed,
+                              args.timeout).result()
+            print(f"  rerun p50 {r['rerun']['p50_ms'] or 0:8.1f} ms"
+                  f"  p95 {r['rerun']['p95_ms'] or 0:8.1f} ms"
+                  f"  p99 {r['rerun']['p99_ms'] or 0:8.1f} ms"
+                  f"  {r['throughput_rps']:6.1f} reruns/s"
+                  f"  RSS +{r['rss_growth_bytes'] / 2**20:.1f} MiB"
+                  f"  errors {r['errors']}", file=sys.stderr)
+            results.append(r)
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "steps": args.steps,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.compare:
+        previous = json.loads(args.compare.read_text(encoding="utf-8"))["results"]
+        compare(results, previous)
+    return 0 if all(r["errors"] == 0 for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
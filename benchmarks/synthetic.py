@@ -0,0 +1,50 @@
+"""facilities_long.csv と同じ形の合成データ。
+
+市町村数と年数を任意に増やした long 形式の 3 指標を作る。値は市町村ごとの
+ランダムウォークで、客室数・収容人数は軒数に比例させてある。
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lodging.loader import SOURCES
+
+
+def synthetic_frames(
+    n_municipalities: int, n_years: int, start_year: int = 1974, seed: int = 0
+) -> dict[str, pd.DataFrame]:
+    """指標名 → long 形式 DataFrame（市町村, 年, 指標）。行は年 → 市町村順。"""
+    rng = np.random.default_rng(seed)
+    names = np.array([f"市町村{i:05d}" for i in range(n_municipalities)])
+    years = np.arange(start_year, start_year + n_years)
+
+    base = rng.integers(1, 200, size=(n_municipalities, 1))
+    steps = rng.normal(0.03, 0.08, size=(n_municipalities, n_years))
+    facilities = np.maximum(base * np.exp(np.cumsum(steps, axis=1)), 0).round()
+    values = {
+        "軒数": facilities,
+        "客室数": (facilities * rng.uniform(5, 30, size=(n_municipalities, 1))).round(),
+        "収容人数": (facilities * rng.uniform(12, 70, size=(n_municipalities, 1))).round(),
+    }
+
+    muni = np.tile(names, n_years)
+    year = np.repeat(years, n_municipalities)
+    return {
+        col: pd.DataFrame({
+            "市町村": muni,
+            "年": year,
+            col: mat.T.reshape(-1).astype(np.int64),
+        })
+        for col, mat in values.items()
+    }
+
+
+def write_synthetic_csvs(data_dir: Path, frames: dict[str, pd.DataFrame]) -> None:
+    """実データと同じファイル名・BOM 付き UTF-8 で書き出す。"""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    for col, fname in SOURCES.items():
+        frames[col].to_csv(data_dir / fname, index=False, encoding="utf-8-sig")
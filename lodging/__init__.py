@@ -0,0 +1,21 @@
+"""沖縄県宿泊施設データ可視化アプリのコア。
+
+ui 以外は Streamlit に依存しない。
+
+- loader   : CSV の読み込みと Arrow キャッシュ
+- schema   : long 形式 CSV のスキーマと読み込み時の検査
+- ingest   : 調査年ごとの元資料から long 形式データを作る
+- store    : 市町村 × 年の行列ストア
+- metrics  : 増減数・前回比・CAGR などの派生指標
+- regions  : エリア定義
+- figures  : Plotly 図の組み立て（plotly は図を作るときに遅延 import）
+- figcache : 組み立て済み図の LRU キャッシュ
+- incremental : 新しい調査年の差分取り込み
+- partitions  : 都道府県 × 指標のパーティション
+- downsample  : LTTB による間引き
+- profiling   : 再実行ごとの段別時間・キャッシュ命中数・ピークメモリ
+- tables      : データテーブル用の集計表キャッシュとダウンロード
+- prerender   : 図と集計表の事前描画（版付きディレクトリ）
+- ranking     : 期間の増減による上位 / 下位 N 件
+- ui          : 両アプリ共通の Streamlit 部品
+"""
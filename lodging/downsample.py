@@ -0,0 +1,49 @@
+"""Largest-Triangle-Three-Buckets (LTTB) による折れ線の間引き。
+
+x を共有する複数系列を (系列, 点) の 2 次元配列のまま一括で間引く。
+ループはバケット数ぶんだけで、各バケット内の計算は全系列まとめて行う。
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """残す点の列番号を返す。y が 2 次元なら系列ごとに (系列, n_out)。
+
+    先頭と末尾の点は必ず残す。n_out が点数以上なら全点を返す。
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    x = np.asarray(x, dtype=float)
+    n_series, n = y.shape
+    if n_out >= n or n_out < 3:
+        idx = np.broadcast_to(np.arange(n), (n_series, n)).copy()
+        return idx if n_out >= n else idx[:, [0, -1]]
+
+    yy = np.nan_to_num(y)
+    rows = np.arange(n_series)
+    out = np.empty((n_series, n_out), dtype=np.intp)
+    out[:, 0], out[:, -1] = 0, n - 1
+
+    # 先頭と末尾を除いた点を n_out - 2 個のバケットに分ける
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    prev = np.zeros(n_series, dtype=np.intp)
+    for b in range(n_out - 2):
+        lo, hi = edges[b], max(edges[b + 1], edges[b] + 1)
+        # 次のバケットの平均点（最後は末尾の点）
+        if b + 1 < n_out - 2:
+            nlo, nhi = edges[b + 1], max(edges[b + 2], edges[b + 1] + 1)
+            nx, ny = x[nlo:nhi].mean(), yy[:, nlo:nhi].mean(axis=1)
+        else:
+            nx, ny = x[-1], yy[:, -1]
+
+        px, py = x[prev], yy[rows, prev]
+        cx, cy = x[lo:hi], yy[:, lo:hi]
+        area = np.abs(
+            (px[:, None] - nx) * (cy - py[:, None])
+            - (px[:, None] - cx[None, :]) * (ny - py)[:, None]
+        )
+        prev = lo + area.argmax(axis=1)
+        out[:, b + 1] = prev
+    return out
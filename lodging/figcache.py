@@ -0,0 +1,125 @@
+"""組み立て済み Plotly 図の LRU キャッシュ。
+
+図はシリアライズ済み JSON 文字列で持つ。セッション間で共有しても
+書き換えられる心配がなく、メモリ上限も文字列長で正確に数えられる。
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, NamedTuple
+
+
+class FigureKey(NamedTuple):
+    scope: str                   # 都道府県などデータの出どころ
+    kind: str
+    element: str
+    selection: tuple[str, ...]   # 重複を除いて並べ替えた選択
+    years: tuple[int, int]       # 常に末尾（touches_years が参照する）
+
+
+def figure_key(
+    kind: str,
+    element: str,
+    selection: Iterable[str],
+    years: tuple[int, int],
+    scope: str = "",
+) -> FigureKey:
+    """選択順に依存しない正規化キー。"""
+    return FigureKey(scope, kind, element, tuple(sorted(set(selection))),
+                     (int(years[0]), int(years[1])))
+
+
+def touches_years(key: Hashable, first_year: int) -> bool:
+    """key の期間が first_year 以降にかかるか。期間を持たないキーは常に真。"""
+    span = key[-1] if isinstance(key, tuple) and key else None
+    if not (isinstance(span, tuple) and len(span) == 2):
+        return True
+    return span[1] >= first_year
+
+
+class FigureCache:
+    """件数とバイト数の両方に上限を持つ、スレッド安全な LRU。"""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, str] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    @staticmethod
+    def _size(value: Any) -> int:
+        return len(value)
+
+    def get(self, key: Hashable) -> str | None:
+        with self._lock:
+            spec = self._entries.get(key)
+            if spec is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return spec
+
+    def put(self, key: Hashable, spec: str) -> None:
+        size = self._size(spec)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(old)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = spec
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+
+    def get_or_build(
+        self,
+        key: Hashable,
+        build: Callable[[], Any],
+        prebuilt: Callable[[Hashable], str | None] | None = None,
+    ) -> dict:
+        """キャッシュ済みの図を dict で返す。無ければ build() して登録する。
+
+        prebuilt を渡すと、build() の前に prebuilt(key) で事前描画済みの
+        JSON を探す。戻り値は st.plotly_chart にそのまま渡せる。
+        """
+        spec = self.get(key)
+        if spec is None:
+            spec = prebuilt(key) if prebuilt else None
+            if spec is None:
+                import plotly.io as pio
+
+                spec = pio.to_json(build(), validate=False)
+            self.put(key, spec)
+        return json.loads(spec)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """predicate(key) が真のエントリを捨て、捨てた件数を返す。"""
+        with self._lock:
+            stale = [k for k in self._entries if predicate(k)]
+            for k in stale:
+                self._bytes -= self._size(self._entries.pop(k))
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
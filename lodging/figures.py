@@ -0,0 +1,399 @@
+"""Plotly 図の組み立て。
+
+plotly（特に make_subplots）は読み込みが重いので、モジュールの import 時
+ではなく図を実際に作るときに読み込む。図はキャッシュに載るので、
+キャッシュヒットだけで済む実行では plotly の import 自体が発生しない。
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Sequence
+
+import numpy as np
+
+from .downsample import lttb_indices
+from .regions import PREFECTURE
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+    from .store import MetricStore
+
+# 系列数がこれを超えたら WebGL の結合トレース表示に切り替える
+HIGH_CARDINALITY = 20
+# 結合トレース全体の点数の上限。超えたら系列ごとに LTTB で間引き、
+# それでも収まらない（1 系列 3 点を切る）ときは最終年の値が小さい系列を省く
+POINT_BUDGET = 20_000
+# 間引いても残す 1 系列あたりの点数（先頭・末尾と 1 点）
+MIN_POINTS = 3
+# 結合トレースとは別に、個別トレースとして凡例に残す上位系列の数
+HIGHLIGHT = 5
+# ヒートマップに描く値（指標そのもの・増減数・年率換算の前回比 %）
+HEATMAP_VALUES = ("value", "delta", "yoy")
+# ヒートマップの行数がこれを超えたら行ラベルを省く
+HEATMAP_LABEL_ROWS = 200
+
+
+def overview_figure(store: "MetricStore", name: str = PREFECTURE) -> "go.Figure":
+    """県全体の推移（客室数・収容人数の棒と軒数の折れ線、2 軸）。"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    span = (int(store.years[0]), int(store.years[-1]))
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+
+    # 客室数
+    x, y = store.series("客室数", name, span)
+    fig.add_trace(
+        go.Bar(x=x, y=y, name="客室数（室）",
+               marker_color="lightblue", opacity=0.7),
+        secondary_y=False,
+    )
+
+    # 収容人数
+    x, y = store.series("収容人数", name, span)
+    fig.add_trace(
+        go.Bar(x=x, y=y, name="収容人数（人）",
+               marker_color="cornflowerblue", opacity=0.7),
+        secondary_y=False,
+    )
+
+    # 軒数
+    x, y = store.series("軒数", name, span)
+    fig.add_trace(
+        go.Scatter(
+            x=x, y=y,
+            mode="lines+markers",
+            name="軒数（軒）",
+            line=dict(color="darkblue", width=3),
+            marker=dict(size=8),
+        ),
+        secondary_y=True,
+    )
+
+    fig.update_xaxes(title_text="年")
+    fig.update_yaxes(title_text="客室数・収容人数", secondary_y=False)
+    fig.update_yaxes(title_text="軒数（軒）",       secondary_y=True)
+    fig.update_layout(
+        title=dict(text=f"{name}宿泊施設推移状況", x=0.5, xanchor="center"),
+        hovermode="x unified",
+        height=500,
+        margin=dict(l=60, r=30, t=80, b=40),
+    )
+    return fig
+
+
+def stacked_overview_figure(
+    years: Sequence[int],
+    facilities: Sequence[float],
+    rooms: Sequence[float],
+    capacity: Sequence[float],
+    title: str = f"{PREFECTURE}宿泊施設推移状況",
+) -> "go.Figure":
+    """客室数・収容人数の積み上げ棒と、右軸の軒数折れ線。"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    # 客室数（棒）
+    fig.add_bar(x=years, y=rooms, name="客室数（室）",
+                marker_color="lightblue", yaxis="y1")
+    # 収容人数（棒）
+    fig.add_bar(x=years, y=capacity, name="収容人数（人）",
+                marker_color="cornflowerblue", yaxis="y1")
+    # 軒数（折れ線）
+    fig.add_scatter(x=years, y=facilities, mode="lines+markers",
+                    name="軒数（軒）", line=dict(color="darkblue", width=2),
+                    marker=dict(size=8), yaxis="y2",
+                    hovertemplate="年: %{x}<br>軒数: %{y:,}軒<extra></extra>")
+
+    fig.update_layout(
+        title=title,
+        xaxis=dict(title="年"),
+        # -------- y (左軸：客室数・収容人数) --------
+        yaxis=dict(
+            title={"text": "客室数・収容人数", "font": {"color": "cornflowerblue"}},
+            tickfont=dict(color="cornflowerblue"),
+            showgrid=False,
+        ),
+        # -------- y2 (右軸：軒数) --------
+        yaxis2=dict(
+            title={"text": "軒数（軒）", "font": {"color": "darkblue"}},
+            tickfont=dict(color="darkblue"),
+            overlaying="y",
+            side="right",
+            showgrid=True,
+        ),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02,
+                    xanchor="center", x=0.5),
+        hovermode="x unified",
+        barmode="stack",
+        height=450,
+        margin=dict(l=60, r=60, t=80, b=40),
+    )
+    return fig
+
+
+def add_high_cardinality_traces(
+    fig: "go.Figure",
+    names: Sequence[str],
+    x: np.ndarray,
+    mat: np.ndarray,
+    point_budget: int = POINT_BUDGET,
+    highlight: int = HIGHLIGHT,
+) -> None:
+    """多数の系列を少数の Scattergl トレースにまとめて追加する。
+
+    最終年の値が大きい上位 highlight 系列は個別トレース、残りは NaN で
+    区切った 1 本の灰色トレースにする。点数（区切りを含む）は point_budget
+    以内に収める。超える場合は系列ごとに LTTB で間引き、1 系列 MIN_POINTS 点
+    でも収まらなければ最終年の値が小さい系列を省いてトレース名に件数を出す。
+    灰色トレースのホバーは点ごとの名前の代わりに最終年の順位（customdata）を出す。
+    """
+    import plotly.graph_objects as go
+
+    if mat.size == 0:
+        return
+    order = np.argsort(-np.nan_to_num(mat[:, -1], nan=-np.inf), kind="stable")
+    drawn = order[:max(point_budget // (MIN_POINTS + 1), min(highlight, len(order)))]
+    omitted = len(order) - len(drawn)
+
+    per_series = max(MIN_POINTS, point_budget // len(drawn) - 1)
+    rows = mat[drawn]
+    if per_series < len(x):
+        idx = lttb_indices(x, rows, per_series)
+        xs = np.asarray(x, dtype=float)[idx]
+        ys = np.take_along_axis(rows, idx, axis=1)
+    else:
+        xs = np.broadcast_to(np.asarray(x, dtype=float), rows.shape)
+        ys = rows
+
+    for j, i in enumerate(drawn[:highlight]):
+        fig.add_trace(go.Scattergl(x=xs[j], y=ys[j], mode="lines", name=names[i]))
+
+    rest = np.arange(highlight, len(drawn))
+    if len(rest):
+        # 系列の間に NaN を挟んで 1 本のトレースに連結する
+        sep = np.full((len(rest), 1), np.nan)
+        rank = np.repeat(rest + 1, xs.shape[1] + 1).astype(np.int32)
+        name = f"その他 {len(rest):,} 件"
+        if omitted:
+            name += f"（ほか {omitted:,} 件は点数の上限のため省略）"
+        fig.add_trace(go.Scattergl(
+            x=np.hstack([xs[rest], sep]).ravel(),
+            y=np.hstack([ys[rest], sep]).ravel(),
+            customdata=rank,
+            mode="lines",
+            name=name,
+            line=dict(width=1, color="rgba(120,120,120,0.35)"),
+            hovertemplate="最終年 %{customdata} 位<br>%{x}: %{y:,}<extra></extra>",
+        ))
+    fig.update_layout(hovermode="closest")
+
+
+def selection_figure(
+    store: "MetricStore",
+    label: str,
+    element: str,
+    names: Sequence[str],
+    years: tuple[int, int],
+    legend: dict | None = None,
+    title: str | None = None,
+    high_cardinality: int = HIGH_CARDINALITY,
+    point_budget: int = POINT_BUDGET,
+) -> "go.Figure":
+    """選択したエリア／市町村の推移（names の並び順でトレースを描く）。
+
+    系列数が high_cardinality を超えると add_high_cardinality_traces の
+    WebGL 表示に切り替える。
+    """
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.update_layout(
+        title=title or f"{years[0]}-{years[1]} 年：選択{label}の {element} 推移",
+        xaxis_title="年",
+        yaxis_title=element,
+        hovermode="x unified",
+        height=400,
+        margin=dict(l=50, r=20, t=60, b=40),
+    )
+    if legend:
+        fig.update_layout(legend=legend)
+
+    if len(names) > high_cardinality:
+        found, x, mat = store.matrix(element, names, years)
+        add_high_cardinality_traces(fig, found, x, mat, point_budget)
+        return fig
+
+    for name in names:
+        if name not in store.row:
+            continue
+        x, y = store.series(element, name, years)
+        if len(x):
+            fig.add_trace(
+                go.Scatter(
+                    x=x,
+                    y=y,
+                    mode="lines+markers",
+                    name=name,
+                    line=dict(width=3),
+                )
+            )
+    return fig
+
+
+def add_trend_traces(
+    fig: "go.Figure",
+    store: "MetricStore",
+    element: str,
+    years: tuple[int, int],
+    method: str = "linear",
+    horizon: int = 5,
+) -> "go.Figure":
+    """個別に描いた系列ごとに、期間内の回帰直線と horizon 年先までの予測を重ねる。
+
+    当てはめは store.derived.trend で全系列まとめて行い、期間ごとにメモ化される。
+    トレンドは元の系列と同じ色の点線で、凡例は元の系列とまとめる。
+    """
+    import plotly.graph_objects as go
+    from plotly.colors import qualitative
+
+    fit = store.derived.trend(*years, method)[element]
+    x = np.arange(years[0], years[1] + horizon + 1)
+    label = "対数線形" if method == "log" else "線形"
+    colors = qualitative.Plotly
+
+    drawn = [t for t in fig.data if t.name in store.row and t.legendgroup is None]
+    for i, trace in enumerate(drawn):
+        color = trace.line.color or colors[i % len(colors)]
+        trace.update(line_color=color, legendgroup=trace.name)
+        y = fit[store.row[trace.name]].predict(x)
+        if np.isnan(y).all():
+            continue
+        fig.add_trace(go.Scatter(
+            x=x, y=y, mode="lines", name=f"{trace.name}（{label}トレンド）",
+            legendgroup=trace.name, showlegend=False,
+            line=dict(color=color, dash="dot", width=2),
+            hovertemplate=f"{trace.name} {label}トレンド<br>%{{x}}: %{{y:,.0f}}<extra></extra>",
+        ))
+
+    if drawn and horizon > 0:
+        fig.add_vrect(x0=years[1], x1=years[1] + horizon, fillcolor="gray", opacity=0.08,
+                      line_width=0, annotation_text="予測", annotation_position="top left")
+    return fig
+
+
+def heatmap_matrix(
+    store: "MetricStore",
+    element: str,
+    value: str,
+    names: Sequence[str],
+    years: tuple[int, int],
+) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """(名前, 年, 行列)。増減数は比較対象の無い位置（初回の調査年・欠測年）を NaN にする。"""
+    found, rows = store.rows(names)
+    cols = store.year_slice(*years)
+    if value == "value":
+        mat = store.values[element][rows, cols]
+    elif value == "delta":
+        d = store.derived
+        observed = ~np.isnan(store.values[element][rows, cols])
+        after_first = np.arange(len(store.years))[cols] > d.span[element][rows, :1]
+        mat = np.where(observed & after_first, d.delta[element][rows, cols], np.nan)
+    elif value == "yoy":
+        mat = store.derived.yoy[element][rows, cols]
+    else:
+        raise ValueError(f"未知の値: {value}")
+    return found, store.years[cols], mat
+
+
+def heatmap_figure(
+    store: "MetricStore",
+    element: str,
+    value: str,
+    names: Sequence[str],
+    years: tuple[int, int],
+    groups: Sequence[str] | None = None,
+    title: str | None = None,
+) -> "go.Figure":
+    """市町村 × 年を 1 本の Heatmap トレースで描く。
+
+    groups（names と同じ長さのエリア名）を渡すと、行をエリアごとにまとめた
+    2 段の軸ラベルにする。増減数と前回比は 0 を中心にした配色で、色の範囲は
+    外れ値に引っ張られないよう絶対値の 98 パーセンタイルで切る。
+    """
+    import plotly.graph_objects as go
+
+    if groups is not None:
+        region = dict(zip(names, groups))
+    found, x, mat = heatmap_matrix(store, element, value, names, years)
+    y = [[region[n] for n in found], found] if groups is not None else found
+
+    finite = np.abs(mat[~np.isnan(mat)])
+    limit = float(np.percentile(finite, 98)) if finite.size else 1.0
+    if value == "value":
+        color = dict(colorscale="Blues", zmin=0, zmax=limit or 1.0)
+        unit, fmt = element, "%{z:,.0f}"
+    else:
+        color = dict(colorscale="RdBu", zmid=0, zmin=-limit, zmax=limit)
+        unit, fmt = ("増減数", "%{z:+,.0f}") if value == "delta" else ("前回比 (%)", "%{z:+.1f}%")
+
+    fig = go.Figure(go.Heatmap(
+        z=mat, x=x, y=y, **color,
+        colorbar=dict(title=unit),
+        hoverongaps=False,
+        hovertemplate=f"%{{y}}<br>%{{x}} 年: {fmt}<extra></extra>",
+    ))
+    fig.update_layout(
+        title=title or f"{years[0]}-{years[1]} 年：市町村別の{element}（{unit}）",
+        xaxis_title="年",
+        height=min(1600, max(400, 16 * len(found) + 140)),
+        margin=dict(l=50, r=20, t=60, b=40),
+    )
+    fig.update_yaxes(autorange="reversed",
+                     showticklabels=len(found) <= HEATMAP_LABEL_ROWS)
+    return fig
+
+
+def rank_by_last(store: "MetricStore", element: str, names: Sequence[str],
+                 years: tuple[int, int]) -> list[str]:
+    """期間最終年の値が大きい順に並べた名前（欠損は末尾、期間内に列が無ければ空）。"""
+    found, _, mat = store.matrix(element, names, years)
+    if mat.size == 0:
+        return []
+    order = np.argsort(-np.nan_to_num(mat[:, -1], nan=-np.inf), kind="stable")
+    return [found[i] for i in order]
+
+
+def ranked_figure(
+    store: "MetricStore",
+    element: str,
+    names: Sequence[str],
+    years: tuple[int, int],
+    legend: dict | None = None,
+    title: str | None = None,
+    high_cardinality: int = HIGH_CARDINALITY,
+    point_budget: int = POINT_BUDGET,
+) -> "go.Figure":
+    """最終年の値で並べ替えた推移グラフ（凡例が値の大きい順になる）。"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.update_layout(
+        title=title or f"{element}の推移 ({years[0]}–{years[1]})",
+        xaxis_title="年", yaxis_title=element,
+        hovermode="x unified", height=400, margin=dict(l=50, r=20, t=60, b=40),
+    )
+    if legend:
+        fig.update_layout(legend=legend)
+
+    if len(names) > high_cardinality:
+        found, x, mat = store.matrix(element, names, years)
+        add_high_cardinality_traces(fig, found, x, mat, point_budget)
+        return fig
+
+    found, x, mat = store.matrix(element, rank_by_last(store, element, names, years),
+                                 years)
+    for name, y in zip(found, mat):
+        fig.add_scatter(x=x, y=y, mode="lines+markers", name=name)
+    return fig
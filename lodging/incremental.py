@@ -0,0 +1,157 @@
+"""新しい調査年の差分取り込み。
+
+CSV が更新されたら既存ストアと突き合わせ、追加された (市町村, 年) の行だけを
+ストアへ足す。増減数などは新しい年の列だけを計算し、図のキャッシュも
+その年にかかる期間のものだけを捨てる。既存の値が書き換わっていた場合や
+過去の年が追加された場合は全件を読み直す。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Mapping
+
+import numpy as np
+import pandas as pd
+
+from .figcache import FigureCache, touches_years
+from .loader import SOURCES, load_frames
+from .profiling import CacheStats
+from .store import METRICS, MetricStore
+
+
+class FullReloadRequired(Exception):
+    """差分では取り込めない変更（既存値の修正・過去年の追加）。"""
+
+
+def appended_rows(
+    store: MetricStore, frames: Mapping[str, pd.DataFrame]
+) -> dict[str, pd.DataFrame]:
+    """frames のうち store に無い行を指標ごとに返す。
+
+    既存の行の値が変わっている、行が消えている、または最終年以前の年に
+    行が増えている場合は FullReloadRequired を送出する。
+    """
+    last_year = store.years[-1] if len(store.years) else None
+    out = {}
+    for col, df in frames.items():
+        if col not in store.values:
+            raise FullReloadRequired(f"新しい指標 {col}")
+        year = df["年"].to_numpy()
+        r = np.fromiter((store.row.get(n, -1) for n in df["市町村"]),
+                        dtype=np.intp, count=len(df))
+        c = np.searchsorted(store.years, year)
+        known = (r >= 0) & (c < len(store.years))
+        known[known] = store.years[c[known]] == year[known]
+
+        old = store.values[col][r[known], c[known]]
+        new = df[col].to_numpy(dtype=float)[known]
+        if not np.array_equal(old, new, equal_nan=True):
+            raise FullReloadRequired(f"{col} の既存値が変更されています")
+        if known.sum() != np.count_nonzero(~np.isnan(store.values[col])):
+            raise FullReloadRequired(f"{col} の既存行が削除されています")
+
+        added = df[~known]
+        if last_year is not None and len(added) and added["年"].min() <= last_year:
+            raise FullReloadRequired(f"{col} に {added['年'].min()} 年の行が追加されています")
+        out[col] = added.reset_index(drop=True)
+    return out
+
+
+def invalidate_years(cache: FigureCache, first_year: int | None) -> int:
+    """first_year 以降にかかる図を捨てる（None なら全件）。"""
+    if first_year is None:
+        n = len(cache)
+        cache.clear()
+        return n
+    return cache.invalidate(lambda key: touches_years(key, first_year))
+
+
+class LiveStore:
+    """CSV の更新を検知して差分を取り込む、プロセス共有のストア。
+
+    refresh() は check_interval 秒に 1 回だけファイルの stat を取り、
+    変化があったときだけ読み込む。購読者には新しいデータの最初の年
+    （全件読み直しなら None）が渡される。stats は読み込まずに済んだ回数
+    （hits）と読み込んだ回数（misses）。
+
+    required は読み込みのたびにそろっているべき市町村。起動時の読み込みで
+    スキーマ違反があれば SchemaError を送出する。更新時のスキーマ違反や、
+    差し替え途中で読めないファイル（空・途中で切れた行・一時的に無い）は
+    error に残して直前のストアを使い続ける。
+    """
+
+    def __init__(self, data_dir: str | os.PathLike = ".", check_interval: float = 5.0,
+                 required: Iterable[str] = ()):
+        self.data_dir = Path(data_dir)
+        self.check_interval = check_interval
+        self.required = tuple(required)
+        self.version = 0
+        self.error: Exception | None = None
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._listeners: list[Callable[[int | None], None]] = []
+        self._stamp = self._stat()
+        self._store = MetricStore.from_frames(
+            dict(zip(METRICS, load_frames(self.data_dir, required=self.required)))
+        ).precompute()
+        self._checked = time.monotonic()
+
+    @property
+    def store(self) -> MetricStore:
+        return self._store
+
+    def subscribe(self, callback: Callable[[int | None], None]) -> None:
+        self._listeners.append(callback)
+
+    def _stat(self) -> tuple:
+        return tuple(
+            (st.st_mtime_ns, st.st_size)
+            for st in (os.stat(self.data_dir / f) for f in SOURCES.values())
+        )
+
+    def refresh(self, force: bool = False) -> MetricStore:
+        """必要なら CSV を読み直し、現在のストアを返す。"""
+        if not force and time.monotonic() - self._checked < self.check_interval:
+            self.stats.hit()
+            return self._store
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                stamp = self._stat()
+            except OSError as exc:
+                # 差し替えの途中。戻ったら必ず読み直すよう stamp を消しておく
+                self.error, self._stamp = exc, None
+                return self._store
+            if stamp == self._stamp:
+                self.stats.hit()
+                return self._store
+
+            self.stats.miss()
+            try:
+                frames = dict(zip(METRICS, load_frames(self.data_dir, required=self.required)))
+            except (OSError, ValueError, pd.errors.ParserError) as exc:
+                # スキーマ違反か書き込み途中のファイル（SchemaError も ValueError）。
+                # 直すとファイルが変わるので、それまでは読み直さない
+                self.error, self._stamp = exc, stamp
+                return self._store
+            self.error = None
+            try:
+                added = appended_rows(self._store, frames)
+                if not any(len(df) for df in added.values()):
+                    self._stamp = stamp
+                    return self._store
+                first_year = int(min(df["年"].min() for df in added.values() if len(df)))
+                store = self._store.extend(added)
+            except FullReloadRequired:
+                first_year = None
+                store = MetricStore.from_frames(frames).precompute()
+
+            self._store, self._stamp = store, stamp
+            self.version += 1
+            for callback in self._listeners:
+                callback(first_year)
+            return store
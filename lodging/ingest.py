@@ -0,0 +1,287 @@
+"""調査年ごとの元資料（Excel / CSV 書き出し）から long 形式データを作る。
+
+    python -m lodging.ingest raw/ --dest . --workers 4
+
+    raw/2022.xlsx, raw/令和5年.csv, ...   1 ファイル 1 調査年（年はファイル名から）
+
+各ファイルから「市町村・軒数・客室数・収容人数」の表を探して読み、市町村名を
+正規化する（全角半角・空白・注記の除去、合併前の旧市町村名は合併後の名前に
+まとめる）。元資料の計・小計の行は使わず、エリア合計と県合計は市町村から
+集計し直す。ファイルの解析はプロセスプールで並列に行う。
+
+    <dest>/facilities_long.csv など     市町村・エリア・県の long 形式
+    <dest>/okinawa_facilities_data.csv  県合計の年次推移
+    <dest>/.lodging_cache/long.arrow    Arrow キャッシュ（loader と同じもの）
+
+どのファイルにも問題が無いときだけ書き出す。問題はまとめて SchemaError で報告する。
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .loader import SOURCES, TOTALS_FILE, load_frames
+from .regions import PREFECTURE, REGIONS, RegionIndex
+from .schema import Problem, SchemaError, conform
+from .store import METRICS, MetricStore
+
+SUFFIXES = (".csv", ".xlsx", ".xls")
+# 見出しを探す先頭の行数
+HEADER_ROWS = 20
+
+# 正規化した見出し → 列
+COLUMNS = {
+    "市町村": "市町村", "市町村名": "市町村", "市町村別": "市町村",
+    "軒数": "軒数", "施設数": "軒数",
+    "客室数": "客室数", "室数": "客室数",
+    "収容人数": "収容人数", "収容人員": "収容人数", "定員": "収容人数",
+}
+FIELDS = ("市町村", *METRICS)
+
+# 合併前の市町村名 → 合併後の名前（値は合算する）
+ALIASES = {
+    **dict.fromkeys(("仲里村", "具志川村"), "久米島町"),
+    **dict.fromkeys(("平良市", "城辺町", "下地町", "上野村", "伊良部町"), "宮古島市"),
+    **dict.fromkeys(("具志川市", "石川市", "勝連町", "与那城町"), "うるま市"),
+    **dict.fromkeys(("佐敷町", "知念村", "玉城村", "大里村"), "南城市"),
+    **dict.fromkeys(("東風平町", "具志頭村"), "八重瀬町"),
+}
+
+_ERAS = {"昭和": 1925, "S": 1925, "平成": 1988, "H": 1988, "令和": 2018, "R": 2018}
+_ERA_YEAR = re.compile(r"(昭和|平成|令和|[SHR])(元|\d{1,2})")
+_WESTERN_YEAR = re.compile(r"(?<!\d)(19\d{2}|20\d{2})(?!\d)")
+_DASHES = {"-", "－", "―", "—", "‐", "ー"}
+
+
+# -------------------------------------------------
+# 正規化
+# -------------------------------------------------
+def survey_year(path: str | os.PathLike) -> int | None:
+    """ファイル名の調査年（西暦か、昭和・平成・令和 / S・H・R の和暦）。"""
+    stem = unicodedata.normalize("NFKC", Path(path).stem)
+    m = _WESTERN_YEAR.search(stem)
+    if m:
+        return int(m.group(1))
+    m = _ERA_YEAR.search(stem)
+    if m:
+        return _ERAS[m.group(1)] + (1 if m.group(2) == "元" else int(m.group(2)))
+    return None
+
+
+def _label(value) -> str:
+    """見出しのセル → 比較用の文字列（単位の括弧と空白を除く）。"""
+    s = unicodedata.normalize("NFKC", str(value))
+    s = re.sub(r"\(.*?\)", "", s)
+    return re.sub(r"\s+", "", s)
+
+
+def normalize_name(value) -> str | None:
+    """市町村名を正規化する。空の行・計の行・エリアや県の行は None。"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    s = unicodedata.normalize("NFKC", str(value))
+    s = re.sub(r"\s+", "", s)
+    s = re.sub(r"[※*].*$", "", s)     # 注記の記号以降
+    s = re.sub(r"\(.*?\)$", "", s)      # 末尾の括弧書き
+    if not s or s.endswith("計") or s in REGIONS or s == PREFECTURE:
+        return None
+    return ALIASES.get(s, s)
+
+
+def _numbers(column: pd.Series) -> pd.Series:
+    """「1,234」「－」（0 件）などを数値に。読めないセルは NaN。"""
+    s = column.map(lambda v: unicodedata.normalize("NFKC", str(v)).replace(",", "").strip())
+    s = s.where(~s.isin(_DASHES), "0")
+    return pd.to_numeric(s, errors="coerce")
+
+
+# -------------------------------------------------
+# 1 ファイルの解析（ワーカープロセスで動く）
+# -------------------------------------------------
+def _read_raw(path: Path) -> pd.DataFrame:
+    if path.suffix.lower() == ".csv":
+        try:
+            return pd.read_csv(path, header=None, dtype=str, encoding="utf-8-sig")
+        except UnicodeDecodeError:
+            # Excel から書き出した CSV は Shift_JIS のことが多い
+            return pd.read_csv(path, header=None, dtype=str, encoding="cp932")
+    return pd.read_excel(path, header=None, dtype=str, sheet_name=0)
+
+
+def _table(raw: pd.DataFrame) -> pd.DataFrame | None:
+    """見出し行を探して 市町村・指標 の 4 列を取り出す（見つからなければ None）。"""
+    for i in range(min(len(raw), HEADER_ROWS)):
+        found: dict[str, int] = {}
+        for j, value in enumerate(raw.iloc[i]):
+            field = COLUMNS.get(_label(value))
+            if field and field not in found:
+                found[field] = j
+        if len(found) == len(FIELDS):
+            body = raw.iloc[i + 1:, [found[f] for f in FIELDS]]
+            body.columns = list(FIELDS)
+            return body.reset_index(drop=True)
+    return None
+
+
+def parse_file(path: str | os.PathLike) -> tuple[pd.DataFrame, list[Problem]]:
+    """1 調査年分の (市町村, 年, 軒数, 客室数, 収容人数) と、見つかった問題。"""
+    path = Path(path)
+    empty = pd.DataFrame(columns=["市町村", "年", *METRICS])
+    year = survey_year(path)
+    if year is None:
+        return empty, [Problem(path.name, "ファイル名から調査年が分かりません")]
+    try:
+        table = _table(_read_raw(path))
+    except ImportError as exc:
+        # requirements.txt の openpyxl（.xlsx）と xlrd（.xls）
+        return empty, [Problem(path.name, f"Excel を読むライブラリがありません（{exc}）")]
+    if table is None:
+        return empty, [Problem(path.name, f"見出し（{'・'.join(FIELDS)}）が見つかりません")]
+
+    problems = []
+    raw_names = table["市町村"].map(
+        lambda v: re.sub(r"\s+", "", unicodedata.normalize("NFKC", str(v)))
+    )
+    names = table["市町村"].map(normalize_name)
+    keep = names.notna()
+    dup = raw_names[keep][raw_names[keep].duplicated()]
+    if len(dup):
+        problems.append(Problem(
+            path.name, f"同じ市町村の行が複数あります: {'、'.join(dup.unique())}"
+        ))
+
+    known = set(RegionIndex.build().municipalities)
+    unknown = sorted(set(names[keep]) - known)
+    if unknown:
+        problems.append(Problem(
+            path.name, f"エリア定義に無い市町村名です: {'、'.join(unknown)}"
+        ))
+
+    values = pd.DataFrame({m: _numbers(table[m]) for m in METRICS})[keep]
+    bad = values.isna().any(axis=1)
+    if bad.any():
+        problems.append(Problem(
+            path.name, f"数値を読めない行があります: {'、'.join(names[keep][bad])}"
+        ))
+
+    df = values.assign(市町村=names[keep]).groupby("市町村", sort=False).sum().reset_index()
+    df.insert(1, "年", year)
+    return df[["市町村", "年", *METRICS]], problems
+
+
+# -------------------------------------------------
+# 全ファイルの取り込み
+# -------------------------------------------------
+def raw_files(src: str | os.PathLike) -> list[Path]:
+    return sorted(p for p in Path(src).iterdir()
+                  if p.suffix.lower() in SUFFIXES and not p.name.startswith(("~$", ".")))
+
+
+def _with_totals(municipal: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """市町村の行にエリア合計と県合計の行を足した、指標ごとの long 形式。"""
+    frames = {m: municipal[["市町村", "年", m]] for m in METRICS}
+    store = MetricStore.from_frames(frames)
+    rollup = RegionIndex.build().rollup(store)
+    out = {}
+    for metric, df in frames.items():
+        values = rollup.values[metric]
+        r, c = np.nonzero(~np.isnan(values))
+        totals = pd.DataFrame({
+            "市町村": [rollup.names[i] for i in r],
+            "年": rollup.years[c],
+            metric: values[r, c],
+        })
+        out[metric] = pd.concat([df, totals]).sort_values("年", kind="stable")
+    return out
+
+
+def _write_csv(df: pd.DataFrame, path: Path) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    df.to_csv(tmp, index=False, encoding="utf-8-sig")
+    os.replace(tmp, path)
+
+
+def ingest(
+    src: str | os.PathLike,
+    dest: str | os.PathLike = ".",
+    workers: int | None = None,
+) -> list[Path]:
+    """src の元資料をすべて読み、dest に long 形式 CSV・県合計・Arrow キャッシュを書く。
+
+    workers=0 なら同じプロセスで順に解析する。書き出したファイルを返す。
+    """
+    dest = Path(dest)
+    paths = raw_files(src)
+    if not paths:
+        raise SchemaError([Problem(str(src), "元資料のファイルがありません")])
+
+    if workers == 0:
+        parsed = [parse_file(p) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(parse_file, paths))
+
+    problems = [p for _, found in parsed for p in found]
+    by_year: dict[int, list[str]] = {}
+    for path in paths:
+        by_year.setdefault(survey_year(path), []).append(path.name)
+    for year, names in by_year.items():
+        if year is not None and len(names) > 1:
+            problems.append(Problem("、".join(names), f"{year} 年のファイルが複数あります"))
+    if problems:
+        raise SchemaError(problems)
+
+    municipal = pd.concat([df for df, _ in parsed], ignore_index=True)
+    frames = conform(_with_totals(municipal), SOURCES)
+
+    dest.mkdir(parents=True, exist_ok=True)
+    written = []
+    for metric, df in frames.items():
+        _write_csv(df, dest / SOURCES[metric])
+        written.append(dest / SOURCES[metric])
+
+    totals = pd.DataFrame({"年": frames[METRICS[0]]["年"].unique()})
+    for metric, df in frames.items():
+        pref = df[df["市町村"] == PREFECTURE].set_index("年")[metric]
+        totals[metric] = totals["年"].map(pref)
+    _write_csv(totals.dropna().astype(np.int64), dest / TOTALS_FILE)
+    written.append(dest / TOTALS_FILE)
+
+    # 次の起動で CSV を解析せずに済むよう、Arrow キャッシュも作っておく
+    load_frames(dest)
+    return written
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="調査年ごとの元資料から long 形式データを作る")
+    parser.add_argument("src", type=Path, help="元資料（.xlsx / .xls / .csv）のあるディレクトリ")
+    parser.add_argument("--dest", type=Path, default=Path("."), help="書き出し先")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="プロセス数（省略時は CPU 数、0 なら並列化しない）")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    try:
+        written = ingest(args.src, args.dest, args.workers)
+    except SchemaError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    for path in written:
+        print(path)
+    print(f"{len(raw_files(args.src))} ファイル（{time.perf_counter() - t0:.1f} 秒）",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""CSV の読み込みと Arrow バイナリキャッシュ。
+
+初回だけ 3 つの long 形式 CSV を 1 つの Arrow (Feather v2) ファイルへ変換し、
+以降の起動では元ファイルの mtime / サイズ / SHA-256 が一致する限り
+そのファイルをメモリマップして読む。指紋は実際に解析したバイト列から取り、
+変換中に CSV が差し替えられたときはキャッシュを書かない。
+
+CSV は読んだ直後に schema で検査し、コンパクトな型（category / int16 /
+int32）にそろえる。Arrow キャッシュもその型のまま持つ。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+from typing import Iterable
+
+import pandas as pd
+
+from .profiling import CacheStats
+from .schema import (
+    NULLABLE_VALUE_DTYPE, VALUE_DTYPE, check_coverage, conform, conform_totals, conform_wide,
+)
+
+# 指標名 → 元 CSV ファイル名
+SOURCES = {
+    "軒数": "facilities_long.csv",
+    "客室数": "rooms_long.csv",
+    "収容人数": "capacity_long.csv",
+}
+KEYS = ["市町村", "年"]
+# 県合計の年次推移（年, 軒数, 客室数, 収容人数）。long 形式より古い年まである
+TOTALS_FILE = "okinawa_facilities_data.csv"
+
+CACHE_DIR = ".lodging_cache"
+CACHE_FILE = "long.arrow"
+_META_KEY = b"lodging.sources"
+_SCHEMA_KEY = b"lodging.schema"
+# キャッシュの列の型を変えたら上げる（古いキャッシュは作り直す）
+SCHEMA_VERSION = b"3"
+
+# Arrow キャッシュの命中数（プロセス全体）
+ARROW_CACHE = CacheStats()
+
+
+# -------------------------------------------------
+# 元ファイルの指紋
+# -------------------------------------------------
+def _stat(path: Path) -> dict:
+    st = path.stat()
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _fingerprint(paths: dict[str, Path]) -> dict:
+    return {
+        name: {**_stat(p), "sha256": _sha256(p)} for name, p in paths.items()
+    }
+
+
+def _changed(fingerprint: dict, paths: dict[str, Path]) -> bool:
+    """指紋を取った後に mtime かサイズが変わったファイルがあるか。"""
+    return any(
+        {k: fingerprint[name][k] for k in ("mtime_ns", "size")} != _stat(p)
+        for name, p in paths.items()
+    )
+
+
+def _stored_fingerprint(cache_path: Path) -> dict | None:
+    import pyarrow as pa
+
+    try:
+        with pa.memory_map(str(cache_path)) as src:
+            meta = pa.ipc.open_file(src).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    raw = meta.get(_META_KEY)
+    if not raw or meta.get(_SCHEMA_KEY) != SCHEMA_VERSION:
+        return None
+    return json.loads(raw)
+
+
+def _check(stored: dict | None, paths: dict[str, Path]) -> tuple[bool, list[str]]:
+    """(キャッシュが有効か, mtime だけずれたファイル) を返す。
+
+    mtime とサイズが一致すれば即ヒット、ずれていればハッシュで判定する。
+    """
+    if stored is None or set(stored) != set(paths):
+        return False, []
+    drifted = [
+        name for name, p in paths.items()
+        if {k: stored[name].get(k) for k in ("mtime_ns", "size")} != _stat(p)
+    ]
+    fresh = all(
+        _sha256(paths[name]) == stored[name].get("sha256") for name in drifted
+    )
+    return fresh, drifted
+
+
+# -------------------------------------------------
+# 変換
+# -------------------------------------------------
+def _read_csv(paths: dict[str, Path]) -> tuple[dict[str, pd.DataFrame], dict]:
+    """(指標ごとの DataFrame, 解析したバイト列の指紋)。
+
+    各ファイルは 1 度だけ読み、そのバイト列をハッシュしてから解析する。
+    mtime / サイズは読む前に取るので、読んでいる間に差し替えられると
+    後の _changed() で分かる。
+    """
+    frames, fingerprint = {}, {}
+    for col, p in paths.items():
+        stat = _stat(p)
+        data = p.read_bytes()
+        fingerprint[col] = {**stat, "sha256": hashlib.sha256(data).hexdigest()}
+        frames[col] = pd.read_csv(io.BytesIO(data), encoding="utf-8-sig")
+    return conform(frames, SOURCES), fingerprint
+
+
+def read_csv_frames(data_dir: str | os.PathLike = ".") -> dict[str, pd.DataFrame]:
+    """元 CSV を指標ごとに読み、検査してスキーマの型にそろえる（BOM 付きヘッダに対応）。
+
+    問題があれば schema.SchemaError。
+    """
+    data_dir = Path(data_dir)
+    return _read_csv({col: data_dir / fname for col, fname in SOURCES.items()})[0]
+
+
+def _to_wide(frames: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """指標を横に並べた表。外部結合で欠けたセルは欠損のまま、型はスキーマに戻す。"""
+    wide = None
+    for col, df in frames.items():
+        df = df[KEYS + [col]]
+        wide = df if wide is None else wide.merge(df, on=KEYS, how="outer")
+    wide = wide.sort_values(["年", "市町村"], kind="stable").reset_index(drop=True)
+    return conform_wide(wide, frames)
+
+
+def _write_cache(wide: pd.DataFrame, cache_path: Path, fingerprint: dict) -> None:
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(wide, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        _META_KEY: json.dumps(fingerprint).encode(),
+        _SCHEMA_KEY: SCHEMA_VERSION,
+    })
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    # メモリマップで読めるよう非圧縮で書き、rename で差し替える
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with pa.ipc.new_file(
+            sink, table.schema,
+            options=pa.ipc.IpcWriteOptions(compression=None),
+        ) as writer:
+            writer.write_table(table)
+    os.replace(tmp, cache_path)
+
+
+def _read_cache(cache_path: Path) -> pd.DataFrame:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    # null 付きの int32 も float64 にせず Int32 のまま読む（指紋の更新で書き戻すため）
+    table = feather.read_table(str(cache_path), memory_map=True)
+    return table.to_pandas(types_mapper={pa.int32(): NULLABLE_VALUE_DTYPE}.get)
+
+
+def _split(wide: pd.DataFrame) -> tuple[pd.DataFrame, ...]:
+    out = []
+    for col in SOURCES:
+        df = wide[KEYS + [col]].dropna(subset=[col])
+        df[col] = df[col].astype(VALUE_DTYPE)
+        out.append(df.reset_index(drop=True))
+    return tuple(out)
+
+
+# -------------------------------------------------
+# 公開 API
+# -------------------------------------------------
+def load_frames(
+    data_dir: str | os.PathLike = ".",
+    cache_dir: str | os.PathLike | None = None,
+    required: Iterable[str] = (),
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """(軒数, 客室数, 収容人数) の long 形式 DataFrame を返す。
+
+    required の市町村（エリア定義の市町村など）がどれかの指標に無ければ
+    schema.SchemaError。pyarrow が無い環境やキャッシュを書けない環境では
+    CSV を直接読む。
+    """
+    frames = _load(Path(data_dir), cache_dir)
+    check_coverage(dict(zip(SOURCES, frames)), required, SOURCES)
+    return frames
+
+
+def _load(
+    data_dir: Path, cache_dir: str | os.PathLike | None
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    paths = {col: data_dir / fname for col, fname in SOURCES.items()}
+    for p in paths.values():
+        if not p.exists():
+            raise FileNotFoundError(p)
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return _split(_to_wide(read_csv_frames(data_dir)))
+
+    cache_path = Path(cache_dir or data_dir / CACHE_DIR) / CACHE_FILE
+    stored = _stored_fingerprint(cache_path)
+    fresh, drifted = _check(stored, paths)
+    if fresh:
+        ARROW_CACHE.hit()
+        wide = _read_cache(cache_path)
+        if not drifted:
+            return _split(wide)
+        # 内容は同じで mtime だけ変わった（checkout や touch）→ 指紋だけ更新。
+        # 取り直した指紋の中身がキャッシュと違えば、その間に差し替えられている
+        fingerprint = _fingerprint(paths)
+        stale = any(fingerprint[n]["sha256"] != stored[n]["sha256"] for n in paths)
+    else:
+        ARROW_CACHE.miss()
+        frames, fingerprint = _read_csv(paths)
+        wide = _to_wide(frames)
+        # 変換中に差し替えられたら、古い値を新しいファイルの指紋で残さない
+        stale = _changed(fingerprint, paths)
+    if not stale:
+        try:
+            _write_cache(wide, cache_path, fingerprint)
+        except OSError:
+            pass
+    return _split(wide)
+
+
+def load_totals(data_dir: str | os.PathLike = ".") -> pd.DataFrame:
+    """県合計の年次推移を読む（問題があれば schema.SchemaError）。"""
+    df = pd.read_csv(Path(data_dir) / TOTALS_FILE, encoding="utf-8-sig")
+    return conform_totals(df, SOURCES, TOTALS_FILE)
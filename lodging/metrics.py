@@ -0,0 +1,385 @@
+"""増減数・前回比・CAGR・比率などの派生指標。
+
+いずれも年昇順の (…, 年) 配列に対して一括で計算する。1 列前ではなく
+「直前に値がある調査年」と比べるので、2002 年以前の隔年調査や欠測年が
+あっても正しく差分が取れ、前回比は経過年数で年率換算する。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Mapping
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from .store import MetricStore
+
+# 比率名 → (分子, 分母)
+RATIOS = {
+    "客室数/軒数": ("客室数", "軒数"),
+    "収容人数/客室数": ("収容人数", "客室数"),
+}
+# トレンドの当てはめ方。"log" は log(値) に直線を当てはめる（一定率の成長）
+TREND_METHODS = ("linear", "log")
+
+
+# -------------------------------------------------
+# 配列演算
+# -------------------------------------------------
+def _last_valid(valid: np.ndarray) -> np.ndarray:
+    """各位置以前で最後に値がある列番号（無ければ -1）。"""
+    idx = np.where(valid, np.arange(valid.shape[-1]), -1)
+    return np.maximum.accumulate(idx, axis=-1)
+
+
+def _next_valid(valid: np.ndarray) -> np.ndarray:
+    """各位置以降で最初に値がある列番号（無ければ 年数）。"""
+    n = valid.shape[-1]
+    idx = np.where(valid, np.arange(n), n)
+    return np.minimum.accumulate(idx[..., ::-1], axis=-1)[..., ::-1]
+
+
+def observed_span(valid: np.ndarray) -> np.ndarray:
+    """(…, 2) の [最初, 最後] に値がある列番号（無ければ [年数, -1]）。"""
+    n = valid.shape[-1]
+    first = np.where(valid.any(-1), valid.argmax(-1), n)
+    last = np.where(valid.any(-1), n - 1 - valid[..., ::-1].argmax(-1), -1)
+    return np.stack([first, last], -1).astype(np.int32)
+
+
+def step_changes(
+    years: np.ndarray, values: np.ndarray, start: int = 0
+) -> tuple[np.ndarray, np.ndarray]:
+    """直前の調査値からの (増減数, 年率換算の前回比 %) を返す。
+
+    values は最終軸が年の配列。増減数は比較対象が無い位置で 0、
+    前回比は NaN。start を渡すと start 列目以降だけを計算して返す
+    （それより前の列は直前の観測値を探すのにだけ使う）。
+    """
+    valid = ~np.isnan(values)
+    n = values.shape[-1]
+    if start > 0:
+        seed = _last_valid(valid[..., :start])[..., -1:]
+    else:
+        seed = np.full(values.shape[:-1] + (1,), -1, dtype=np.intp)
+    idx = np.where(valid[..., start:], np.arange(start, n), -1)
+    prev = np.maximum.accumulate(
+        np.concatenate([seed, idx], axis=-1), axis=-1
+    )[..., :-1]
+
+    tail = values[..., start:]
+    has_prev = valid[..., start:] & (prev >= 0)
+    safe_prev = np.where(has_prev, prev, 0)
+    before = np.take_along_axis(values, safe_prev, axis=-1)
+    gap = years[start:] - years[safe_prev]
+
+    delta = np.where(has_prev, tail - before, 0.0).astype(values.dtype, copy=False)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        yoy = (np.power(tail / before, 1.0 / gap) - 1.0) * 100.0
+    yoy = np.where(has_prev & (before > 0), yoy, np.nan).astype(values.dtype, copy=False)
+    return delta, yoy
+
+
+def _ratio(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = num / den
+    return np.where(den > 0, r, np.nan).astype(num.dtype, copy=False)
+
+
+def _pad(old: np.ndarray, shape: tuple[int, ...], fill: float) -> np.ndarray:
+    """old を左上に置いた shape の配列（残りは fill）。"""
+    out = np.full(shape, fill, dtype=old.dtype)
+    out[tuple(slice(0, k) for k in old.shape)] = old
+    return out
+
+
+def window_cagr(
+    years: np.ndarray, values: np.ndarray, cols: slice
+) -> np.ndarray:
+    """期間 cols 内の最初と最後の観測値から求めた年平均成長率 (%)。"""
+    window = values[..., cols]
+    if window.shape[-1] == 0:
+        return np.full(values.shape[:-1], np.nan)
+    valid = ~np.isnan(window)
+    first = _next_valid(valid)[..., :1]
+    last = _last_valid(valid)[..., -1:]
+    ok = (last >= 0) & (first < window.shape[-1])
+    first, last = np.where(ok, first, 0), np.where(ok, last, 0)
+
+    y = years[cols]
+    v0 = np.take_along_axis(window, first, axis=-1)[..., 0]
+    v1 = np.take_along_axis(window, last, axis=-1)[..., 0]
+    span = (y[last] - y[first])[..., 0]
+    ok = ok[..., 0] & (span > 0) & (v0 > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cagr = (np.power(v1 / v0, 1.0 / span) - 1.0) * 100.0
+    return np.where(ok, cagr, np.nan)
+
+
+@dataclass(frozen=True)
+class WindowChange:
+    """期間の始点・終点の値と、その増減数・増減率 (%)。
+
+    始点・終点の値は、その年以前で最後の調査値（隔年調査や欠測年を埋める）。
+    始点以前に調査が無い系列、始点より前に調査が途切れた系列は NaN。
+    """
+
+    start: np.ndarray
+    end: np.ndarray
+    change: np.ndarray
+    pct: np.ndarray
+
+    def __getitem__(self, index) -> "WindowChange":
+        return WindowChange(self.start[index], self.end[index],
+                            self.change[index], self.pct[index])
+
+
+def window_change(
+    values: np.ndarray, cumdelta: np.ndarray, span: np.ndarray, cols: slice
+) -> WindowChange:
+    """期間 cols の増減を累積和の差から求める（系列あたり定数時間）。
+
+    cumdelta は増減数の年方向の累積和、span は observed_span の結果。
+    """
+    lo, hi = cols.start, cols.stop
+    if hi <= lo:
+        nan = np.full(values.shape[:-1], np.nan)
+        return WindowChange(nan, nan, nan, nan)
+    first, last = span[..., 0], span[..., 1]
+    ok = (first <= lo) & (last >= lo)
+    origin = np.take_along_axis(values, np.where(ok, first, 0)[..., None], -1)[..., 0]
+    start = np.where(ok, origin + cumdelta[..., lo], np.nan)
+    end = np.where(ok, origin + cumdelta[..., hi - 1], np.nan)
+    change = end - start
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(start > 0, change / start * 100.0, np.nan)
+    return WindowChange(start, end, change, pct)
+
+
+@dataclass(frozen=True)
+class Trend:
+    """系列ごとの回帰直線 y = intercept + slope × (年 - center)。
+
+    log なら y は log(値)。観測が 2 年未満の系列は NaN。
+    """
+
+    slope: np.ndarray
+    intercept: np.ndarray
+    center: float
+    log: bool
+    n: np.ndarray  # 当てはめに使った観測数
+
+    def __getitem__(self, index) -> "Trend":
+        return Trend(self.slope[index], self.intercept[index], self.center,
+                     self.log, self.n[index])
+
+    def predict(self, years: np.ndarray) -> np.ndarray:
+        """(…, len(years)) の推定値。"""
+        x = np.asarray(years, dtype=float) - self.center
+        y = self.intercept[..., None] + self.slope[..., None] * x
+        return np.exp(y) if self.log else y
+
+
+def fit_trend(
+    years: np.ndarray, values: np.ndarray, cols: slice, method: str = "linear"
+) -> Trend:
+    """期間 cols の全系列に直線を当てはめる（最小二乗、欠測年は除く）。
+
+    系列ごとに観測年が違っても 1 回で解けるよう、正規方程式を
+    (…, 2, 2) に積んで np.linalg.solve でまとめて解く。
+    """
+    if method not in TREND_METHODS:
+        raise ValueError(f"未知のトレンド: {method}")
+    log = method == "log"
+    window = np.asarray(values[..., cols], dtype=float)
+    x = years[cols].astype(float)
+    center = float(x.mean()) if len(x) else 0.0
+    x = x - center
+
+    if log:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            window = np.where(window > 0, np.log(window), np.nan)
+    valid = ~np.isnan(window)
+    y = np.where(valid, window, 0.0)
+    w = valid.astype(float)
+
+    sw, sx, sxx = w.sum(-1), (w * x).sum(-1), (w * x * x).sum(-1)
+    sy, sxy = y.sum(-1), (y * x).sum(-1)
+    ok = (sw >= 2) & (sw * sxx - sx * sx > 0)
+
+    gram = np.stack([np.stack([sw, sx], -1), np.stack([sx, sxx], -1)], -2)
+    gram = np.where(ok[..., None, None], gram, np.eye(2))
+    coef = np.linalg.solve(gram, np.stack([sy, sxy], -1)[..., None])[..., 0]
+    return Trend(
+        slope=np.where(ok, coef[..., 1], np.nan),
+        intercept=np.where(ok, coef[..., 0], np.nan),
+        center=center,
+        log=log,
+        n=sw.astype(np.int64),
+    )
+
+
+# -------------------------------------------------
+# long 形式 DataFrame 向け
+# -------------------------------------------------
+def calculate_metrics(df: pd.DataFrame, col: str) -> pd.DataFrame:
+    """増減数列を付けたコピーを返す（行の並び順に依存しない）。"""
+    df = df.copy()
+    wide = df.pivot(index="市町村", columns="年", values=col).sort_index(axis=1)
+    delta, _ = step_changes(wide.columns.to_numpy(), wide.to_numpy(dtype=float))
+    r = wide.index.get_indexer(df["市町村"])
+    c = wide.columns.get_indexer(df["年"])
+    df["増減数"] = delta[r, c].astype(int)
+    return df
+
+
+# -------------------------------------------------
+# ストア全体の派生指標
+# -------------------------------------------------
+@dataclass(frozen=True)
+class DerivedMetrics:
+    """MetricStore 全体の派生指標。プロセス内で 1 つを共有する想定。
+
+    stacked は元ストアの配列そのもの（コピーしない）。派生指標の型も元の値に
+    そろえる。
+    """
+
+    years: np.ndarray
+    metrics: tuple[str, ...]
+    stacked: np.ndarray = field(repr=False)  # (指標, 市町村, 年)
+    delta: Mapping[str, np.ndarray] = field(repr=False)
+    yoy: Mapping[str, np.ndarray] = field(repr=False)
+    ratios: Mapping[str, np.ndarray] = field(repr=False)
+    cumdelta: Mapping[str, np.ndarray] = field(repr=False)  # 増減数の累積和
+    span: Mapping[str, np.ndarray] = field(repr=False)      # 観測の [最初, 最後] の列
+    _cagr: dict = field(default_factory=dict, repr=False, compare=False)
+    _trend: dict = field(default_factory=dict, repr=False, compare=False)
+    _change: dict = field(default_factory=dict, repr=False, compare=False)
+
+    @classmethod
+    def from_store(cls, store: "MetricStore") -> "DerivedMetrics":
+        metrics = tuple(store.values)
+        stacked = store.stacked(metrics)
+        delta, yoy = step_changes(store.years, stacked)
+
+        ratios = {
+            name: _ratio(store.values[num], store.values[den])
+            for name, (num, den) in RATIOS.items()
+            if num in store.values and den in store.values
+        }
+
+        cumdelta = np.cumsum(delta, axis=-1, dtype=delta.dtype)
+        span = observed_span(~np.isnan(stacked))
+
+        for a in (delta, yoy, cumdelta, span, *ratios.values()):
+            a.setflags(write=False)
+        return cls(
+            years=store.years,
+            metrics=metrics,
+            stacked=stacked,
+            delta=dict(zip(metrics, delta)),
+            yoy=dict(zip(metrics, yoy)),
+            ratios=ratios,
+            cumdelta=dict(zip(metrics, cumdelta)),
+            span=dict(zip(metrics, span)),
+        )
+
+    def extend(self, store: "MetricStore", start: int) -> "DerivedMetrics":
+        """store（self の元ストアに行・年を追加したもの）の派生指標。
+
+        start 列目以降（新しい年）だけを計算し、それより前は self の結果を
+        そのまま使う。追加された市町村の既存年は欠測扱い。
+        """
+        metrics = self.metrics
+        stacked = store.stacked(metrics)
+        shape = stacked.shape
+        head = (shape[0], shape[1], start)
+        delta_new, yoy_new = step_changes(store.years, stacked, start)
+
+        delta = _pad(np.stack([self.delta[m] for m in metrics])[..., :start], head, 0.0)
+        yoy = _pad(np.stack([self.yoy[m] for m in metrics])[..., :start], head, np.nan)
+        delta = np.concatenate([delta, delta_new], axis=-1)
+        yoy = np.concatenate([yoy, yoy_new], axis=-1)
+
+        ratios = {}
+        for name, old in self.ratios.items():
+            num, den = RATIOS[name]
+            ratios[name] = np.concatenate([
+                _pad(old[:, :start], (shape[1], start), np.nan),
+                _ratio(store.values[num][:, start:], store.values[den][:, start:]),
+            ], axis=-1)
+
+        # 累積和は既存の最終列に新しい年の増減数を積み足す
+        cum_old = _pad(np.stack([self.cumdelta[m] for m in metrics])[..., :start], head, 0.0)
+        cum_new = cum_old[..., -1:] + np.cumsum(delta_new, axis=-1, dtype=delta_new.dtype)
+        cumdelta = np.concatenate([cum_old, cum_new], axis=-1)
+
+        old = _pad(np.stack([self.span[m] for m in metrics]), (shape[0], shape[1], 2), 0)
+        old[:, len(self.span[metrics[0]]):] = (start, -1)
+        new = observed_span(~np.isnan(stacked[..., start:])) + start
+        span = np.stack([
+            np.where(old[..., 0] < start, old[..., 0], new[..., 0]),
+            np.where(new[..., 1] >= start, new[..., 1], old[..., 1]),
+        ], -1).astype(np.int32)
+
+        for a in (delta, yoy, cumdelta, span, *ratios.values()):
+            a.setflags(write=False)
+        return type(self)(
+            years=store.years,
+            metrics=metrics,
+            stacked=stacked,
+            delta=dict(zip(metrics, delta)),
+            yoy=dict(zip(metrics, yoy)),
+            ratios=ratios,
+            cumdelta=dict(zip(metrics, cumdelta)),
+            span=dict(zip(metrics, span)),
+        )
+
+    def cagr(self, start: int, end: int) -> Mapping[str, np.ndarray]:
+        """指標 → 市町村ごとの CAGR (%)。期間ごとにメモ化する。"""
+        key = (int(start), int(end))
+        if key not in self._cagr:
+            lo = int(np.searchsorted(self.years, start, side="left"))
+            hi = int(np.searchsorted(self.years, end, side="right"))
+            out = window_cagr(self.years, self.stacked, slice(lo, hi))
+            out.setflags(write=False)
+            self._cagr[key] = dict(zip(self.metrics, out))
+        return self._cagr[key]
+
+    def change(self, start: int, end: int) -> Mapping[str, WindowChange]:
+        """指標 → 全市町村の期間の増減。期間ごとにメモ化する。"""
+        key = (int(start), int(end))
+        if key not in self._change:
+            # 始点はその年以前で最後の列（調査の無い年を始点にしたとき）
+            lo = max(int(np.searchsorted(self.years, start, side="right")) - 1, 0)
+            hi = int(np.searchsorted(self.years, end, side="right"))
+            self._change[key] = {
+                m: window_change(self.stacked[i], self.cumdelta[m], self.span[m],
+                                 slice(lo, hi))
+                for i, m in enumerate(self.metrics)
+            }
+        return self._change[key]
+
+    def trend(self, start: int, end: int, method: str = "linear") -> Mapping[str, Trend]:
+        """指標 → 全市町村の回帰直線。期間と方法ごとにメモ化する。"""
+        key = (int(start), int(end), method)
+        if key not in self._trend:
+            lo = int(np.searchsorted(self.years, start, side="left"))
+            hi = int(np.searchsorted(self.years, end, side="right"))
+            fit = fit_trend(self.years, self.stacked, slice(lo, hi), method)
+            self._trend[key] = {m: fit[i] for i, m in enumerate(self.metrics)}
+        return self._trend[key]
+
+
+def cagr_labels(
+    store: "MetricStore", element: str, names: list[str], years: tuple[int, int]
+) -> list[str]:
+    """「那覇市 +5.2%」形式の CAGR 表示（値が定まらない系列は除く）。"""
+    cagr = store.derived.cagr(*years)[element]
+    return [
+        f"{n} {cagr[store.row[n]]:+.1f}%"
+        for n in names
+        if n in store.row and not np.isnan(cagr[store.row[n]])
+    ]
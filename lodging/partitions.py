@@ -0,0 +1,180 @@
+"""都道府県 × 指標で分割した Arrow パーティションと、遅延読み込み。
+
+    <root>/prefecture=沖縄県/metric=軒数.arrow
+    <root>/prefecture=沖縄県/metric=客室数.arrow
+    ...
+
+各パーティションは (市町村, 年, 指標) の long 形式を非圧縮の Arrow IPC で
+持つ。読み込みはメモリマップで、実際に開かれた都道府県のストアだけを
+LRU で保持し、件数かバイト数が上限を超えたら最も長く使われていないものから
+捨てる。読み込んだパーティションは CSV と同じスキーマ検査を通す。
+
+    python -m lodging.partitions 沖縄県 --src . --dest partitions
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Mapping
+
+import pandas as pd
+
+from .loader import KEYS, SOURCES, read_csv_frames
+from .schema import Problem, SchemaError, check_coverage, conform
+from .store import METRICS, MetricStore
+
+
+def partition_path(root: str | os.PathLike, prefecture: str, metric: str) -> Path:
+    return Path(root) / f"prefecture={prefecture}" / f"metric={metric}.arrow"
+
+
+def write_partitions(
+    root: str | os.PathLike, prefecture: str, frames: Mapping[str, pd.DataFrame]
+) -> list[Path]:
+    """1 都道府県分の指標ごとの long 形式 DataFrame を書き出す。"""
+    import pyarrow as pa
+
+    written = []
+    for metric, df in frames.items():
+        path = partition_path(root, prefecture, metric)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(
+            df[KEYS + [metric]].sort_values(["年", "市町村"], kind="stable"),
+            preserve_index=False,
+        )
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with pa.OSFile(str(tmp), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+        written.append(path)
+    return written
+
+
+class PartitionedDataset:
+    """パーティション群への遅延アクセス。プロセス内で 1 つを共有する想定。"""
+
+    def __init__(
+        self,
+        root: str | os.PathLike,
+        max_prefectures: int = 8,
+        max_bytes: int = 512 * 2**20,
+    ):
+        self.root = Path(root)
+        self.max_prefectures = max_prefectures
+        self.max_bytes = max_bytes
+        self._stores: OrderedDict[tuple, MetricStore] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    # ---------- 一覧 ----------
+    def prefectures(self) -> list[str]:
+        if not self.root.is_dir():
+            return []
+        return sorted(
+            p.name.split("=", 1)[1]
+            for p in self.root.iterdir()
+            if p.is_dir() and p.name.startswith("prefecture=")
+        )
+
+    def metrics(self, prefecture: str) -> list[str]:
+        return [m for m in METRICS
+                if partition_path(self.root, prefecture, m).exists()]
+
+    # ---------- 読み込み ----------
+    def load_data(
+        self, prefecture: str, metrics: Iterable[str] = METRICS
+    ) -> tuple[pd.DataFrame, ...]:
+        """指定都道府県の long 形式 DataFrame を指標の順に返す（キャッシュしない）。
+
+        壊れた・書きかけのファイルやスキーマに合わないときは SchemaError
+        （ファイル名つき）。
+        """
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        frames, sources, problems = {}, {}, []
+        for metric in metrics:
+            path = partition_path(self.root, prefecture, metric)
+            if not path.exists():
+                raise FileNotFoundError(path)
+            sources[metric] = str(path.relative_to(self.root))
+            try:
+                frames[metric] = feather.read_table(str(path), memory_map=True).to_pandas()
+            except (OSError, pa.ArrowInvalid) as exc:
+                problems.append(Problem(sources[metric], f"Arrow ファイルとして読めません（{exc}）"))
+        if problems:
+            raise SchemaError(problems)
+        return tuple(conform(frames, sources).values())
+
+    def store(
+        self,
+        prefecture: str,
+        metrics: Iterable[str] = METRICS,
+        required: Iterable[str] = (),
+    ) -> MetricStore:
+        """指定都道府県の MetricStore。使われた順に LRU で保持する。
+
+        指標のパーティションが欠けている・スキーマに合わない・required の
+        市町村がそろっていないときは SchemaError。
+        """
+        metrics = tuple(metrics)
+        key = (prefecture, metrics)
+        with self._lock:
+            if key in self._stores:
+                self._stores.move_to_end(key)
+                return self._stores[key]
+
+        missing = [m for m in metrics if not partition_path(self.root, prefecture, m).exists()]
+        if missing:
+            raise SchemaError([Problem(
+                f"prefecture={prefecture}",
+                f"指標のパーティションがありません: {'、'.join(missing)}",
+            )])
+        frames = dict(zip(metrics, self.load_data(prefecture, metrics)))
+        check_coverage(frames, required)
+        store = MetricStore.from_frames(frames).precompute()
+        with self._lock:
+            if key not in self._stores:
+                self._stores[key] = store
+                self._bytes += store.nbytes
+                self._evict()
+            return self._stores[key]
+
+    def _evict(self) -> None:
+        # 直前に入れた 1 件は上限を超えていても残す
+        while len(self._stores) > 1 and (
+            len(self._stores) > self.max_prefectures or self._bytes > self.max_bytes
+        ):
+            _, old = self._stores.popitem(last=False)
+            self._bytes -= old.nbytes
+
+    def loaded(self) -> list[str]:
+        """メモリ上にある都道府県（古い順）。"""
+        return [pref for pref, _ in self._stores]
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="long 形式 CSV を都道府県パーティションへ書き出す")
+    parser.add_argument("prefecture", help="書き出す都道府県名（例: 沖縄県）")
+    parser.add_argument("--src", type=Path, default=Path("."),
+                        help=f"{' / '.join(SOURCES.values())} のあるディレクトリ")
+    parser.add_argument("--dest", type=Path, default=Path("partitions"))
+    args = parser.parse_args(argv)
+
+    for path in write_partitions(args.dest, args.prefecture, read_csv_frames(args.src)):
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""図と集計表の事前描画（バッチビルド）と、その読み出し。
+
+データの更新は年 1 回なので、よく見られる組み合わせ（エリア・市町村それぞれの
+単独選択と全選択 × 要素 × 既定と代表的な期間）をあらかじめプロセスプールで
+描画しておく。アプリはここにあるものはファイルを読むだけで返し、無いものは
+その場で計算する。
+
+    python -m lodging.prerender --src . --dest artifacts --workers 4
+
+    <dest>/CURRENT                                  最新の版名
+    <dest>/<版>/manifest.json
+    <dest>/<版>/<flavor>/figures/<キーのハッシュ>.json
+    <dest>/<版>/<flavor>/tables/<キーのハッシュ>.arrow
+
+版名は作成時刻とデータの指紋。アプリは指紋が今のデータと一致する版だけを
+使う。flavor はアプリの別（"app" = app.py、"streamlit-app" = streamlit-app/app.py）。
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Hashable, Iterable
+
+import pandas as pd
+
+from .figcache import figure_key
+from .figures import overview_figure, ranked_figure, selection_figure
+from .profiling import CacheStats
+from .regions import PREFECTURE, RegionIndex, municipality_names
+from .store import METRICS, MetricStore, load_store
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+FLAVORS = ("app", "streamlit-app")
+# flavor → 図のキーの scope
+SCOPES = {"app": PREFECTURE, "streamlit-app": ""}
+CURRENT = "CURRENT"
+MANIFEST = "manifest.json"
+
+
+# -------------------------------------------------
+# 図の組み立て（アプリと事前描画で共通）
+# -------------------------------------------------
+def area_figure(flavor: str, regions: MetricStore, element: str,
+                names: Iterable[str], years: tuple[int, int]) -> "go.Figure":
+    names = list(names)
+    if flavor == "streamlit-app":
+        return selection_figure(
+            regions, "エリア", element, names, years,
+            legend=dict(orientation="h", y=1.02, x=0.5, xanchor="center"),
+            title=f"選択したエリアの{element}の推移",
+        )
+    return selection_figure(regions, "エリア", element, names, years)
+
+
+def municipality_figure(flavor: str, store: MetricStore, element: str,
+                        names: Iterable[str], years: tuple[int, int]) -> "go.Figure":
+    names = list(names)
+    if flavor == "streamlit-app":
+        return ranked_figure(store, element, names, years)
+    return selection_figure(store, "市町村", element, names, years)
+
+
+def default_years(store: MetricStore, flavor: str) -> tuple[int, int]:
+    """サイドバーの期間スライダーの既定値。"""
+    first, last = int(store.years[0]), int(store.years[-1])
+    if flavor == "streamlit-app":
+        return (2007, last)
+    return (max(2007, first), last)
+
+
+def year_ranges(store: MetricStore, flavor: str) -> list[tuple[int, int]]:
+    """既定値・全期間・直近 10 年・直近 5 年（重複は除く）。"""
+    first, last = int(store.years[0]), int(store.years[-1])
+    ranges = [default_years(store, flavor), (first, last),
+              (max(first, last - 9), last), (max(first, last - 4), last)]
+    return list(dict.fromkeys(ranges))
+
+
+# -------------------------------------------------
+# 描画する組み合わせ
+# -------------------------------------------------
+@dataclass(frozen=True)
+class Job:
+    flavor: str
+    kind: str                   # "overview" / "area" / "municipality"
+    key: Hashable
+    element: str = ""
+    names: tuple[str, ...] = ()
+    years: tuple[int, int] = (0, 0)
+
+
+def key_digest(key: Hashable) -> str:
+    return hashlib.sha1(json.dumps(key, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def jobs(store: MetricStore, regions: MetricStore | None, flavor: str) -> list[Job]:
+    scope = SCOPES[flavor]
+    out = []
+    if flavor == "app":
+        if PREFECTURE in store.row or regions is not None:
+            out.append(Job(flavor, "overview", ("overview", PREFECTURE)))
+        municipalities = municipality_names(store.names, PREFECTURE)
+    else:
+        # streamlit-app の県全体グラフは県合計のファイルから作るので対象外
+        municipalities = list(store.names)
+
+    choices = [("municipality", municipalities)]
+    if regions is not None:
+        choices.insert(0, ("area", [n for n in regions.names if n != PREFECTURE]))
+
+    for kind, names in choices:
+        selections = [(n,) for n in names] + [tuple(names)]
+        for years in year_ranges(store, flavor):
+            for element in METRICS:
+                for sel in selections:
+                    key = figure_key(kind, element, sel, years, scope=scope)
+                    out.append(Job(flavor, kind, key, element, key.selection, years))
+    return out
+
+
+def render(job: Job, store: MetricStore, regions: MetricStore | None,
+           root: Path) -> tuple[int, int]:
+    """job の図（と表）を root/<flavor>/ に書き、書いた (図, 表) の数を返す。"""
+    import plotly.io as pio
+
+    if job.kind == "overview":
+        source = store if PREFECTURE in store.row or regions is None else regions
+        fig, table = overview_figure(source, PREFECTURE), None
+    elif job.kind == "area":
+        fig = area_figure(job.flavor, regions, job.element, job.names, job.years)
+        table = regions.pivot(job.element, job.names, job.years)
+    else:
+        fig = municipality_figure(job.flavor, store, job.element, job.names, job.years)
+        table = store.pivot(job.element, job.names, job.years)
+
+    digest = key_digest(job.key)
+    base = root / job.flavor
+    path = base / "figures" / f"{digest}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(pio.to_json(fig, validate=False), encoding="utf-8")
+    if table is None:
+        return 1, 0
+
+    import pyarrow.feather as feather
+
+    path = base / "tables" / f"{digest}.arrow"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table.columns = table.columns.map(str)
+    feather.write_feather(table.reset_index(), str(path), compression="uncompressed")
+    return 1, 1
+
+
+# ワーカープロセスごとに 1 回だけ読み込む
+_worker: dict = {}
+
+
+def _init_worker(src: str) -> None:
+    store = load_store(src)
+    _worker["store"] = store
+    _worker["regions"] = _rollup(store)
+
+
+def _render_in_worker(root: str, job: Job) -> tuple[int, int]:
+    return render(job, _worker["store"], _worker["regions"], Path(root))
+
+
+def _rollup(store: MetricStore) -> MetricStore | None:
+    """エリア定義の市町村が 1 つでもあればエリア合計を作る。"""
+    index = RegionIndex.build()
+    if len(index.missing(store)) == len(index.municipalities):
+        return None
+    return index.rollup(store)
+
+
+# -------------------------------------------------
+# ビルド
+# -------------------------------------------------
+def build(
+    src: str | os.PathLike,
+    dest: str | os.PathLike,
+    flavors: Iterable[str] = FLAVORS,
+    workers: int | None = None,
+    keep: int = 3,
+) -> Path:
+    """新しい版を書き出して CURRENT を切り替え、その版のディレクトリを返す。
+
+    workers=0 なら同じプロセスで順に描画する。古い版は keep 個まで残す。
+    """
+    dest = Path(dest)
+    store = load_store(src)
+    regions = _rollup(store)
+    version = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{store.fingerprint[:12]}"
+    tmp = dest / f".{version}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    todo = [job for flavor in flavors for job in jobs(store, regions, flavor)]
+    if workers == 0:
+        done = [render(job, store, regions, tmp) for job in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(str(src),)) as pool:
+            done = list(pool.map(partial(_render_in_worker, str(tmp)), todo,
+                                 chunksize=16))
+
+    counts: dict[str, dict[str, int]] = {}
+    for job, (figures, tables) in zip(todo, done):
+        n = counts.setdefault(job.flavor, {"figures": 0, "tables": 0})
+        n["figures"] += figures
+        n["tables"] += tables
+
+    manifest = {
+        "version": version,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "fingerprint": store.fingerprint,
+        "years": [int(store.years[0]), int(store.years[-1])],
+        "flavors": counts,
+    }
+    (tmp / MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False, indent=2),
+                                encoding="utf-8")
+    final = dest / version
+    # 同じ秒に同じデータで作り直した場合は中身も同じなので置き換える
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+
+    current = dest / f".{CURRENT}.{os.getpid()}.tmp"
+    current.write_text(version + "\n", encoding="utf-8")
+    os.replace(current, dest / CURRENT)
+    _prune(dest, keep)
+    return final
+
+
+def _prune(dest: Path, keep: int) -> None:
+    versions = sorted(p for p in dest.iterdir() if p.is_dir() and not p.name.startswith("."))
+    for old in versions[:-keep] if keep > 0 else []:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+# -------------------------------------------------
+# 読み出し
+# -------------------------------------------------
+class ArtifactStore:
+    """事前描画済みの図と表。見つからなければ None を返す（呼び出し側で計算する）。
+
+    FigureCache / TableCache の get_or_build に prebuilt として渡す。
+    """
+
+    def __init__(self, root: Path | None = None, version: str | None = None):
+        self.root = root
+        self.version = version
+        self.stats = CacheStats()
+
+    @classmethod
+    def open(cls, dest: str | os.PathLike, flavor: str, fingerprint: str) -> "ArtifactStore":
+        """最新版を開く。無いとき・データの指紋が違うときは空のストア。"""
+        dest = Path(dest)
+        try:
+            version = (dest / CURRENT).read_text(encoding="utf-8").strip()
+            manifest = json.loads((dest / version / MANIFEST).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return cls()
+        if manifest.get("fingerprint") != fingerprint:
+            return cls()
+        return cls(dest / version / flavor, version)
+
+    def __bool__(self) -> bool:
+        return self.root is not None
+
+    def _path(self, kind: str, key: Hashable, suffix: str) -> Path | None:
+        if self.root is None:
+            return None
+        return self.root / kind / f"{key_digest(key)}{suffix}"
+
+    def figure(self, key: Hashable) -> str | None:
+        """図の JSON 文字列。"""
+        path = self._path("figures", key, ".json")
+        try:
+            spec = path.read_text(encoding="utf-8") if path else None
+        except OSError:
+            spec = None
+        (self.stats.miss if spec is None else self.stats.hit)()
+        return spec
+
+    def table(self, key: Hashable) -> pd.DataFrame | None:
+        """市町村 × 年の集計表（列名は文字列）。"""
+        path = self._path("tables", key, ".arrow")
+        table = None
+        if path is not None and path.exists():
+            try:
+                import pyarrow.feather as feather
+
+                table = feather.read_table(str(path)).to_pandas().set_index("市町村")
+            except (ImportError, OSError):
+                table = None
+        (self.stats.miss if table is None else self.stats.hit)()
+        return table
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="図と集計表を事前描画して版付きで書き出す")
+    parser.add_argument("--src", type=Path, default=Path("."), help="long 形式 CSV のあるディレクトリ")
+    parser.add_argument("--dest", type=Path, default=Path("artifacts"))
+    parser.add_argument("--flavor", action="append", choices=FLAVORS,
+                        help="対象アプリ（複数指定可。省略時は両方）")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="プロセス数（省略時は CPU 数、0 なら並列化しない）")
+    parser.add_argument("--keep", type=int, default=3, help="残す版の数")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    final = build(args.src, args.dest, args.flavor or FLAVORS, args.workers, args.keep)
+    manifest = json.loads((final / MANIFEST).read_text(encoding="utf-8"))
+    for flavor, n in manifest["flavors"].items():
+        print(f"{flavor}: 図 {n['figures']} 件 / 表 {n['tables']} 件", file=sys.stderr)
+    print(f"{final}（{time.perf_counter() - t0:.1f} 秒）", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
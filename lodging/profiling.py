@@ -0,0 +1,146 @@
+"""再実行 1 回ぶんの段ごとの所要時間・キャッシュ命中数・ピークメモリ。
+
+    profile = RerunProfile(enabled=True)
+    profile.watch("figures", figure_cache)
+    with profile.stage("load_data"):
+        ...
+    record = profile.finish()
+    append_jsonl("profile.jsonl", record)
+
+無効時の stage() は何も記録しない。ピークメモリは tracemalloc で測るので
+Python が確保した分だけが対象で、同じプロセスの他セッションの確保も含む。
+tracemalloc は stage() の区間の中だけで動かし、区間を抜けるときに必ず止める。
+st.stop() や st.rerun()、例外で finish() まで届かない再実行があっても、
+計測していないセッションに負担を残さない。ピークは各区間のピークの最大値。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterator, Protocol
+
+
+class HitCounter(Protocol):
+    hits: int
+    misses: int
+
+
+@dataclass
+class CacheStats:
+    """hits / misses を数えるだけのカウンタ（FigureCache と同じ属性名）。"""
+
+    hits: int = 0
+    misses: int = 0
+
+    def hit(self) -> None:
+        self.hits += 1
+
+    def miss(self) -> None:
+        self.misses += 1
+
+
+# tracemalloc は重いので、計測中の再実行がある間だけ動かす
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def _start_tracing() -> None:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+        tracemalloc.reset_peak()
+
+
+def _stop_tracing() -> int:
+    """ピークを返し、最後の利用者なら tracemalloc を止める（余分に呼んでも無害）。"""
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            return 0
+        peak = tracemalloc.get_traced_memory()[1]
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+        return peak
+
+
+class RerunProfile:
+    def __init__(self, enabled: bool = True, trace_memory: bool = True):
+        self.enabled = enabled
+        self.finished = False
+        self.stages: dict[str, float] = {}
+        self.peak_memory = 0
+        self._watched: dict[str, tuple[HitCounter, int, int]] = {}
+        self._t0 = time.perf_counter()
+        self._trace = enabled and trace_memory
+        self._depth = 0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """name の区間の所要時間を積算する（同名の区間は合計）。
+
+        入れ子の区間では、いちばん外側の区間だけが tracemalloc を動かす。
+        """
+        if not self.enabled:
+            yield
+            return
+        outer = self._trace and self._depth == 0
+        if outer:
+            _start_tracing()
+        self._depth += 1
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t0
+            self._depth -= 1
+            if outer:
+                self.peak_memory = max(self.peak_memory, _stop_tracing())
+
+    def watch(self, name: str, counter: HitCounter) -> None:
+        """counter の hits / misses をこの再実行での増分として記録する。"""
+        if self.enabled:
+            self._watched[name] = (counter, counter.hits, counter.misses)
+
+    def restart(self) -> None:
+        """計測をやり直す（フラグメントだけの再実行を別の回として測るとき）。
+
+        区間・ピークを空にし、見張っているカウンタの基準を今の値に取り直す。
+        """
+        self.finished = False
+        self.stages = {}
+        self.peak_memory = 0
+        self._watched = {name: (c, c.hits, c.misses) for name, (c, _, _) in self._watched.items()}
+        self._t0 = time.perf_counter()
+
+    def finish(self, **extra) -> dict:
+        self.finished = True
+        record = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "total_s": time.perf_counter() - self._t0,
+            "stages_s": dict(self.stages),
+            "caches": {
+                name: {"hits": c.hits - h0, "misses": c.misses - m0}
+                for name, (c, h0, m0) in self._watched.items()
+            },
+            **extra,
+        }
+        if self._trace:
+            record["peak_memory_bytes"] = self.peak_memory
+        return record
+
+
+def append_jsonl(path: str | os.PathLike, record: dict) -> None:
+    """1 レコードを JSON Lines として追記する。"""
+    line = json.dumps(record, ensure_ascii=False)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
@@ -0,0 +1,65 @@
+"""期間の増減による市町村のランキング（上位 / 下位 N 件）。
+
+増減は DerivedMetrics.change（増減数の累積和の差）から系列あたり定数時間で
+求まる。上位 N 件は np.argpartition で選んでから N 件だけを並べるので、
+全件を並べ替えない。
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from .store import MetricStore
+
+# 並べる基準の表示名 → WindowChange の属性
+RANK_BY = {"増減数": "change", "増減率": "pct"}
+
+
+def top_n(scores: np.ndarray, n: int, largest: bool = True) -> np.ndarray:
+    """scores の大きい（largest=False なら小さい）順に最大 n 個の位置。NaN は除く。"""
+    key = -scores if largest else scores
+    key = np.where(np.isnan(key), np.inf, key)
+    k = min(n, int(np.count_nonzero(~np.isnan(scores))))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    idx = np.argpartition(key, k - 1)[:k] if k < len(key) else np.arange(len(key))
+    # 同点は行番号順にそろえる
+    return idx[np.lexsort((idx, key[idx]))]
+
+
+def leaderboard(
+    store: "MetricStore",
+    metric: str,
+    years: tuple[int, int],
+    n: int = 10,
+    by: str = "change",
+    largest: bool = True,
+    names: Iterable[str] | None = None,
+) -> pd.DataFrame:
+    """期間の増減で並べた上位 n 件の表（index は市町村）。
+
+    names を渡すとその中だけで順位を付ける（県合計やエリアを除くときなど）。
+    列は 順位・始点と終点の年の値・増減数・増減率 (%)。
+    """
+    change = store.derived.change(*years)[metric]
+    if names is not None:
+        found, rows = store.rows(names)
+        change = change[rows]
+    else:
+        found = list(store.names)
+    picked = top_n(getattr(change, by), n, largest)
+    start, end = years
+    return pd.DataFrame(
+        {
+            "順位": np.arange(1, len(picked) + 1),
+            f"{start}年": change.start[picked],
+            f"{end}年": change.end[picked],
+            "増減数": change.change[picked],
+            "増減率": change.pct[picked],
+        },
+        index=pd.Index([found[i] for i in picked], name="市町村"),
+    )
@@ -0,0 +1,145 @@
+"""県 → エリア → 市町村の階層と、エリア別の集計。
+
+エリアと市町村には整数コードを振る。市町村コードはエリアごとに連続させて
+あるので、エリア合計は全指標・全年について np.add.reduceat 1 回で求まる。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Iterable, Mapping
+
+import numpy as np
+
+from .store import MetricStore
+
+PREFECTURE = "沖縄県"
+
+REGIONS: dict[str, tuple[str, ...]] = {
+    "南部": ("那覇市", "糸満市", "豊見城市", "八重瀬町", "南城市", "与那原町", "南風原町"),
+    "中部": ("沖縄市", "宜野湾市", "浦添市", "うるま市", "読谷村", "嘉手納町", "北谷町",
+             "北中城村", "中城村", "西原町"),
+    "北部": ("名護市", "国頭村", "大宜味村", "東村", "今帰仁村", "本部町", "恩納村",
+             "宜野座村", "金武町"),
+    "宮古": ("宮古島市", "多良間村"),
+    "八重山": ("石垣市", "竹富町", "与那国町"),
+    "離島": ("久米島町", "渡嘉敷村", "座間味村", "粟国村", "渡名喜村", "南大東村",
+             "北大東村", "伊江村", "伊平屋村", "伊是名村"),
+}
+
+
+def municipality_names(names: Iterable[str], prefecture: str = PREFECTURE) -> list[str]:
+    """集計行（エリア・都道府県）を除いた市町村名（文字コード順）。"""
+    return sorted(n for n in set(names) if n not in REGIONS and n != prefecture)
+
+
+def region_markdown(regions: Mapping[str, tuple[str, ...]] = REGIONS) -> list[str]:
+    """「**南部**: 那覇市、…」形式の行。"""
+    return [f"**{reg}**: " + "、".join(muns) for reg, muns in regions.items()]
+
+
+@dataclass(frozen=True)
+class Mismatch:
+    """集計値と CSV の集計行が食い違った箇所。"""
+
+    name: str
+    metric: str
+    year: int
+    expected: float  # CSV の集計行
+    actual: float    # 市町村からの合計
+
+
+@dataclass(frozen=True)
+class RegionIndex:
+    prefecture: str
+    regions: tuple[str, ...]                  # エリアコード順
+    municipalities: tuple[str, ...]           # 市町村コード順（エリアごとに連続）
+    region_code: np.ndarray = field(repr=False)  # 市町村コード → エリアコード
+    starts: np.ndarray = field(repr=False)       # エリアごとの先頭市町村コード
+
+    @classmethod
+    def build(
+        cls,
+        regions: Mapping[str, Iterable[str]] = REGIONS,
+        prefecture: str = PREFECTURE,
+    ) -> "RegionIndex":
+        names = tuple(regions)
+        members = [tuple(regions[r]) for r in names]
+        munis = tuple(m for ms in members for m in ms)
+        if len(set(munis)) != len(munis):
+            raise ValueError("複数のエリアに属する市町村があります")
+        sizes = np.array([len(ms) for ms in members], dtype=np.intp)
+        if (sizes == 0).any():
+            raise ValueError("市町村が 1 つも無いエリアがあります")
+        return cls(
+            prefecture=prefecture,
+            regions=names,
+            municipalities=munis,
+            region_code=np.repeat(np.arange(len(names)), sizes),
+            starts=np.concatenate([[0], np.cumsum(sizes)[:-1]]),
+        )
+
+    def members(self, region: str) -> tuple[str, ...]:
+        code = self.regions.index(region)
+        stop = self.starts[code + 1] if code + 1 < len(self.starts) else None
+        return self.municipalities[self.starts[code]:stop]
+
+    def region_of(self, municipality: str) -> str:
+        return self.regions[self.region_code[self.municipalities.index(municipality)]]
+
+    def grouped(self, store: MetricStore) -> tuple[list[str], list[str]]:
+        """store にある市町村を エリアのコード順に並べた (エリア, 市町村) の列。"""
+        pairs = [(self.regions[code], m)
+                 for code, m in zip(self.region_code, self.municipalities) if m in store.row]
+        return [r for r, _ in pairs], [m for _, m in pairs]
+
+    def missing(self, store: MetricStore) -> list[str]:
+        """定義にあってデータに無い市町村。"""
+        return [m for m in self.municipalities if m not in store.row]
+
+    # ---------- 集計 ----------
+    def rollup(self, store: MetricStore) -> MetricStore:
+        """エリア合計と県合計を行に持つ MetricStore を返す。
+
+        行は エリア（コード順）→ 県。市町村がすべて欠測の年は NaN。
+        """
+        rows = np.array([store.row.get(m, -1) for m in self.municipalities])
+        metrics = tuple(store.values)
+        stacked = store.stacked(metrics)  # (指標, 行, 年)
+        muni = np.where((rows >= 0)[None, :, None],
+                        stacked[:, np.maximum(rows, 0), :], np.nan)
+
+        observed = ~np.isnan(muni)
+        sums = np.add.reduceat(np.nan_to_num(muni), self.starts, axis=1)
+        counts = np.add.reduceat(observed, self.starts, axis=1)
+        regional = np.where(counts > 0, sums, np.nan)
+
+        total = np.where(counts.sum(axis=1, keepdims=True) > 0,
+                         np.nansum(regional, axis=1, keepdims=True), np.nan)
+        out = np.concatenate([regional, total], axis=1)
+        out.setflags(write=False)
+
+        names = self.regions + (self.prefecture,)
+        return MetricStore(
+            names=names,
+            years=store.years,
+            values=dict(zip(metrics, out)),
+            row={n: i for i, n in enumerate(names)},
+        ).precompute()
+
+    def verify(self, store: MetricStore, rollup: MetricStore) -> list[Mismatch]:
+        """CSV 側にある集計行（南部…、沖縄県）と市町村合計を突き合わせる。"""
+        out = []
+        for name in rollup.names:
+            if name not in store.row:
+                continue
+            for metric, mat in rollup.values.items():
+                expected = store.values[metric][store.row[name]]
+                actual = mat[rollup.row[name]]
+                bad = ~np.isclose(expected, actual, equal_nan=True)
+                out += [
+                    Mismatch(name, metric, int(store.years[i]),
+                             float(expected[i]), float(actual[i]))
+                    for i in np.flatnonzero(bad)
+                ]
+        return out
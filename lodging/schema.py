@@ -0,0 +1,207 @@
+"""long 形式 CSV のスキーマと読み込み時の検査。
+
+    市町村  category（全指標で同じカテゴリ）
+    年      int16
+    指標    int32（横に並べた表では欠損を持てる Int32）
+
+読み込んだ直後に検査し、問題があればすべてまとめて SchemaError で報告する。
+(市町村, 年) の重複や数値でない値を抱えたまま描画まで進ませない。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterable, Mapping
+
+import numpy as np
+import pandas as pd
+
+YEAR_DTYPE = np.int16
+VALUE_DTYPE = np.int32
+# 指標を横に並べたとき（Arrow キャッシュ）の欠けたセル用
+NULLABLE_VALUE_DTYPE = pd.Int32Dtype()
+# 報告に載せる例の数
+MAX_EXAMPLES = 5
+
+
+@dataclass(frozen=True)
+class Problem:
+    source: str   # ファイル名か指標名
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.source}: {self.message}"
+
+
+class SchemaError(ValueError):
+    """スキーマ違反。problems にすべての問題を持つ。"""
+
+    def __init__(self, problems: list[Problem]):
+        self.problems = problems
+        lines = [f"データに {len(problems)} 件の問題があります。"]
+        lines += [f"- {p}" for p in problems]
+        super().__init__("\n".join(lines))
+
+
+def _examples(items: Iterable) -> str:
+    items = list(items)
+    text = "、".join(map(str, items[:MAX_EXAMPLES]))
+    return text + (f" ほか {len(items) - MAX_EXAMPLES} 件" if len(items) > MAX_EXAMPLES else "")
+
+
+def _lines(mask: pd.Series) -> str:
+    """CSV の行番号（ヘッダを 1 行目とする）。"""
+    return _examples(f"{i + 2} 行目" for i in np.flatnonzero(mask.to_numpy()))
+
+
+def _integers(s: pd.Series, lo: int, hi: int) -> tuple[pd.Series, pd.Series]:
+    """(数値にした列, lo〜hi の整数でない位置)。"""
+    x = pd.to_numeric(s, errors="coerce")
+    bad = x.isna() | (x != np.floor(x)) | (x < lo) | (x > hi)
+    return x, bad
+
+
+# -------------------------------------------------
+# 検査
+# -------------------------------------------------
+def validate(
+    frames: Mapping[str, pd.DataFrame],
+    sources: Mapping[str, str] | None = None,
+) -> list[Problem]:
+    """指標名 → long 形式 DataFrame を検査し、見つかった問題を返す。
+
+    sources は指標名 → 報告に使う名前（ファイル名）。
+    """
+    sources = sources or {}
+    problems = []
+    for metric, df in frames.items():
+        source = sources.get(metric, metric)
+        missing = [c for c in ("市町村", "年", metric) if c not in df.columns]
+        if missing:
+            problems.append(Problem(source, f"列がありません: {'、'.join(missing)}"))
+            continue
+
+        names = df["市町村"].astype(str).str.strip()
+        blank = df["市町村"].isna() | (names == "")
+        if blank.any():
+            problems.append(Problem(source, f"市町村が空です（{_lines(blank)}）"))
+
+        info = np.iinfo(YEAR_DTYPE)
+        year, bad = _integers(df["年"], info.min, info.max)
+        if bad.any():
+            problems.append(Problem(source, f"年が整数ではありません（{_lines(bad)}）"))
+
+        _, bad_value = _integers(df[metric], 0, np.iinfo(VALUE_DTYPE).max)
+        if bad_value.any():
+            problems.append(Problem(
+                source, f"{metric}が 0 以上の整数ではありません（{_lines(bad_value)}）"
+            ))
+
+        ok = ~(blank | bad)
+        keys = pd.DataFrame({"市町村": names[ok], "年": year[ok]})
+        counts = keys.value_counts(sort=False)
+        dup = counts[counts > 1]
+        if len(dup):
+            problems.append(Problem(source, "(市町村, 年) が重複しています: " + _examples(
+                f"{n} {int(y)} 年（{c} 行）" for (n, y), c in dup.items()
+            )))
+    return problems
+
+
+# -------------------------------------------------
+# 型の適用
+# -------------------------------------------------
+def conform(
+    frames: Mapping[str, pd.DataFrame],
+    sources: Mapping[str, str] | None = None,
+) -> dict[str, pd.DataFrame]:
+    """検査してからスキーマの型にそろえた DataFrame を返す。
+
+    問題があれば SchemaError。市町村のカテゴリは全指標で共通にするので、
+    指標をまたいだ結合でも object 型に戻らない。
+    """
+    problems = validate(frames, sources)
+    if problems:
+        raise SchemaError(problems)
+
+    names = {m: df["市町村"].astype(str).str.strip() for m, df in frames.items()}
+    categories = sorted(set().union(*(set(s) for s in names.values())))
+    return {
+        metric: pd.DataFrame({
+            "市町村": pd.Categorical(names[metric], categories=categories),
+            "年": pd.to_numeric(df["年"]).astype(YEAR_DTYPE),
+            metric: pd.to_numeric(df[metric]).astype(VALUE_DTYPE),
+        })
+        for metric, df in frames.items()
+    }
+
+
+def conform_wide(wide: pd.DataFrame, metrics: Iterable[str]) -> pd.DataFrame:
+    """指標を横に並べた表（欠けた (市町村, 年) は欠損）をスキーマの型にそろえる。
+
+    外部結合で float64 に戻った指標は、欠損を持てる Int32（Arrow では
+    null 付きの int32）にする。
+    """
+    out = wide.copy()
+    if not isinstance(out["市町村"].dtype, pd.CategoricalDtype):
+        out["市町村"] = out["市町村"].astype("category")
+    out["年"] = out["年"].astype(YEAR_DTYPE)
+    for metric in metrics:
+        out[metric] = out[metric].astype(NULLABLE_VALUE_DTYPE)
+    return out
+
+
+def check_coverage(
+    frames: Mapping[str, pd.DataFrame],
+    required: Iterable[str],
+    sources: Mapping[str, str] | None = None,
+) -> None:
+    """required の市町村がすべての指標にあるか確かめる（無ければ SchemaError）。"""
+    required = list(dict.fromkeys(required))
+    if not required:
+        return
+    problems = []
+    for metric, df in frames.items():
+        present = set(df["市町村"].unique())
+        absent = [m for m in required if m not in present]
+        if absent:
+            problems.append(Problem(
+                (sources or {}).get(metric, metric),
+                f"エリア定義の市町村がありません: {_examples(absent)}",
+            ))
+    if problems:
+        raise SchemaError(problems)
+
+
+def conform_totals(
+    df: pd.DataFrame, metrics: Iterable[str], source: str = "県合計"
+) -> pd.DataFrame:
+    """県合計の年次推移（年, 指標…）を検査して型をそろえ、年の昇順で返す。"""
+    metrics = list(metrics)
+    missing = [c for c in ("年", *metrics) if c not in df.columns]
+    if missing:
+        raise SchemaError([Problem(source, f"列がありません: {'、'.join(missing)}")])
+
+    problems = []
+    info = np.iinfo(YEAR_DTYPE)
+    year, bad = _integers(df["年"], info.min, info.max)
+    if bad.any():
+        problems.append(Problem(source, f"年が整数ではありません（{_lines(bad)}）"))
+    for metric in metrics:
+        _, bad_value = _integers(df[metric], 0, np.iinfo(VALUE_DTYPE).max)
+        if bad_value.any():
+            problems.append(Problem(
+                source, f"{metric}が 0 以上の整数ではありません（{_lines(bad_value)}）"
+            ))
+    dup = year[year.duplicated() & ~bad]
+    if len(dup):
+        problems.append(Problem(
+            source, f"年が重複しています: {_examples(int(y) for y in dup.unique())}"
+        ))
+    if problems:
+        raise SchemaError(problems)
+
+    out = pd.DataFrame({"年": year.astype(YEAR_DTYPE)})
+    for metric in metrics:
+        out[metric] = pd.to_numeric(df[metric]).astype(VALUE_DTYPE)
+    return out.sort_values("年", kind="stable").reset_index(drop=True)
@@ -0,0 +1,231 @@
+"""市町村 × 年の密行列ストア。
+
+全指標を (指標, 市町村, 年) の float32 配列 1 つに持ち、values は指標ごとの
+(市町村数, 年数) のビュー。市町村と年は整数インデックスで引く。年は昇順に
+並べてあるので、期間指定は列方向のスライス（コピーなしのビュー）になる。
+配列はすべて書き込み禁止で、プロセス内の全セッションが同じ 1 部を共有する。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Iterable, Mapping
+
+import numpy as np
+import pandas as pd
+
+from .loader import SOURCES, load_frames
+from .metrics import DerivedMetrics
+
+METRICS = tuple(SOURCES)  # ("軒数", "客室数", "収容人数")
+DELTA = "増減数"
+# 値の型。件数は 2**24（約 1,677 万）まで float32 で正確に表せる
+DTYPE = np.float32
+
+
+def _readonly(a: np.ndarray) -> np.ndarray:
+    a.setflags(write=False)
+    return a
+
+
+def _same_view(a: np.ndarray, b: np.ndarray) -> bool:
+    return (a.shape == b.shape and a.strides == b.strides
+            and a.__array_interface__["data"][0] == b.__array_interface__["data"][0])
+
+
+@dataclass(frozen=True)
+class MetricStore:
+    names: tuple[str, ...]
+    years: np.ndarray
+    values: Mapping[str, np.ndarray]
+    row: Mapping[str, int] = field(repr=False)
+
+    # ---------- 構築 ----------
+    @classmethod
+    def from_frames(cls, frames: Mapping[str, pd.DataFrame]) -> "MetricStore":
+        """指標名 → long 形式 DataFrame（市町村, 年, 指標）から組み立てる。"""
+        names = pd.Index(
+            pd.unique(pd.concat([df["市町村"] for df in frames.values()]))
+        )
+        years = np.unique(
+            np.concatenate([df["年"].to_numpy() for df in frames.values()])
+        ).astype(np.int64)
+
+        cube = np.full((len(frames), len(names), len(years)), np.nan, dtype=DTYPE)
+        for mat, (col, df) in zip(cube, frames.items()):
+            r = names.get_indexer(df["市町村"])
+            c = np.searchsorted(years, df["年"].to_numpy())
+            mat[r, c] = df[col].to_numpy(dtype=DTYPE)
+
+        return cls(
+            names=tuple(names),
+            years=_readonly(years),
+            values=dict(zip(frames, _readonly(cube))),
+            row={n: i for i, n in enumerate(names)},
+        )
+
+    def extend(self, frames: Mapping[str, pd.DataFrame]) -> "MetricStore":
+        """最終年より後の年の行を追加した新しいストアを返す。
+
+        既存の行番号・列番号はそのまま。派生指標を計算済みなら、新しい年の
+        列だけを追加計算して引き継ぐ。
+        """
+        frames = {col: df for col, df in frames.items() if len(df)}
+        if not frames:
+            return self
+        added = np.unique(np.concatenate([df["年"].to_numpy() for df in frames.values()]))
+        if len(self.years) and added[0] <= self.years[-1]:
+            raise ValueError(f"{added[0]} 年は既存の最終年 {self.years[-1]} 以前です")
+
+        new_names = [
+            n for n in pd.unique(pd.concat([df["市町村"] for df in frames.values()]))
+            if n not in self.row
+        ]
+        names = self.names + tuple(new_names)
+        row = {**self.row, **{n: len(self.names) + i for i, n in enumerate(new_names)}}
+        years = np.concatenate([self.years, added]).astype(np.int64)
+
+        cube = np.full((len(self.values), len(names), len(years)), np.nan, dtype=DTYPE)
+        cube[:, :len(self.names), :len(self.years)] = self.stacked()
+        for mat, col in zip(cube, self.values):
+            if col in frames:
+                df = frames[col]
+                r = np.fromiter((row[n] for n in df["市町村"]), dtype=np.intp,
+                                count=len(df))
+                c = np.searchsorted(years, df["年"].to_numpy())
+                mat[r, c] = df[col].to_numpy(dtype=DTYPE)
+
+        values = dict(zip(self.values, _readonly(cube)))
+        store = type(self)(names=names, years=_readonly(years), values=values, row=row)
+        if "derived" in self.__dict__:
+            store.__dict__["derived"] = self.derived.extend(store, len(self.years))
+        return store
+
+    def stacked(self, metrics: Iterable[str] | None = None) -> np.ndarray:
+        """(指標, 市町村, 年) の 3 次元配列。
+
+        values が 1 つの配列のビューなら（from_frames / extend / rollup で
+        作ったストア）その配列をコピーせずに返す。
+        """
+        metrics = tuple(self.values) if metrics is None else tuple(metrics)
+        base = self.values[metrics[0]].base
+        if (
+            isinstance(base, np.ndarray) and base.ndim == 3
+            and base.shape[0] == len(metrics)
+            and all(_same_view(self.values[m], base[i]) for i, m in enumerate(metrics))
+        ):
+            return base
+        return _readonly(np.stack([self.values[m] for m in metrics]))
+
+    # ---------- 派生指標 ----------
+    @cached_property
+    def derived(self) -> DerivedMetrics:
+        """増減数・前回比・比率・CAGR（初回アクセス時に一括計算）。"""
+        return DerivedMetrics.from_store(self)
+
+    @property
+    def deltas(self) -> Mapping[str, np.ndarray]:
+        return self.derived.delta
+
+    def precompute(self) -> "MetricStore":
+        """派生指標を計算済みにして self を返す。
+
+        セッション間で共有する前に呼んでおけば、初回アクセスが重なっても
+        計算は 1 回で済む。
+        """
+        self.derived
+        return self
+
+    @property
+    def nbytes(self) -> int:
+        """値と（計算済みなら）派生指標の配列のバイト数。"""
+        n = self.stacked().nbytes
+        if "derived" in self.__dict__:
+            d = self.derived
+            n += sum(a.nbytes for part in (d.delta, d.yoy, d.ratios, d.cumdelta, d.span)
+                     for a in part.values())
+        return n
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """名前・年・値から作る内容のハッシュ（事前描画の照合に使う）。"""
+        h = hashlib.sha256()
+        h.update("\0".join(self.names).encode("utf-8"))
+        h.update(np.ascontiguousarray(self.years, dtype=np.int64).tobytes())
+        for metric in self.values:
+            h.update(metric.encode("utf-8"))
+            h.update(np.ascontiguousarray(self.values[metric], dtype=DTYPE).tobytes())
+        return h.hexdigest()
+
+    # ---------- インデックス ----------
+    def year_slice(self, start: int, end: int) -> slice:
+        """start ≦ 年 ≦ end の列範囲。"""
+        lo = int(np.searchsorted(self.years, start, side="left"))
+        hi = int(np.searchsorted(self.years, end, side="right"))
+        return slice(lo, hi)
+
+    def rows(self, names: Iterable[str]) -> tuple[list[str], np.ndarray]:
+        """ストアに存在する名前と、その行番号。"""
+        found = [n for n in names if n in self.row]
+        return found, np.fromiter((self.row[n] for n in found), dtype=np.intp,
+                                  count=len(found))
+
+    def _source(self, metric: str, delta: bool) -> np.ndarray:
+        return (self.deltas if delta else self.values)[metric]
+
+    # ---------- 取り出し ----------
+    def series(
+        self, metric: str, name: str, years: tuple[int, int], delta: bool = False
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """1 系列の (年, 値)。どちらも行列のビュー。欠損年は除く。"""
+        cols = self.year_slice(*years)
+        x = self.years[cols]
+        y = self._source(metric, delta)[self.row[name], cols]
+        mask = ~np.isnan(y)
+        return (x, y) if mask.all() else (x[mask], y[mask])
+
+    def matrix(
+        self,
+        metric: str,
+        names: Iterable[str],
+        years: tuple[int, int],
+        delta: bool = False,
+    ) -> tuple[list[str], np.ndarray, np.ndarray]:
+        """(名前, 年, 値行列) を返す。"""
+        found, idx = self.rows(names)
+        cols = self.year_slice(*years)
+        return found, self.years[cols], self._source(metric, delta)[idx, cols]
+
+    def year_table(self, name: str) -> pd.DataFrame:
+        """1 行分の (年, 指標…) の表。どの指標も欠測の年は除く。"""
+        i = self.row[name]
+        df = pd.DataFrame({"年": self.years, **{m: v[i] for m, v in self.values.items()}})
+        return df.dropna(how="all", subset=list(self.values)).reset_index(drop=True)
+
+    def pivot(
+        self,
+        metric: str,
+        names: Iterable[str],
+        years: tuple[int, int],
+        delta: bool = False,
+    ) -> pd.DataFrame:
+        """市町村 × 年の表（欠損は 0、int32）。"""
+        found, x, mat = self.matrix(metric, names, years, delta)
+        order = np.argsort(found, kind="stable")
+        return pd.DataFrame(
+            np.nan_to_num(mat[order], nan=0.0).astype(np.int32),
+            index=pd.Index([found[i] for i in order], name="市町村"),
+            columns=pd.Index(x, name="年"),
+        )
+
+
+def load_store(data_dir: str | os.PathLike = ".", required: Iterable[str] = ()) -> MetricStore:
+    """CSV（または Arrow キャッシュ）から MetricStore を作る。
+
+    読み込み時の検査は loader.load_frames を参照。
+    """
+    frames = load_frames(data_dir, required=required)
+    return MetricStore.from_frames(dict(zip(METRICS, frames))).precompute()
@@ -0,0 +1,82 @@
+"""データテーブル用の集計表キャッシュ。
+
+(指標, 選択, 期間) ごとの市町村 × 年の表を一度だけ作り、全セッションで
+共有する。表示は st.dataframe の column_config で数値書式を付けるだけにし、
+セルごとに HTML を作る Styler は使わない。ダウンロードも同じ表から作る。
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import io
+import math
+from typing import Callable, Hashable
+
+import pandas as pd
+
+from .figcache import FigureCache
+
+# st.column_config.NumberColumn に渡す書式（3 桁区切りの整数）
+NUMBER_FORMAT = "%,d"
+# 1 ページの行数（これを超える表はページ送りで表示する）
+PAGE_ROWS = 100
+
+
+class TableCache(FigureCache):
+    """集計表の LRU。上限は DataFrame のメモリ使用量で数える。
+
+    返す DataFrame は共有物なので書き換えないこと。
+    """
+
+    @staticmethod
+    def _size(value: pd.DataFrame) -> int:
+        return int(value.memory_usage(index=True, deep=True).sum())
+
+    def get_or_build(
+        self,
+        key: Hashable,
+        build: Callable[[], pd.DataFrame],
+        prebuilt: Callable[[Hashable], pd.DataFrame | None] | None = None,
+    ) -> pd.DataFrame:
+        """キャッシュ済みの表を返す。無ければ prebuilt(key)、build() の順に試す。
+
+        列名は st.dataframe の column_config で指定できるよう文字列にそろえる
+        （prebuilt や build が返した表は書き換えず、列名を変えた表を載せる）。
+        """
+        table = self.get(key)
+        if table is None:
+            table = prebuilt(key) if prebuilt else None
+            if table is None:
+                table = build()
+            table = table.rename(columns=str)
+            self.put(key, table)
+        return table
+
+
+def page_count(table: pd.DataFrame, page_rows: int = PAGE_ROWS) -> int:
+    return max(1, math.ceil(len(table) / page_rows))
+
+
+def page(table: pd.DataFrame, number: int, page_rows: int = PAGE_ROWS) -> pd.DataFrame:
+    """1 始まりの number ページ目の行（範囲外は端のページに丸める）。"""
+    number = min(max(number, 1), page_count(table, page_rows))
+    start = (number - 1) * page_rows
+    return table.iloc[start:start + page_rows]
+
+
+# -------------------------------------------------
+# ダウンロード
+# -------------------------------------------------
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def to_csv_bytes(table: pd.DataFrame) -> bytes:
+    """Excel でも文字化けしないよう BOM 付き UTF-8 で書く。"""
+    return table.to_csv().encode("utf-8-sig")
+
+
+def to_parquet_bytes(table: pd.DataFrame) -> bytes:
+    buf = io.BytesIO()
+    table.to_parquet(buf)
+    return buf.getvalue()
@@ -0,0 +1,241 @@
+"""app.py と streamlit-app/app.py で共通の Streamlit 部品。
+
+両アプリはデータの読み込みと画面の並びだけを持ち、共通のセクションや
+サイドバーの部品はここから使う。見出しやウィジェットのキーなど、アプリごとに
+違うところは引数で渡す。パッケージの中で streamlit を import するのは
+このモジュールだけ。
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable
+
+import streamlit as st
+
+from .figcache import FigureCache, FigureKey, figure_key
+from .figures import add_trend_traces, heatmap_figure
+from .profiling import RerunProfile, append_jsonl
+from .ranking import RANK_BY, leaderboard
+from .store import METRICS
+from .tables import (
+    NUMBER_FORMAT, TableCache, page, page_count, parquet_available, to_csv_bytes,
+    to_parquet_bytes,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import plotly.graph_objects as go
+
+    from .store import MetricStore
+
+# ヒートマップに表示する値の表示名 → heatmap_figure の value
+HEATMAP_LABELS = {"値": "value", "増減数": "delta", "前回比（%）": "yoy"}
+
+# トレンドの表示名 → 当てはめ方（期間内の全系列をまとめて最小二乗で当てはめる）
+TRENDS = {"線形": "linear", "対数線形（一定率の成長）": "log"}
+
+
+# -------------------------------------------------
+# 全セッション共有のキャッシュ
+# -------------------------------------------------
+@st.cache_resource
+def figure_cache() -> FigureCache:
+    """組み立て済みの図の LRU。"""
+    return FigureCache(max_entries=256, max_bytes=64 * 2**20)
+
+
+@st.cache_resource
+def table_cache() -> TableCache:
+    """データテーブル用の集計表の LRU。"""
+    return TableCache(max_entries=256, max_bytes=64 * 2**20)
+
+
+# -------------------------------------------------
+# 計測（?debug=1）
+# -------------------------------------------------
+def show_profile(record: dict, label: str = "再実行の計測") -> None:
+    """計測結果のパネル。LODGING_PROFILE_LOG があれば JSON Lines で追記する。"""
+    with st.expander(label):
+        st.json(record)
+    if log_path := os.environ.get("LODGING_PROFILE_LOG"):
+        append_jsonl(log_path, record)
+
+
+def profiled_fragment(
+    profile: RerunProfile, label: str = "再実行の計測", **record
+) -> Callable[[Callable], Callable]:
+    """st.fragment の代わりに使うデコレータ。
+
+    ページ全体の再実行では st.fragment と同じ。フラグメントだけの再実行は
+    ページ全体の計測が終わった後に来るので、その回を測り直してフラグメントの
+    末尾にパネルを出す。record は記録に足す項目（app 名など）。
+    """
+    def decorate(func: Callable) -> Callable:
+        @st.fragment
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            if not (profile.enabled and profile.finished):
+                return func(*args, **kwargs)
+            profile.restart()
+            func(*args, **kwargs)
+            show_profile(profile.finish(**record, fragment=func.__name__), label)
+        return run
+    return decorate
+
+
+# -------------------------------------------------
+# データテーブル
+# -------------------------------------------------
+def show_table(tbl: "pd.DataFrame", key: str, file_stem: str) -> None:
+    """集計表を数値書式つきで表示する（大きい表はページ送り）。
+
+    ダウンロードはボタンが押されたときに同じ表から作る。
+    """
+    pages = page_count(tbl)
+    number = 1
+    if pages > 1:
+        number = st.number_input(
+            f"ページ（全 {pages} ページ・{len(tbl):,} 行）", 1, pages, 1, key=f"{key}-page"
+        )
+    st.dataframe(
+        page(tbl, number),
+        column_config={
+            col: st.column_config.NumberColumn(format=NUMBER_FORMAT) for col in tbl.columns
+        },
+        width="stretch",
+    )
+    c1, c2, _ = st.columns([1, 1, 4])
+    c1.download_button("CSV", lambda: to_csv_bytes(tbl), file_name=f"{file_stem}.csv",
+                       mime="text/csv", on_click="ignore", key=f"{key}-csv")
+    if parquet_available():
+        c2.download_button("Parquet", lambda: to_parquet_bytes(tbl),
+                           file_name=f"{file_stem}.parquet",
+                           mime="application/vnd.apache.parquet",
+                           on_click="ignore", key=f"{key}-parquet")
+
+
+# -------------------------------------------------
+# 市町村 × 年のヒートマップ
+# -------------------------------------------------
+def heatmap_section(
+    store: "MetricStore",
+    figures: FigureCache,
+    profile: RerunProfile,
+    years: tuple[int, int],
+    names: list[str],
+    groups: list[str] | None = None,
+    *,
+    header: str = "市町村 × 年のヒートマップ",
+    scope: str = "",
+) -> None:
+    """全市町村を 1 本の Heatmap トレースで比べる。names が空なら何も出さない。"""
+    if not names:
+        return
+    st.header(header)
+    c1, c2 = st.columns([1, 2])
+    metric = c1.selectbox("指標", list(METRICS), key="heatmap-metric")
+    value = HEATMAP_LABELS[c2.radio("表示する値", list(HEATMAP_LABELS), horizontal=True,
+                                    key="heatmap-value")]
+
+    key = figure_key("heatmap", f"{metric}/{value}", (), years, scope=scope)
+    with profile.stage("figures"):
+        fig = figures.get_or_build(
+            key, lambda: heatmap_figure(store, metric, value, names, years, groups),
+        )
+    with profile.stage("plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True)
+
+
+# -------------------------------------------------
+# 増減ランキング
+# -------------------------------------------------
+def add_to_selection(table_key: str, selection_key: str, names: list[str]) -> None:
+    """ランキングで新しく選んだ行を市町村の選択に加える。
+
+    選んだままの行を選択から外しても戻さない。
+    """
+    picked = [names[i] for i in st.session_state[table_key].selection.rows]
+    before = st.session_state.get(f"{table_key}-picked", [])
+    st.session_state[f"{table_key}-picked"] = picked
+    current = st.session_state.get(selection_key, [])
+    st.session_state[selection_key] = current + [
+        name for name in picked if name not in before and name not in current
+    ]
+    st.session_state[f"{table_key}-added"] = True
+
+
+def leaderboard_section(
+    store: "MetricStore",
+    profile: RerunProfile,
+    years: tuple[int, int],
+    names: list[str],
+    *,
+    header: str = "増減ランキング",
+    table_key: str = "leaderboard",
+    selection_key: str = "municipalities",
+) -> None:
+    """期間の増減ランキング。行を選ぶと selection_key の選択に加える。"""
+    st.header(header)
+    c1, c2, c3, c4 = st.columns(4)
+    metric = c1.selectbox("指標", list(METRICS), key="leaderboard-metric")
+    by = c2.radio("並べる基準", list(RANK_BY), horizontal=True, key="leaderboard-by")
+    largest = c3.radio("順序", ["増加", "減少"], horizontal=True,
+                       key="leaderboard-order") == "増加"
+    n = c4.number_input("件数", 5, 50, 10, step=5, key="leaderboard-n")
+
+    with profile.stage("ranking"):
+        board = leaderboard(store, metric, years, n, RANK_BY[by], largest, names)
+    if board.empty:
+        st.info("この期間で増減を比べられる市町村がありません。")
+        return
+    st.caption(f"{years[0]} 年と {years[1]} 年の{metric}の比較（欠測年は直前の調査値）。"
+               "行を選ぶと市町村の選択に加わります。")
+    st.dataframe(
+        board,
+        column_config={
+            "順位": st.column_config.NumberColumn(format="%d"),
+            "増減率": st.column_config.NumberColumn("増減率（%）", format="%+.1f"),
+            **{col: st.column_config.NumberColumn(format=NUMBER_FORMAT)
+               for col in board.columns[1:4]},
+        },
+        width="stretch",
+        key=table_key,
+        on_select=lambda: add_to_selection(table_key, selection_key, list(board.index)),
+        selection_mode="multi-row",
+    )
+    # 選択は別のフラグメントにあるので、加えたときはページ全体を再実行する
+    if st.session_state.pop(f"{table_key}-added", False):
+        st.rerun()
+
+
+# -------------------------------------------------
+# トレンドと予測
+# -------------------------------------------------
+@dataclass(frozen=True)
+class TrendOverlay:
+    """サイドバーで選んだトレンドの重ね方（method が None なら重ねない）。"""
+
+    method: str | None = None
+    horizon: int = 0
+
+    def key(self, key: FigureKey) -> FigureKey:
+        """トレンドを重ねた図は別のキーでキャッシュする。"""
+        if not self.method:
+            return key
+        return key._replace(kind=f"{key.kind}+{self.method}{self.horizon}")
+
+    def apply(self, fig: "go.Figure", source: "MetricStore", element: str,
+              years: tuple[int, int]) -> "go.Figure":
+        if self.method:
+            add_trend_traces(fig, source, element, years, self.method, self.horizon)
+        return fig
+
+
+def trend_sidebar() -> TrendOverlay:
+    trend = st.sidebar.selectbox("トレンドと予測", ["表示しない", *TRENDS])
+    method = TRENDS.get(trend)
+    horizon = st.sidebar.slider("予測する年数", 3, 5, 5) if method else 0
+    return TrendOverlay(method, horizon)
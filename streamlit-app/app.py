@@ -1,191 +1,236 @@
+import sys
+from pathlib import Path
+
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
+
+# リポジトリ直下の lodging パッケージを読み込めるようにする
+APP_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(APP_DIR.parent))
+from lodging import loader, ui  # noqa: E402
+from lodging.figcache import figure_key  # noqa: E402
+from lodging.incremental import LiveStore, invalidate_years  # noqa: E402
+from lodging.figures import rank_by_last, stacked_overview_figure  # noqa: E402
+from lodging.metrics import cagr_labels  # noqa: E402
+from lodging.prerender import (  # noqa: E402
+    ArtifactStore, area_figure, municipality_figure,
+)
+from lodging.profiling import RerunProfile  # noqa: E402
+from lodging.regions import (  # noqa: E402
+    PREFECTURE, REGIONS, RegionIndex, municipality_names, region_markdown,
+)
+from lodging.schema import SchemaError  # noqa: E402
+from lodging.store import METRICS  # noqa: E402
 
 # ---------------------------- 1. ページ設定 ----------------------------
 st.set_page_config(page_title="沖縄県宿泊施設データ可視化", page_icon="🏨", layout="wide")
 
 # ---------------------------- 2. データ読み込み ----------------------------
-@st.cache_data
-def load_data():
-    facilities = pd.read_csv("facilities_long.csv")   # 軒数
-    rooms      = pd.read_csv("rooms_long.csv")        # 客室数
-    capacity   = pd.read_csv("capacity_long.csv")     # 収容人数
-    return facilities, rooms, capacity
-
-facilities, rooms, capacity = load_data()
-
-# ---------------------------- 3. 増減数計算（コピーを取る） ----------------------------
-def add_delta(df, col):
-    df = df.copy()
-    df["増減数"] = df.groupby("市町村")[col].diff().fillna(0).astype(int)
-    return df
-
-facilities = add_delta(facilities, "軒数")
-rooms      = add_delta(rooms,      "客室数")
-capacity   = add_delta(capacity,   "収容人数")
-
-# ---------------------------- 4. 県全体推移グラフ ----------------------------
+# 組み立て済みの図とデータテーブル用の集計表（全セッション共有の LRU）
+figures = ui.figure_cache()
+tables = ui.table_cache()
+
+@st.cache_resource
+def get_live_store():
+    # 市町村 × 年の行列（全セッション共有・読み取り専用）。
+    # 2 回目以降は Arrow キャッシュから読み、増減数などの派生指標も一緒に持つ。
+    # CSV に新しい年が増えたらその分だけ取り込み、関係する図と表だけ捨てる。
+    # 読み込み時にスキーマ（型・(市町村, 年) の重複・エリア定義の市町村）を検査する
+    live = LiveStore(".", required=RegionIndex.build().municipalities)
+    live.subscribe(lambda first_year: invalidate_years(figures, first_year))
+    live.subscribe(lambda first_year: invalidate_years(tables, first_year))
+    return live
+
+# 再実行ごとの計測（?debug=1 のときだけ。LODGING_PROFILE_LOG に JSON Lines で追記）
+profile = RerunProfile(enabled="debug" in st.query_params)
+profile.watch("figures", figures)
+profile.watch("tables", tables)
+profile.watch("arrow_cache", loader.ARROW_CACHE)
+# st.fragment と同じ（フラグメントだけの再実行はその回を別に計測する）
+fragment = ui.profiled_fragment(profile, app="streamlit-app/app.py")
+
+try:
+    live = get_live_store()
+except FileNotFoundError:
+    st.error(
+        "CSV ファイルが見つかりません。\n"
+        "facilities_long.csv / rooms_long.csv / capacity_long.csv が "
+        "同じディレクトリにあることを確認してください。"
+    )
+    st.stop()
+except SchemaError as exc:
+    st.error(f"CSV ファイルを読み込めません。\n\n{exc}")
+    st.stop()
+profile.watch("live_store", live.stats)
+with profile.stage("load_data"):
+    store = live.refresh()
+if live.error:
+    st.warning(f"更新された CSV に問題があるため、前回のデータを表示しています。\n\n{live.error}")
+
+@st.cache_resource(max_entries=1)
+def get_region_store(_store, version):
+    # エリア合計（市町村の値から一括集計）
+    return RegionIndex.build().rollup(_store)
+
+with profile.stage("regions"):
+    region_store = get_region_store(store, live.version)
+
+@st.cache_resource(max_entries=4, ttl=60)
+def get_artifacts(fingerprint: str):
+    # 事前描画済みの図と表（python -m lodging.prerender で作る）。
+    # 今のデータと指紋が一致する版だけを使い、無いものはその場で計算する
+    return ArtifactStore.open("artifacts", "streamlit-app", fingerprint)
+
+artifacts = get_artifacts(store.fingerprint)
+profile.watch("artifacts", artifacts.stats)
+
+@st.cache_resource(max_entries=2)
+def get_totals(data_dir: str, mtime_ns: int):
+    # 県合計の年次推移（python -m lodging.ingest が書き出す。long 形式より古い年まである）
+    return loader.load_totals(data_dir)
+
+# 県合計のファイルはカレントディレクトリかこのアプリの隣に置く。無いとき・
+# 読めないときは long 形式の県合計（無ければ市町村からの集計）を使う
+totals_dir = next((d for d in (Path("."), APP_DIR) if (d / loader.TOTALS_FILE).exists()), None)
+totals = None
+if totals_dir is not None:
+    totals_stamp = (totals_dir / loader.TOTALS_FILE).stat().st_mtime_ns
+    try:
+        totals = get_totals(str(totals_dir), totals_stamp)
+    except SchemaError as exc:
+        st.warning(f"{loader.TOTALS_FILE} を読めないため、市町村データから集計しています。\n\n{exc}")
+if totals is None:
+    totals = (store if PREFECTURE in store.row else region_store).year_table(PREFECTURE)
+    totals_stamp = f"store-{live.version}"
+
+# 集計表。フラグメントなのでページ送りは表だけを再実行する
+show_table = fragment(ui.show_table)
+
+# ---------------------------- 3. 県全体推移グラフ ----------------------------
 st.title("沖縄県宿泊施設データ可視化アプリ")
-st.header("沖縄県全体の状況")
-
-years_all = [
-    1978, 1980, 1982, 1984, 1986, 1988, 1990, 1992, 1994, 1996, 1998, 2000,
-    2002, 2003, 2004, 2005, 2006, 2007, 2008, 2009, 2010, 2011, 2012, 2013,
-    2014, 2015, 2016, 2017, 2018, 2019, 2020, 2021, 2022, 2023
-]
-facilities_all = [
-    655, 689, 693, 662, 620, 593, 634, 668, 676, 661, 682, 673,
-    707, 808, 822, 966, 1022, 1087, 1170, 1232, 1299, 1357, 1411, 1441,
-    1541, 1664, 1823, 2082, 2488, 3084, 3342, 3480, 3681, 3914
-]
-rooms_all = [
-    14026, 14428, 15095, 15532, 16254, 17664, 18976, 19864, 22753, 23186,
-    23297, 23781, 25423, 27533, 28303, 31238, 32320, 33654, 35005, 36359,
-    37050, 38152, 38891, 38905, 40243, 41037, 42248, 45661, 49144, 54380,
-    57759, 59448, 63215, 63497
-]
-capacity_all = [
-    36350, 38278, 38904, 40403, 42196, 45696, 48707, 52199, 57990, 57639,
-    60345, 60078, 63797, 69344, 71062, 77201, 80746, 82972, 86545, 90066,
-    92833, 96954, 99061, 100111, 104724, 107190, 111982, 121403, 132445,
-    149216, 160213, 167662, 177191, 184732
-]
-
-fig_all = go.Figure()
-
-# 客室数（棒）
-fig_all.add_bar(x=years_all, y=rooms_all, name="客室数（室）",
-                marker_color="lightblue", yaxis="y1")
-# 収容人数（棒）
-fig_all.add_bar(x=years_all, y=capacity_all, name="収容人数（人）",
-                marker_color="cornflowerblue", yaxis="y1")
-# 軒数（折れ線）
-fig_all.add_scatter(x=years_all, y=facilities_all, mode="lines+markers",
-                    name="軒数（軒）", line=dict(color="darkblue", width=2),
-                    marker=dict(size=8), yaxis="y2",
-                    hovertemplate="年: %{x}<br>軒数: %{y:,}軒<extra></extra>")
-
-fig_all.update_layout(
-    title="沖縄県宿泊施設推移状況",
-    xaxis=dict(title="年"),
-    # -------- y (右軸：客室数・収容人数) --------
-    yaxis=dict(
-        title={"text": "客室数・収容人数", "font": {"color": "cornflowerblue"}},
-        tickfont=dict(color="cornflowerblue"),
-        showgrid=False,
-    ),
-    # -------- y2 (左軸：軒数) --------
-    yaxis2=dict(
-        title={"text": "軒数（軒）", "font": {"color": "darkblue"}},
-        tickfont=dict(color="darkblue"),
-        overlaying="y",
-        side="right",
-        showgrid=True,
-    ),
-    legend=dict(orientation="h", yanchor="bottom", y=1.02,
-                xanchor="center", x=0.5),
-    hovermode="x unified",
-    barmode="stack",
-    height=450,
-    margin=dict(l=60, r=60, t=80, b=40),
-)
 
-st.plotly_chart(fig_all, use_container_width=True)
+@fragment
+def overview_section():
+    # 選択に依存しないので、エリア・市町村・表の操作では再実行されない
+    st.header("沖縄県全体の状況")
+    with profile.stage("figures"):
+        fig_all = figures.get_or_build(
+            ("overview", totals_stamp),
+            lambda: stacked_overview_figure(
+                totals["年"], totals["軒数"], totals["客室数"], totals["収容人数"]
+            ),
+        )
+    with profile.stage("plotly_chart"):
+        st.plotly_chart(fig_all, use_container_width=True)
+
+overview_section()
 
-# ---------------------------- 5. サイドバー選択 ----------------------------
+# ---------------------------- 4. サイドバー選択 ----------------------------
+# 期間と要素だけをここで選ぶ。エリア・市町村は各セクションのフラグメント内で選ぶ
 st.sidebar.header("データ選択")
-regions_master = ["南部", "中部", "北部", "宮古", "八重山", "離島"]
-selected_regions = st.sidebar.multiselect("エリアを選択してください", regions_master)
-municipalities = st.sidebar.multiselect(
-    "市町村を選択してください",
-    options=facilities["市町村"].unique(), default=[]
-)
-years = st.sidebar.slider("期間を選択してください", 2007, 2023, (2007, 2023))
+regions_master = list(REGIONS)
+y_last = int(store.years[-1])
+years = st.sidebar.slider("期間を選択してください", 2007, y_last, (2007, y_last))
 elements = st.sidebar.multiselect(
-    "要素を選択してください", ["軒数", "客室数", "収容人数"], default=["軒数"]
+    "要素を選択してください", list(METRICS), default=["軒数"]
 )
+trend = ui.trend_sidebar()
+
+# ---------------------------- 5. エリア別グラフ ----------------------------
+@fragment
+def area_section():
+    st.header("エリアの状況")
+    selected_regions = st.multiselect("エリアを選択してください", regions_master, key="regions")
+    if not selected_regions:
+        st.info("エリアを選択するとグラフが表示されます。")
+        return
 
-# ---------------------------- 6. エリア別グラフ ----------------------------
-st.header("エリアの状況")
-if selected_regions:
     for element in elements:
         st.subheader(f"選択エリアの{element}の推移")
-        fig_r = go.Figure()
-        tbl_r = pd.DataFrame()
-
-        src = {"軒数": facilities, "客室数": rooms, "収容人数": capacity}[element]
-
-        for reg in selected_regions:
-            df = (src[src["市町村"].str.contains(reg, na=False)  # エリア名を含む行
-                   & ~src["市町村"].str.contains("市", na=False)  # 「市」が付く行除外
-                   & src["年"].between(years[0], years[1])))
-            if not df.empty:
-                fig_r.add_scatter(x=df["年"], y=df[element],
-                                  mode="lines+markers", name=reg)
-                tbl_r = pd.concat([tbl_r,
-                                   df.pivot(index="市町村", columns="年",
-                                            values=element).fillna(0).astype(int)])
-
-        fig_r.update_layout(
-            title=f"選択したエリアの{element}の推移",
-            xaxis_title="年", yaxis_title=element,
-            legend=dict(orientation="h", y=1.02, x=0.5, xanchor="center"),
-            hovermode="x unified", height=400, margin=dict(l=50, r=20, t=60, b=40)
-        )
-        st.plotly_chart(fig_r, use_container_width=True)
-
+        key = figure_key("area", element, selected_regions, years)
+
+        with profile.stage("figures"):
+            fig_r = figures.get_or_build(
+                trend.key(key),
+                lambda: trend.apply(
+                    area_figure("streamlit-app", region_store, element, key.selection, years),
+                    region_store, element, years,
+                ),
+                prebuilt=artifacts.figure,
+            )
+        with profile.stage("plotly_chart"):
+            st.plotly_chart(fig_r, use_container_width=True)
+
+        with profile.stage("pivot"):
+            tbl_r = tables.get_or_build(
+                key, lambda: region_store.pivot(element, key.selection, years),
+                prebuilt=artifacts.table)
         if not tbl_r.empty:
-            st.dataframe(tbl_r.style.format(thousands=","), use_container_width=True)
-else:
-    st.info("エリアを選択するとグラフが表示されます。")
+            with profile.stage("table"):
+                show_table(tbl_r, f"area-{element}", f"エリア_{element}_{years[0]}-{years[1]}")
+
+area_section()
+
+# ---------------------------- 6. 市町村 × 年のヒートマップ ----------------------------
+# 全市町村を 1 本の Heatmap トレースで比べる（行はエリアごとにまとめる）
+heatmap_groups, heatmap_names = RegionIndex.build().grouped(store)
+fragment(ui.heatmap_section)(store, figures, profile, years, heatmap_names, heatmap_groups)
+
+# ---------------------------- 7. 増減ランキング ----------------------------
+# 行を選ぶと下の市町村の選択に加える
+fragment(ui.leaderboard_section)(store, profile, years, municipality_names(store.names))
+
+# ---------------------------- 8. 市町村別グラフ ----------------------------
+@fragment
+def municipality_section():
+    st.header("市町村の状況")
+    municipalities = st.multiselect(
+        "市町村を選択してください", options=store.names, default=[], key="municipalities"
+    )
+    if not municipalities:
+        st.info("市町村を選択するとグラフが表示されます。")
+        return
 
-# ---------------------------- 7. 市町村別グラフ ----------------------------
-st.header("市町村の状況")
-if municipalities:
     for element in elements:
-        df_src = {"軒数": facilities, "客室数": rooms, "収容人数": capacity}[element]
-        df_sel = df_src[df_src["市町村"].isin(municipalities)
-                        & df_src["年"].between(years[0], years[1])]
-
-        if df_sel.empty:
+        key = figure_key("municipality", element, municipalities, years)
+        # 最終年の値で並べ替えて見やすく
+        order = rank_by_last(store, element, key.selection, years)
+        if not order:
             continue
 
         st.subheader(f"{element}の推移")
-        fig_c = go.Figure()
-
-        # 最終年の値で並べ替えて見やすく
-        order = (df_sel[df_sel["年"] == years[1]]
-                 .sort_values(element, ascending=False)["市町村"])
-
-        for city in order:
-            d = df_sel[df_sel["市町村"] == city]
-            fig_c.add_scatter(x=d["年"], y=d[element],
-                              mode="lines+markers", name=city)
-
-        fig_c.update_layout(
-            title=f"{element}の推移 ({years[0]}–{years[1]})",
-            xaxis_title="年", yaxis_title=element,
-            hovermode="x unified", height=400, margin=dict(l=50, r=20, t=60, b=40)
-        )
-        st.plotly_chart(fig_c, use_container_width=True)
+        with profile.stage("figures"):
+            fig_c = figures.get_or_build(
+                trend.key(key),
+                lambda: trend.apply(
+                    municipality_figure("streamlit-app", store, element, key.selection, years),
+                    store, element, years,
+                ),
+                prebuilt=artifacts.figure,
+            )
+        with profile.stage("plotly_chart"):
+            st.plotly_chart(fig_c, use_container_width=True)
+        parts = cagr_labels(store, element, order, years)
+        if parts:
+            st.caption(f"年平均成長率（{years[0]}–{years[1]}）: " + "、".join(parts))
 
         # テーブル
-        tbl_c = (df_sel.pivot(index="市町村", columns="年", values=element)
-                 .fillna(0).astype(int))
-        st.dataframe(tbl_c.style.format(thousands=","), use_container_width=True)
-else:
-    st.info("市町村を選択するとグラフが表示されます。")
-
-# ---------------------------- 8. エリア定義と出典 ----------------------------
-st.markdown("""---  
-### エリアの内訳  
-- **南部**: 那覇市、糸満市、豊見城市、八重瀬町、南城市、与那原町、南風原町  
-- **中部**: 沖縄市、宜野湾市、浦添市、うるま市、読谷村、嘉手納町、北谷町、北中城村、中城村、西原町  
-- **北部**: 名護市、国頭村、大宜味村、東村、今帰仁村、本部町、恩納村、宜野座村、金武町  
-- **宮古**: 宮古島市、多良間村  
-- **八重山**: 石垣市、竹富町、与那国町  
-- **離島**: 久米島町、渡嘉敷村、座間味村、粟国村、渡名喜村、南大東村、北大東村、伊江村、伊平屋村、伊是名村  
----
+        with profile.stage("pivot"):
+            tbl_c = tables.get_or_build(
+                key, lambda: store.pivot(element, key.selection, years),
+                prebuilt=artifacts.table)
+        with profile.stage("table"):
+            show_table(tbl_c, f"municipality-{element}",
+                       f"市町村_{element}_{years[0]}-{years[1]}")
+
+municipality_section()
+
+# ---------------------------- 9. エリア定義と出典 ----------------------------
+st.markdown("---  \n### エリアの内訳  \n"
+            + "".join(f"- {line}  \n" for line in region_markdown())
+            + """---
 本データは、[沖縄県宿泊施設実態調査](https://www.pref.okinawa.jp/shigoto/kankotokusan/1011671/1011816/1003416/1026290.html) を基に独自に集計・加工したものです。  
 """)
+
+# ---------------------------- 10. デバッグ（?debug=1） ----------------------------
+if profile.enabled:
+    ui.show_profile(profile.finish(app="streamlit-app/app.py"))
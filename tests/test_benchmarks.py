@@ -0,0 +1,33 @@
+import json
+
+from benchmarks import bench_pipeline, load_test
+from benchmarks.synthetic import synthetic_frames
+
+
+def test_synthetic_frames_shape():
+    frames = synthetic_frames(7, 4, start_year=2000)
+    facilities = frames["軒数"]
+    assert list(facilities.columns) == ["市町村", "年", "軒数"]
+    assert len(facilities) == 28
+    assert not facilities.duplicated(["市町村", "年"]).any()
+    assert facilities["年"].is_monotonic_increasing
+
+
+def test_bench_pipeline_writes_json(tmp_path):
+    out = tmp_path / "bench.json"
+    assert bench_pipeline.main(
+        ["--municipalities", "12", "--years", "3", "--repeat", "1", "--out", str(out)]
+    ) == 0
+    report = json.loads(out.read_text(encoding="utf-8"))
+    stages = {(r["stage"], r["series"]) for r in report["results"]}
+    assert ("load_data_warm", None) in stages
+    assert ("figure_build", "all") in stages
+    assert all(r["median_s"] >= 0 for r in report["results"])
+
+
+def test_load_test_runs_concurrent_sessions():
+    report = load_test.run_app("app.py", sessions=2, steps=2, seed=1)
+    assert report["errors"] == 0
+    assert report["reruns"] == 2 + 2 * 2
+    assert 0 < report["rerun"]["p50_ms"] <= report["rerun"]["p99_ms"]
+    assert report["throughput_rps"] > 0
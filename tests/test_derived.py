@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lodging.metrics import fit_trend, step_changes, window_cagr
+from lodging.store import MetricStore
+
+
+def test_step_changes_irregular_gaps():
+    # 隔年調査の区間と欠測年
+    years = np.array([1998, 2000, 2002, 2003, 2004])
+    values = np.array([[100.0, 121.0, 121.0, np.nan, 132.0]])
+    delta, yoy = step_changes(years, values)
+    np.testing.assert_allclose(delta, [[0, 21, 0, 0, 11]])
+    # 2 年で 21% 増 → 年率 10%、2004 年は 2002 年との比較で 2 年分
+    assert np.isnan(yoy[0, 0])
+    assert yoy[0, 1] == pytest.approx(10.0)
+    assert yoy[0, 2] == pytest.approx(0.0)
+    assert np.isnan(yoy[0, 3])
+    assert yoy[0, 4] == pytest.approx((np.sqrt(132 / 121) - 1) * 100)
+
+
+def test_window_cagr():
+    years = np.array([2020, 2021, 2022, 2023])
+    values = np.array([
+        [np.nan, 100.0, 110.0, 121.0],
+        [0.0, 5.0, 5.0, 5.0],
+    ])
+    cagr = window_cagr(years, values, slice(0, 4))
+    assert cagr[0] == pytest.approx(10.0)
+    assert np.isnan(cagr[1])  # 起点 0 は定義できない
+
+
+def test_derived_metrics_from_store():
+    frames = {
+        col: pd.DataFrame({"市町村": ["A", "A"], "年": [2020, 2022], col: v})
+        for col, v in {"軒数": [10, 20], "客室数": [100, 100], "収容人数": [300, 250]}.items()
+    }
+    derived = MetricStore.from_frames(frames).derived
+    np.testing.assert_allclose(derived.delta["軒数"], [[0, 10]])
+    np.testing.assert_allclose(derived.ratios["客室数/軒数"], [[10, 5]])
+    np.testing.assert_allclose(derived.ratios["収容人数/客室数"], [[3, 2.5]])
+    cagr = derived.cagr(2020, 2022)
+    assert cagr["軒数"][0] == pytest.approx((np.sqrt(2) - 1) * 100)
+    assert derived.cagr(2020, 2022) is cagr
+
+
+def test_fit_trend_matches_polyfit_per_series():
+    years = np.array([2018, 2019, 2020, 2021, 2022])
+    values = np.array([
+        [10.0, 12.0, 15.0, 15.0, 19.0],
+        [5.0, np.nan, 9.0, np.nan, 12.0],   # 欠測年は除いて当てはめる
+        [np.nan, np.nan, np.nan, 7.0, np.nan],  # 観測 1 年は当てはめない
+    ])
+    fit = fit_trend(years, values, slice(0, 5))
+    for i in (0, 1):
+        ok = ~np.isnan(values[i])
+        slope, intercept = np.polyfit(years[ok], values[i, ok], 1)
+        assert fit.slope[i] == pytest.approx(slope)
+        np.testing.assert_allclose(fit[i].predict([2025]), [intercept + slope * 2025])
+    assert np.isnan(fit.slope[2]) and fit.n[2] == 1
+    assert np.isnan(fit.predict(years)[2]).all()
+
+
+def test_fit_trend_log_recovers_constant_growth():
+    years = np.arange(2015, 2021)
+    values = np.array([[100.0 * 1.1 ** k for k in range(6)], [0.0, 1, 2, 3, 4, 5]])
+    fit = fit_trend(years, values, slice(0, 6), "log")
+    assert np.exp(fit.slope[0]) == pytest.approx(1.1)
+    assert fit[0].predict([2022])[0] == pytest.approx(100.0 * 1.1 ** 7)
+    assert fit.n[1] == 5  # 0 は対数を取れないので除く
+    with pytest.raises(ValueError):
+        fit_trend(years, values, slice(0, 6), "cubic")
+
+
+def test_derived_trend_is_memoized_per_window():
+    frames = {
+        col: pd.DataFrame({"市町村": ["A"] * 3, "年": [2020, 2021, 2022], col: [10, 20, 30]})
+        for col in ("軒数", "客室数", "収容人数")
+    }
+    derived = MetricStore.from_frames(frames).derived
+    trend = derived.trend(2020, 2022)
+    assert trend["軒数"].slope[0] == pytest.approx(10.0)
+    assert derived.trend(2020, 2022) is trend
+    assert derived.trend(2021, 2022)["軒数"].n[0] == 2
+
+
+def test_derived_change_carries_last_survey_forward():
+    frames = {
+        col: pd.DataFrame({
+            "市町村": ["A", "A", "A", "B", "B"],
+            "年": [2018, 2020, 2022, 2021, 2022],
+            col: [10, 20, 25, 5, 10],
+        })
+        for col in ("軒数", "客室数", "収容人数")
+    }
+    derived = MetricStore.from_frames(frames).derived
+    change = derived.change(2019, 2022)["軒数"]
+    # A の 2019 年は 2018 年の値、B は 2019 年以前に調査が無い
+    np.testing.assert_allclose(change.start, [10, np.nan])
+    np.testing.assert_allclose(change.change, [15, np.nan])
+    assert change.pct[0] == pytest.approx(150.0)
+    assert derived.change(2021, 2022)["軒数"].change[1] == 5
+    assert derived.change(2019, 2022) is derived.change(2019, 2022)
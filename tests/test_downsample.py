@@ -0,0 +1,21 @@
+import numpy as np
+
+from lodging.downsample import lttb_indices
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(100.0)
+    y = np.zeros((2, 100))
+    y[0, 37] = 10.0     # 突出した点は残る
+    y[1, 80] = -5.0
+    idx = lttb_indices(x, y, 10)
+    assert idx.shape == (2, 10)
+    assert (idx[:, 0] == 0).all() and (idx[:, -1] == 99).all()
+    assert (np.diff(idx, axis=1) > 0).all()
+    assert 37 in idx[0] and 80 in idx[1]
+
+
+def test_lttb_returns_all_points_when_under_budget():
+    x = np.arange(5.0)
+    idx = lttb_indices(x, np.arange(5.0), 10)
+    np.testing.assert_array_equal(idx, [[0, 1, 2, 3, 4]])
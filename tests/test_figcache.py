@@ -0,0 +1,42 @@
+import plotly.graph_objects as go
+
+from lodging.figcache import FigureCache, figure_key
+
+
+def test_figure_key_ignores_selection_order():
+    a = figure_key("municipality", "軒数", ["那覇市", "石垣市"], (2007, 2023))
+    b = figure_key("municipality", "軒数", ["石垣市", "那覇市", "石垣市"], (2007, 2023))
+    assert a == b
+    assert a != figure_key("municipality", "軒数", ["那覇市"], (2007, 2023))
+
+
+def test_get_or_build_reuses_json():
+    cache = FigureCache()
+    calls = []
+
+    def build():
+        calls.append(1)
+        return go.Figure(go.Scatter(x=[2020, 2021], y=[1, 2], name="A"))
+
+    first = cache.get_or_build("k", build)
+    second = cache.get_or_build("k", build)
+    assert len(calls) == 1
+    assert first == second
+    assert first["data"][0]["name"] == "A"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_eviction_by_count_and_bytes():
+    cache = FigureCache(max_entries=2, max_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    cache.get("a")
+    cache.put("c", "cccc")  # 件数超過 → 最も古い b を追い出す
+    assert "b" not in cache and "a" in cache and "c" in cache
+
+    cache.put("d", "dddddddd")  # バイト数超過 → a, c を追い出す
+    assert list(cache._entries) == ["d"]
+    assert cache.nbytes == 8
+
+    cache.put("huge", "x" * 11)  # 上限を超える 1 件は載せない
+    assert "huge" not in cache
@@ -0,0 +1,111 @@
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lodging.figures import (
+    add_trend_traces, heatmap_figure, heatmap_matrix, overview_figure, rank_by_last,
+    ranked_figure, selection_figure,
+)
+from lodging.store import MetricStore
+
+
+@pytest.fixture
+def store():
+    frames = {
+        col: pd.DataFrame({
+            "市町村": ["沖縄県", "沖縄県", "A", "A", "B", "B"],
+            "年": [2020, 2021] * 3,
+            col: [30, 40, 10, 12, 20, 28],
+        })
+        for col in ("軒数", "客室数", "収容人数")
+    }
+    return MetricStore.from_frames(frames)
+
+
+def test_core_import_does_not_load_plotly_or_streamlit():
+    code = (
+        "import sys, lodging.figures, lodging.figcache, lodging.store;"
+        "assert 'plotly' not in sys.modules, 'plotly';"
+        "assert 'streamlit' not in sys.modules, 'streamlit'"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_overview_figure(store):
+    fig = overview_figure(store)
+    assert [t.name for t in fig.data] == ["客室数（室）", "収容人数（人）", "軒数（軒）"]
+    assert list(fig.data[2].y) == [30, 40]
+
+
+def test_selection_figure_skips_unknown_names(store):
+    fig = selection_figure(store, "市町村", "軒数", ["A", "missing"], (2020, 2021))
+    assert [t.name for t in fig.data] == ["A"]
+
+
+def test_ranked_figure_orders_by_last_year(store):
+    assert rank_by_last(store, "軒数", ["A", "B"], (2020, 2021)) == ["B", "A"]
+    assert rank_by_last(store, "軒数", ["A", "B"], (2030, 2031)) == []
+    fig = ranked_figure(store, "軒数", ["A", "B"], (2020, 2020))
+    assert [t.name for t in fig.data] == ["B", "A"]
+
+
+def test_add_trend_traces_projects_each_series(store):
+    fig = selection_figure(store, "市町村", "軒数", ["A", "B"], (2020, 2021))
+    add_trend_traces(fig, store, "軒数", (2020, 2021), horizon=3)
+    assert len(fig.data) == 4
+    line_a, trend_a = fig.data[0], fig.data[2]
+    assert trend_a.legendgroup == line_a.legendgroup == "A"
+    assert trend_a.line.color == line_a.line.color and trend_a.line.dash == "dot"
+    assert list(trend_a.x) == [2020, 2021, 2022, 2023, 2024]
+    assert list(trend_a.y) == pytest.approx([10, 12, 14, 16, 18])
+    assert fig.layout.shapes[0].x0 == 2021
+
+
+def test_heatmap_is_one_trace_grouped_by_region(store):
+    fig = heatmap_figure(store, "軒数", "value", ["B", "A", "X"], (2020, 2021),
+                         groups=["南", "北", "東"])
+    assert len(fig.data) == 1
+    (trace,) = fig.data
+    assert trace.type == "heatmap"
+    assert [list(level) for level in trace.y] == [["南", "北"], ["B", "A"]]
+    assert trace.z.tolist() == [[20, 28], [10, 12]]
+
+
+def test_heatmap_delta_masks_first_and_missing_years():
+    df = pd.DataFrame({"市町村": ["A", "A", "A", "B", "B"],
+                       "年": [2019, 2020, 2021, 2019, 2021],
+                       "軒数": [10, 12, 15, 5, 9]})
+    store = MetricStore.from_frames({"軒数": df})
+    names, years, delta = heatmap_matrix(store, "軒数", "delta", ["A", "B"], (2019, 2021))
+    assert names == ["A", "B"] and list(years) == [2019, 2020, 2021]
+    np.testing.assert_array_equal(delta, [[np.nan, 2, 3], [np.nan, np.nan, 4]])
+
+    fig = heatmap_figure(store, "軒数", "delta", ["A", "B"], (2019, 2021))
+    assert fig.data[0].zmid == 0 and fig.data[0].colorscale[0][1] != "Blues"
+    with pytest.raises(ValueError):
+        heatmap_matrix(store, "軒数", "share", ["A"], (2019, 2021))
+
+
+def test_high_cardinality_uses_few_webgl_traces():
+    from benchmarks.synthetic import synthetic_frames
+
+    big = MetricStore.from_frames(synthetic_frames(200, 60, start_year=1960))
+    names = list(big.names)
+    fig = selection_figure(big, "市町村", "軒数", names, (1960, 2019),
+                           point_budget=2_000)
+    assert len(fig.data) == 6
+    assert {t.type for t in fig.data} == {"scattergl"}
+    assert fig.data[-1].name == "その他 195 件"
+    assert sum(len(t.x) for t in fig.data) <= 2_000
+    assert fig.data[-1].text is None and fig.data[-1].customdata[0] == 6
+
+    # 1 系列 3 点でも収まらない → 最終年の値が小さい系列を省く
+    fig = selection_figure(big, "市町村", "軒数", names, (1960, 2019), point_budget=400)
+    assert sum(len(t.x) for t in fig.data) <= 400
+    assert fig.data[-1].name == "その他 95 件（ほか 100 件は点数の上限のため省略）"
+
+    fig = ranked_figure(big, "軒数", names[:10], (1960, 2019))
+    assert len(fig.data) == 10 and fig.data[0].type == "scatter"
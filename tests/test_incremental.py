@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lodging.figcache import FigureCache
+from lodging.incremental import (
+    FullReloadRequired, LiveStore, appended_rows, invalidate_years,
+)
+from lodging.loader import SOURCES
+from lodging.store import MetricStore
+
+
+def frames_for(rows):
+    """rows: (市町村, 年, 軒数, 客室数, 収容人数) のリスト。"""
+    df = pd.DataFrame(rows, columns=["市町村", "年", "軒数", "客室数", "収容人数"])
+    return {col: df[["市町村", "年", col]] for col in SOURCES}
+
+
+BASE = [
+    ("A", 2020, 10, 100, 300), ("B", 2020, 5, 40, 90),
+    ("A", 2021, 12, 110, 320), ("B", 2021, 6, 45, 95),
+]
+NEW = [("A", 2022, 15, 130, 330), ("C", 2022, 1, 8, 20)]
+
+
+def test_extend_matches_full_rebuild():
+    store = MetricStore.from_frames(frames_for(BASE))
+    store.derived  # 計算済みの派生指標を引き継がせる
+    added = appended_rows(store, frames_for(BASE + NEW))
+    assert {col: len(df) for col, df in added.items()} == {c: 2 for c in SOURCES}
+
+    extended = store.extend(added)
+    full = MetricStore.from_frames(frames_for(BASE + NEW))
+    assert extended.names == full.names
+    assert "derived" in extended.__dict__
+    for col in SOURCES:
+        np.testing.assert_array_equal(extended.values[col], full.values[col])
+        np.testing.assert_array_equal(extended.deltas[col], full.deltas[col])
+        np.testing.assert_allclose(extended.derived.yoy[col], full.derived.yoy[col])
+        np.testing.assert_allclose(extended.derived.cumdelta[col],
+                                   full.derived.cumdelta[col])
+        np.testing.assert_array_equal(extended.derived.span[col], full.derived.span[col])
+    for name in full.derived.ratios:
+        np.testing.assert_allclose(extended.derived.ratios[name],
+                                   full.derived.ratios[name])
+
+
+@pytest.mark.parametrize("rows", [
+    [("A", 2020, 11, 100, 300)] + BASE[1:],          # 既存値の修正
+    BASE[:3],                                        # 行の削除
+    BASE + [("C", 2021, 1, 8, 20)],                  # 過去年への追加
+])
+def test_appended_rows_requires_full_reload(rows):
+    store = MetricStore.from_frames(frames_for(BASE))
+    with pytest.raises(FullReloadRequired):
+        appended_rows(store, frames_for(rows))
+
+
+def test_invalidate_years_only_drops_touching_entries():
+    cache = FigureCache()
+    cache.put(("overview",), "{}")
+    cache.put(("municipality", "軒数", ("A",), (2020, 2021)), "{}")
+    cache.put(("municipality", "軒数", ("A",), (2020, 2022)), "{}")
+    assert invalidate_years(cache, 2022) == 2
+    assert list(cache._entries) == [("municipality", "軒数", ("A",), (2020, 2021))]
+
+
+def write_csvs(data_dir, rows):
+    for col, df in frames_for(rows).items():
+        df.to_csv(data_dir / SOURCES[col], index=False, encoding="utf-8-sig")
+
+
+def test_live_store_picks_up_new_year(tmp_path):
+    write_csvs(tmp_path, BASE)
+    live = LiveStore(tmp_path, check_interval=3600)
+    events = []
+    live.subscribe(events.append)
+
+    assert live.refresh(force=True) is live.store  # 変更なし
+    assert live.version == 0
+
+    write_csvs(tmp_path, BASE + NEW)
+    assert live.refresh() is live.store  # 確認間隔内は stat もしない
+    assert live.version == 0
+
+    store = live.refresh(force=True)
+    assert live.version == 1 and events == [2022]
+    assert list(store.years) == [2020, 2021, 2022]
+    assert store.deltas["軒数"][store.row["A"], -1] == 3
+
+    write_csvs(tmp_path, [("A", 2020, 99, 100, 300)] + BASE[1:] + NEW)
+    live.refresh(force=True)
+    assert events == [2022, None]
+    assert live.store.values["軒数"][live.store.row["A"], 0] == 99
+
+
+def test_live_store_keeps_serving_on_schema_error(tmp_path):
+    write_csvs(tmp_path, BASE)
+    live = LiveStore(tmp_path, check_interval=3600, required=["A", "B"])
+    before = live.store
+
+    # (市町村, 年) の重複した CSV に差し替えられても落とさない
+    write_csvs(tmp_path, BASE + [BASE[0]])
+    assert live.refresh(force=True) is before
+    assert "重複" in str(live.error) and live.version == 0
+
+    write_csvs(tmp_path, BASE + NEW)
+    live.refresh(force=True)
+    assert live.error is None and live.version == 1
+
+
+@pytest.mark.parametrize("broken", ["", "市町村,年,軒数\nA,2020,1\nB,20", None])
+def test_live_store_keeps_serving_on_partial_file(tmp_path, broken):
+    write_csvs(tmp_path, BASE)
+    live = LiveStore(tmp_path, check_interval=3600)
+    before = live.store
+
+    # 差し替えの途中（空・途中で切れた行・一時的に無い）でも落とさない
+    path = tmp_path / SOURCES["軒数"]
+    if broken is None:
+        path.unlink()
+    else:
+        path.write_text(broken, encoding="utf-8")
+    assert live.refresh(force=True) is before
+    assert live.error is not None and live.version == 0
+
+    write_csvs(tmp_path, BASE + NEW)
+    live.refresh(force=True)
+    assert live.error is None and live.version == 1
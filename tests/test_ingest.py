@@ -0,0 +1,107 @@
+import pandas as pd
+import pytest
+
+from lodging import loader
+from lodging.ingest import ingest, normalize_name, parse_file, survey_year
+from lodging.regions import REGIONS
+from lodging.schema import SchemaError
+
+
+def write_raw(path, rows, encoding="utf-8"):
+    """見出しの前に表題行がある、調査資料を書き出した形の CSV。"""
+    table = [["宿泊施設実態調査", "", "", ""], ["市町村名", "施設数（軒）", "客室数", "収容人員（人）"]]
+    pd.DataFrame(table + rows).to_csv(path, header=False, index=False, encoding=encoding)
+
+
+def all_municipalities(value):
+    return [[m, value, value * 10, value * 20] for ms in REGIONS.values() for m in ms]
+
+
+@pytest.mark.parametrize("name, year", [
+    ("2023.csv", 2023), ("宿泊施設_2019年.xlsx", 2019), ("令和5年.csv", 2023),
+    ("令和元年.csv", 2019), ("H30.xlsx", 2018), ("平成１４年.csv", 2002), ("data.csv", None),
+])
+def test_survey_year(name, year):
+    assert survey_year(name) == year
+
+
+def test_normalize_name():
+    assert normalize_name("那 覇　市") == "那覇市"
+    assert normalize_name("石垣市※1") == "石垣市"
+    assert normalize_name("竹富町（注）") == "竹富町"
+    assert normalize_name("平良市") == "宮古島市"  # 合併前の名前
+    for total in ("合計", "南部計", "南部", "沖縄県", "", None):
+        assert normalize_name(total) is None
+
+
+def test_parse_file_sums_merged_municipalities(tmp_path):
+    path = tmp_path / "H16.csv"
+    write_raw(path, [
+        ["那覇市", "1,200", "－", "300"], ["平良市", 10, 20, 40],
+        ["伊良部町", 2, 4, 8], ["合計", 1212, 24, 348],
+    ], encoding="cp932")
+    df, problems = parse_file(path)
+    assert problems == []
+    assert df.set_index("市町村").loc["宮古島市"].tolist() == [2004, 12, 24, 48]
+    assert df.set_index("市町村").loc["那覇市", "客室数"] == 0
+
+
+def test_parse_file_reads_xlsx(tmp_path):
+    pytest.importorskip("openpyxl")
+    path = tmp_path / "令和4年.xlsx"
+    table = [["宿泊施設実態調査", None, None, None],
+             ["市町村名", "施設数（軒）", "客室数", "収容人員（人）"],
+             ["那覇市", 1200, "－", 300], ["石垣市 ※1", 10, 20, 40], ["合計", 1210, 20, 340]]
+    pd.DataFrame(table).to_excel(path, header=False, index=False, sheet_name="R4")
+    df, problems = parse_file(path)
+    assert problems == []
+    assert df.to_dict("list") == {
+        "市町村": ["那覇市", "石垣市"], "年": [2022, 2022],
+        "軒数": [1200, 10], "客室数": [0, 20], "収容人数": [300, 40],
+    }
+
+
+def test_parse_file_reports_problems(tmp_path):
+    path = tmp_path / "2020.csv"
+    write_raw(path, [["那覇市", 1, 2, 3], ["那覇市", 1, 2, 3], ["架空村", 1, 2, 3],
+                     ["糸満市", "?", 2, 3]])
+    _, problems = parse_file(path)
+    assert [p.message for p in problems] == [
+        "同じ市町村の行が複数あります: 那覇市",
+        "エリア定義に無い市町村名です: 架空村",
+        "数値を読めない行があります: 糸満市",
+    ]
+
+
+def test_ingest_derives_totals_and_warms_cache(tmp_path):
+    src, dest = tmp_path / "raw", tmp_path / "out"
+    src.mkdir()
+    write_raw(src / "2022.csv", all_municipalities(1))
+    write_raw(src / "令和5年.csv", all_municipalities(2))
+
+    written = ingest(src, dest, workers=0)
+    assert [p.name for p in written] == [*loader.SOURCES.values(), loader.TOTALS_FILE]
+
+    facilities, rooms, _ = loader.load_frames(dest, required=REGIONS["南部"])
+    n = sum(len(ms) for ms in REGIONS.values())
+    assert loader.ARROW_CACHE.hits  # ingest が作ったキャッシュを使う
+    pref = facilities[facilities["市町村"] == "沖縄県"]
+    assert pref["年"].tolist() == [2022, 2023] and pref["軒数"].tolist() == [n, 2 * n]
+    south = rooms[(rooms["市町村"] == "南部") & (rooms["年"] == 2023)]
+    assert south["客室数"].tolist() == [20 * len(REGIONS["南部"])]
+
+    totals = loader.load_totals(dest)
+    assert totals.to_dict("list") == {
+        "年": [2022, 2023], "軒数": [n, 2 * n], "客室数": [10 * n, 20 * n],
+        "収容人数": [20 * n, 40 * n],
+    }
+
+
+def test_ingest_fails_before_writing(tmp_path):
+    src, dest = tmp_path / "raw", tmp_path / "out"
+    src.mkdir()
+    write_raw(src / "2023.csv", all_municipalities(1))
+    write_raw(src / "令和5年.csv", all_municipalities(1))
+    with pytest.raises(SchemaError, match="2023 年のファイルが複数あります"):
+        ingest(src, dest, workers=0)
+    assert not dest.exists()
@@ -0,0 +1,106 @@
+import os
+
+import pandas as pd
+import pytest
+
+from lodging import loader
+
+
+def write_sources(data_dir, facilities=(10, 12)):
+    rows = {
+        "facilities_long.csv": ("軒数", facilities),
+        "rooms_long.csv": ("客室数", (100, 120)),
+        "capacity_long.csv": ("収容人数", (200, 240)),
+    }
+    for fname, (col, values) in rows.items():
+        df = pd.DataFrame({"市町村": ["A", "A"], "年": [2020, 2021], col: values})
+        # 実データと同じく BOM 付き UTF-8 で書く
+        df.to_csv(data_dir / fname, index=False, encoding="utf-8-sig")
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    write_sources(tmp_path)
+    return tmp_path
+
+
+def test_load_frames_builds_cache(data_dir):
+    facilities, rooms, capacity = loader.load_frames(data_dir)
+    assert list(facilities.columns) == ["市町村", "年", "軒数"]
+    assert list(rooms["客室数"]) == [100, 120]
+    assert facilities["市町村"].dtype == "category"
+    assert (facilities["年"].dtype, facilities["軒数"].dtype) == ("int16", "int32")
+    assert (data_dir / loader.CACHE_DIR / loader.CACHE_FILE).exists()
+
+
+def test_load_frames_reuses_cache(data_dir, monkeypatch):
+    loader.load_frames(data_dir)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("CSV should not be parsed on a cache hit")
+
+    monkeypatch.setattr(loader.pd, "read_csv", fail)
+    hits = loader.ARROW_CACHE.hits
+    facilities, _, _ = loader.load_frames(data_dir)
+    assert list(facilities["軒数"]) == [10, 12]
+    assert loader.ARROW_CACHE.hits == hits + 1
+
+    # mtime だけ変わってもハッシュが同じならキャッシュを使う
+    path = data_dir / "facilities_long.csv"
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    facilities, _, _ = loader.load_frames(data_dir)
+    assert list(facilities["軒数"]) == [10, 12]
+
+
+def test_load_frames_invalidates_on_change(data_dir):
+    loader.load_frames(data_dir)
+    write_sources(data_dir, facilities=(10, 15))
+    facilities, _, _ = loader.load_frames(data_dir)
+    assert list(facilities["軒数"]) == [10, 15]
+
+
+def test_load_frames_skips_cache_when_csv_replaced_mid_read(data_dir, monkeypatch):
+    read_csv = pd.read_csv
+    replaced = []
+
+    def replace_during_read(*args, **kwargs):
+        # 1 つ目のファイルを解析している間に差し替えられる
+        if not replaced:
+            replaced.append(1)
+            write_sources(data_dir, facilities=(10, 9474))
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(loader.pd, "read_csv", replace_during_read)
+    facilities, _, _ = loader.load_frames(data_dir)
+    assert list(facilities["軒数"]) == [10, 12]   # 解析したのは差し替え前
+    assert not (data_dir / loader.CACHE_DIR / loader.CACHE_FILE).exists()
+
+    monkeypatch.setattr(loader.pd, "read_csv", read_csv)
+    facilities, _, _ = loader.load_frames(data_dir)
+    assert list(facilities["軒数"]) == [10, 9474]
+
+
+def test_cache_keeps_schema_dtypes_with_gaps(data_dir):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    # 客室数だけ 2022 年がある → 横に並べると軒数・収容人数が欠ける
+    df = pd.DataFrame({"市町村": ["A"] * 3, "年": [2020, 2021, 2022], "客室数": [100, 120, 130]})
+    df.to_csv(data_dir / "rooms_long.csv", index=False, encoding="utf-8-sig")
+    facilities, rooms, _ = loader.load_frames(data_dir)
+
+    schema = feather.read_table(str(data_dir / loader.CACHE_DIR / loader.CACHE_FILE)).schema
+    assert schema.field("年").type == pa.int16()
+    assert all(schema.field(m).type == pa.int32() for m in loader.SOURCES)
+    assert (len(facilities), len(rooms)) == (2, 3)
+    assert facilities["軒数"].dtype == "int32"
+
+    # mtime だけ変わって指紋を書き直しても型は変わらない
+    path = data_dir / "facilities_long.csv"
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    facilities, _, _ = loader.load_frames(data_dir)
+    schema = feather.read_table(str(data_dir / loader.CACHE_DIR / loader.CACHE_FILE)).schema
+    assert all(schema.field(m).type == pa.int32() for m in loader.SOURCES)
+    assert list(facilities["軒数"]) == [10, 12] and facilities["軒数"].dtype == "int32"
@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_frames
+from lodging.partitions import PartitionedDataset, partition_path, write_partitions
+from lodging.schema import SchemaError
+
+
+@pytest.fixture
+def root(tmp_path):
+    for i, pref in enumerate(["A県", "B県", "C県"]):
+        write_partitions(tmp_path, pref, synthetic_frames(5 + i, 4, seed=i))
+    return tmp_path
+
+
+def test_layout_and_listing(root):
+    assert partition_path(root, "A県", "軒数").exists()
+    ds = PartitionedDataset(root)
+    assert ds.prefectures() == ["A県", "B県", "C県"]
+    assert ds.metrics("B県") == ["軒数", "客室数", "収容人数"]
+    facilities, rooms = ds.load_data("B県", ["軒数", "客室数"])
+    assert list(facilities.columns) == ["市町村", "年", "軒数"]
+    assert len(rooms) == 6 * 4
+    with pytest.raises(FileNotFoundError):
+        ds.load_data("D県")
+
+
+def test_store_lru_eviction(root):
+    ds = PartitionedDataset(root, max_prefectures=2)
+    a = ds.store("A県")
+    assert ds.store("A県") is a
+    ds.store("B県")
+    ds.store("A県")          # A を最近使ったことにする
+    ds.store("C県")          # → 最も使われていない B を捨てる
+    assert ds.loaded() == ["A県", "C県"]
+    # 派生指標も含めて数える
+    assert ds.nbytes == ds.store("A県").nbytes + ds.store("C県").nbytes
+    assert ds.nbytes > sum(
+        m.nbytes for s in (ds.store("A県"), ds.store("C県")) for m in s.values.values()
+    )
+
+
+def test_store_byte_budget(root):
+    one = PartitionedDataset(root).store("A県")
+    budget = sum(m.nbytes for m in one.values.values())
+    ds = PartitionedDataset(root, max_bytes=budget)
+    ds.store("A県")
+    ds.store("B県")          # 直前の 1 件は上限を超えても残す
+    assert ds.loaded() == ["B県"]
+
+
+def test_store_checks_schema_and_missing_metrics(root):
+    ds = PartitionedDataset(root)
+    store = ds.store("A県")
+    assert store.names
+    with pytest.raises(SchemaError, match="エリア定義の市町村"):
+        PartitionedDataset(root).store("A県", required=["どこにもない村"])
+
+    # 指標のファイルが無いディレクトリ
+    (root / "prefecture=D県").mkdir()
+    with pytest.raises(SchemaError, match="パーティションがありません"):
+        ds.store("D県")
+
+    # 手で書いた重複のあるパーティション
+    frames = synthetic_frames(3, 2, seed=9)
+    frames["軒数"] = pd.concat([frames["軒数"], frames["軒数"].iloc[:1]])
+    write_partitions(root, "E県", frames)
+    with pytest.raises(SchemaError, match="重複"):
+        ds.store("E県")
+
+
+def test_store_reports_corrupt_partition(root):
+    # 書きかけで途中までしかないファイル
+    path = partition_path(root, "B県", "客室数")
+    path.write_bytes(path.read_bytes()[:100])
+    with pytest.raises(SchemaError, match=r"prefecture=B県/metric=客室数\.arrow"):
+        PartitionedDataset(root).store("B県")
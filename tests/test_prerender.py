@@ -0,0 +1,81 @@
+import json
+
+import pandas as pd
+import plotly.io as pio
+import pytest
+
+from lodging import prerender
+from lodging.figcache import FigureCache, figure_key
+from lodging.prerender import ArtifactStore, municipality_figure
+from lodging.regions import PREFECTURE
+from lodging.store import load_store
+from lodging.tables import TableCache
+
+
+@pytest.fixture
+def src(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    for fname, col, scale in (("facilities_long.csv", "軒数", 1),
+                              ("rooms_long.csv", "客室数", 10),
+                              ("capacity_long.csv", "収容人数", 20)):
+        pd.DataFrame({
+            "市町村": ["A", "B"] * 3,
+            "年": [2021, 2021, 2022, 2022, 2023, 2023],
+            col: [v * scale for v in (10, 5, 12, 6, 15, 8)],
+        }).to_csv(data / fname, index=False, encoding="utf-8-sig")
+    return data
+
+
+def test_build_writes_versioned_artifacts(src, tmp_path):
+    dest = tmp_path / "artifacts"
+    final = prerender.build(src, dest, flavors=["app"], workers=0)
+
+    assert (dest / prerender.CURRENT).read_text().strip() == final.name
+    manifest = json.loads((final / prerender.MANIFEST).read_text(encoding="utf-8"))
+    # (A, B, A+B) × 3 指標。期間は既定・全期間・直近とも 2021–2023 の 1 通りで、
+    # 県合計の行が無いので県全体の図は作らない
+    assert manifest["flavors"]["app"] == {"figures": 9, "tables": 9}
+
+    store = load_store(src)
+    artifacts = ArtifactStore.open(dest, "app", store.fingerprint)
+    assert artifacts and artifacts.version == final.name
+
+    key = figure_key("municipality", "客室数", ["B", "A"], (2021, 2023), scope=PREFECTURE)
+    live = municipality_figure("app", store, "客室数", key.selection, (2021, 2023))
+    assert artifacts.figure(key) == pio.to_json(live, validate=False)
+
+    table = artifacts.table(key)
+    expected = store.pivot("客室数", key.selection, (2021, 2023))
+    expected.columns = expected.columns.map(str)
+    pd.testing.assert_frame_equal(table, expected, check_names=False)
+
+    missing = figure_key("municipality", "客室数", ["A"], (2022, 2023), scope=PREFECTURE)
+    assert artifacts.figure(missing) is None
+    assert (artifacts.stats.hits, artifacts.stats.misses) == (2, 1)
+
+
+def test_caches_serve_prebuilt_before_building(src, tmp_path):
+    dest = tmp_path / "artifacts"
+    prerender.build(src, dest, flavors=["app"], workers=0)
+    artifacts = ArtifactStore.open(dest, "app", load_store(src).fingerprint)
+    key = figure_key("municipality", "軒数", ["A"], (2021, 2023), scope=PREFECTURE)
+
+    def fail():
+        raise AssertionError("should be served from artifacts")
+
+    fig = FigureCache().get_or_build(key, fail, prebuilt=artifacts.figure)
+    assert fig["data"][0]["name"] == "A"
+    assert list(TableCache().get_or_build(key, fail, prebuilt=artifacts.table).index) == ["A"]
+
+
+def test_stale_or_missing_artifacts_are_ignored(src, tmp_path):
+    dest = tmp_path / "artifacts"
+    assert not ArtifactStore.open(dest, "app", "x")
+    prerender.build(src, dest, flavors=["app"], workers=0, keep=1)
+    stale = ArtifactStore.open(dest, "app", "other-data")
+    assert not stale
+    assert stale.figure(figure_key("municipality", "軒数", ["A"], (2021, 2023))) is None
+
+    prerender.build(src, dest, flavors=["app"], workers=0, keep=1)
+    assert len([p for p in dest.iterdir() if p.is_dir()]) == 1
@@ -0,0 +1,84 @@
+import json
+import tracemalloc
+
+import pytest
+
+from lodging import profiling
+from lodging.profiling import CacheStats, RerunProfile, append_jsonl
+
+
+def test_stages_accumulate_and_counters_are_deltas(tmp_path):
+    stats = CacheStats(hits=5, misses=2)
+    profile = RerunProfile(trace_memory=True)
+    profile.watch("figures", stats)
+    for _ in range(2):
+        with profile.stage("figures"):
+            stats.hit()
+    stats.miss()
+    with profile.stage("pivot"):
+        data = list(range(10_000))
+
+    record = profile.finish(app="test")
+    assert set(record["stages_s"]) == {"figures", "pivot"}
+    assert record["caches"] == {"figures": {"hits": 2, "misses": 1}}
+    assert record["peak_memory_bytes"] > 0
+    assert record["app"] == "test"
+    assert not tracemalloc.is_tracing()
+    del data
+
+    path = tmp_path / "profile.jsonl"
+    append_jsonl(path, record)
+    append_jsonl(path, record)
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["caches"] for line in lines] == [record["caches"]] * 2
+
+
+def test_disabled_profile_records_nothing():
+    profile = RerunProfile(enabled=False)
+    profile.watch("figures", CacheStats())
+    with profile.stage("load_data"):
+        pass
+    record = profile.finish()
+    assert record["stages_s"] == {} and record["caches"] == {}
+    assert "peak_memory_bytes" not in record
+
+
+def test_tracing_stops_when_a_stage_is_cut_short():
+    profile = RerunProfile()
+    assert not tracemalloc.is_tracing()
+    # st.stop() / st.rerun() は例外で再実行を打ち切る。finish() は呼ばれない
+    with pytest.raises(RuntimeError):
+        with profile.stage("load_data"):
+            with profile.stage("regions"):
+                assert tracemalloc.is_tracing()
+                data = list(range(10_000))
+            raise RuntimeError("stop")
+    assert not tracemalloc.is_tracing()
+    assert profiling._tracemalloc_users == 0
+    assert profile.peak_memory > 0
+    del data
+
+    # 余分に止めても利用者数は負にならない
+    assert profiling._stop_tracing() == 0
+    assert profiling._tracemalloc_users == 0
+
+
+def test_restart_measures_a_new_run():
+    stats = CacheStats()
+    profile = RerunProfile()
+    profile.watch("figures", stats)
+    with profile.stage("figures"):
+        stats.miss()
+    assert not profile.finished
+    profile.finish()
+    assert profile.finished
+
+    # フラグメントだけの再実行
+    profile.restart()
+    assert not profile.finished
+    with profile.stage("table"):
+        stats.hit()
+    record = profile.finish(fragment="table_section")
+    assert set(record["stages_s"]) == {"table"}
+    assert record["caches"] == {"figures": {"hits": 1, "misses": 0}}
+    assert record["fragment"] == "table_section"
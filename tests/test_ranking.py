@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lodging.ranking import leaderboard, top_n
+from lodging.store import MetricStore
+
+
+@pytest.fixture
+def store():
+    frames = {
+        col: pd.DataFrame({
+            "市町村": ["沖縄県", "沖縄県", "A", "A", "B", "B", "C", "C", "D"],
+            "年": [2020, 2022, 2020, 2022, 2020, 2022, 2020, 2022, 2022],
+            col: [100, 160, 10, 40, 50, 60, 40, 20, 5],
+        })
+        for col in ("軒数", "客室数", "収容人数")
+    }
+    return MetricStore.from_frames(frames)
+
+
+def test_top_n_matches_full_sort():
+    rng = np.random.default_rng(0)
+    scores = rng.normal(size=1000)
+    scores[rng.choice(1000, 50, replace=False)] = np.nan
+    order = np.argsort(-np.nan_to_num(scores, nan=-np.inf))
+    np.testing.assert_array_equal(top_n(scores, 10), order[:10])
+    np.testing.assert_array_equal(top_n(scores, 10, largest=False),
+                                  np.argsort(np.nan_to_num(scores, nan=np.inf))[:10])
+    assert len(top_n(scores, 5000)) == 950
+    assert len(top_n(np.array([np.nan]), 3)) == 0
+
+
+def test_leaderboard_by_change_and_pct(store):
+    names = ["A", "B", "C", "D"]
+    board = leaderboard(store, "軒数", (2020, 2022), n=2, names=names)
+    assert list(board.index) == ["A", "B"]
+    assert list(board.columns) == ["順位", "2020年", "2022年", "増減数", "増減率"]
+    assert board.loc["A", "増減数"] == 30 and board.loc["A", "増減率"] == pytest.approx(300)
+
+    worst = leaderboard(store, "軒数", (2020, 2022), n=10, by="pct", largest=False,
+                        names=names)
+    # D は 2020 年以前に調査が無いので順位を付けない
+    assert list(worst.index) == ["C", "B", "A"]
+    assert list(worst["順位"]) == [1, 2, 3]
+    # names を省略すると県合計も含む
+    assert leaderboard(store, "軒数", (2020, 2022), n=1).index[0] == "沖縄県"
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lodging.regions import PREFECTURE, REGIONS, RegionIndex, municipality_names
+from lodging.store import MetricStore, load_store
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def index():
+    return RegionIndex.build({"北": ("a", "b"), "南": ("c",)}, prefecture="県")
+
+
+def make_store(rows):
+    df = pd.DataFrame(rows, columns=["市町村", "年", "軒数"])
+    return MetricStore.from_frames({"軒数": df})
+
+
+def test_hierarchy_codes(index):
+    assert index.municipalities == ("a", "b", "c")
+    assert list(index.region_code) == [0, 0, 1]
+    assert index.members("北") == ("a", "b")
+    assert index.members("南") == ("c",)
+    assert index.region_of("c") == "南"
+
+
+def test_rollup_and_verify(index):
+    store = make_store([
+        ("a", 2020, 1), ("b", 2020, 2), ("c", 2020, 4),
+        ("a", 2021, 3), ("c", 2021, 5),          # b は 2021 年欠測
+        ("北", 2020, 3), ("北", 2021, 9),         # 2021 年は食い違い
+        ("県", 2020, 7),
+    ])
+    rollup = index.rollup(store)
+    assert rollup.names == ("北", "南", "県")
+    np.testing.assert_array_equal(rollup.values["軒数"], [[3, 3], [4, 5], [7, 8]])
+
+    mismatches = index.verify(store, rollup)
+    # 県の 2021 年は CSV 側が欠測なので不一致として報告される
+    assert [(m.name, m.year) for m in mismatches] == [("北", 2021), ("県", 2021)]
+    assert (mismatches[0].expected, mismatches[0].actual) == (9.0, 3.0)
+
+
+def test_rollup_nan_when_region_unobserved(index):
+    store = make_store([("a", 2020, 1), ("c", 2021, 2)])
+    rollup = index.rollup(store)
+    vals = rollup.values["軒数"]
+    assert np.isnan(vals[rollup.row["南"], 0])
+    assert vals[rollup.row["北"], 0] == 1
+    assert index.missing(store) == ["b"]
+
+
+def test_grouped_orders_by_region_and_skips_missing(index):
+    store = make_store([("c", 2020, 1), ("a", 2020, 2)])
+    assert index.grouped(store) == (["北", "南"], ["a", "c"])
+
+
+def test_duplicate_municipality_rejected():
+    with pytest.raises(ValueError):
+        RegionIndex.build({"北": ("a",), "南": ("a",)})
+
+
+def test_bundled_csv_region_rows_match_rollup():
+    store = load_store(ROOT)
+    index = RegionIndex.build()
+    assert index.missing(store) == []
+    assert index.verify(store, index.rollup(store)) == []
+    assert sorted(municipality_names(store.names)) == sorted(index.municipalities)
+    assert set(REGIONS) | {PREFECTURE} <= set(store.names)
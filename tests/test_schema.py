@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lodging import loader
+from lodging.schema import SchemaError, check_coverage, conform, conform_totals, validate
+
+
+def frame(col, rows):
+    return pd.DataFrame(rows, columns=["市町村", "年", col])
+
+
+def test_conform_uses_compact_shared_dtypes():
+    frames = conform({
+        "軒数": frame("軒数", [("那覇市", 2020, 10), ("糸満市", 2020, 5)]),
+        "客室数": frame("客室数", [(" 那覇市", 2020, 100)]),  # 前後の空白は落とす
+    })
+    facilities, rooms = frames["軒数"], frames["客室数"]
+    assert facilities["市町村"].dtype == "category"
+    assert facilities["年"].dtype == np.int16 and facilities["軒数"].dtype == np.int32
+    assert list(rooms["市町村"]) == ["那覇市"]
+    # 全指標で同じカテゴリなので結合しても category のまま
+    assert facilities["市町村"].dtype == rooms["市町村"].dtype
+    assert facilities.merge(rooms, on=["市町村", "年"])["市町村"].dtype == "category"
+
+
+def test_validate_reports_every_problem():
+    frames = {
+        "軒数": frame("軒数", [
+            ("那覇市", 2020, 10), ("那覇市", 2020, 11), ("", 2020, 1),
+            ("糸満市", "2020年", 3), ("豊見城市", 2021, 2.5), ("南城市", 2021, -1),
+        ]),
+        "客室数": pd.DataFrame({"市町村": ["那覇市"], "年": [2020]}),
+    }
+    problems = validate(frames, sources={"軒数": "facilities_long.csv"})
+    assert [str(p) for p in problems] == [
+        "facilities_long.csv: 市町村が空です（4 行目）",
+        "facilities_long.csv: 年が整数ではありません（5 行目）",
+        "facilities_long.csv: 軒数が 0 以上の整数ではありません（6 行目、7 行目）",
+        "facilities_long.csv: (市町村, 年) が重複しています: 那覇市 2020 年（2 行）",
+        "客室数: 列がありません: 客室数",
+    ]
+    with pytest.raises(SchemaError, match="5 件の問題") as err:
+        conform(frames)
+    assert err.value.problems == validate(frames)
+
+
+def test_check_coverage():
+    frames = {"軒数": frame("軒数", [("那覇市", 2020, 1)])}
+    check_coverage(frames, ["那覇市"])
+    with pytest.raises(SchemaError, match="エリア定義の市町村がありません: 糸満市"):
+        check_coverage(frames, ["那覇市", "糸満市"])
+
+
+def test_load_frames_fails_fast_on_duplicates(tmp_path):
+    for col, fname in loader.SOURCES.items():
+        frame(col, [("A", 2020, 1), ("A", 2020, 2)]).to_csv(
+            tmp_path / fname, index=False, encoding="utf-8-sig")
+    with pytest.raises(SchemaError) as err:
+        loader.load_frames(tmp_path)
+    assert len(err.value.problems) == 3
+    assert "facilities_long.csv: (市町村, 年) が重複しています: A 2020 年（2 行）" in str(err.value)
+
+
+def test_conform_totals():
+    df = pd.DataFrame({"年": [2021, 2020], "軒数": [2, 1]})
+    out = conform_totals(df, ["軒数"])
+    assert out["年"].tolist() == [2020, 2021] and out["軒数"].dtype == np.int32
+    with pytest.raises(SchemaError, match="年が重複しています: 2020"):
+        conform_totals(pd.DataFrame({"年": [2020, 2020], "軒数": [1, 1]}), ["軒数"])
+    with pytest.raises(SchemaError, match="列がありません: 客室数"):
+        conform_totals(df, ["軒数", "客室数"])
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lodging.store import MetricStore
+
+
+@pytest.fixture
+def store():
+    # 年の並びがばらばらでも行列は年昇順になる
+    facilities = pd.DataFrame({
+        "市町村": ["A", "B", "A", "B", "A"],
+        "年": [2021, 2020, 2020, 2021, 2022],
+        "軒数": [12, 8, 10, 9, 15],
+    })
+    return MetricStore.from_frames({"軒数": facilities})
+
+
+def test_matrix_layout(store):
+    assert store.names == ("A", "B")
+    assert list(store.years) == [2020, 2021, 2022]
+    np.testing.assert_array_equal(
+        store.values["軒数"], [[10, 12, 15], [8, 9, np.nan]]
+    )
+    np.testing.assert_array_equal(store.deltas["軒数"], [[0, 2, 3], [0, 1, 0]])
+
+
+def test_series_is_a_view(store):
+    x, y = store.series("軒数", "A", (2021, 2022))
+    assert list(x) == [2021, 2022]
+    assert list(y) == [12, 15]
+    assert np.shares_memory(y, store.values["軒数"])
+    # 欠損年は除かれる
+    x, y = store.series("軒数", "B", (2020, 2022))
+    assert list(x) == [2020, 2021]
+
+
+def test_pivot(store):
+    tbl = store.pivot("軒数", ["B", "A", "unknown"], (2020, 2021))
+    assert list(tbl.index) == ["A", "B"]
+    assert tbl.loc["B", 2021] == 9
+    assert tbl.dtypes.unique().tolist() == [np.int32]
+
+
+def test_year_table_drops_missing_years(store):
+    tbl = store.year_table("B")
+    assert tbl.to_dict("list") == {"年": [2020, 2021], "軒数": [8, 9]}
+
+
+def test_values_share_one_compact_readonly_array():
+    a = pd.DataFrame({"市町村": ["A", "A"], "年": [2020, 2021], "軒数": [10, 12]})
+    b = a.rename(columns={"軒数": "客室数"}).assign(客室数=[100, 130])
+    store = MetricStore.from_frames({"軒数": a, "客室数": b}).precompute()
+
+    cube = store.stacked()
+    assert cube.dtype == np.float32 and cube.shape == (2, 1, 2)
+    assert all(np.shares_memory(cube, m) for m in store.values.values())
+    # 派生指標も同じ配列から計算し、コピーを持たない
+    assert store.derived.stacked is cube
+    assert store.deltas["客室数"].dtype == np.float32
+    assert store.deltas["客室数"].tolist() == [[0, 30]]
+    with pytest.raises(ValueError):
+        store.values["軒数"][0, 0] = 1
+    with pytest.raises(ValueError):
+        store.deltas["軒数"][0, 0] = 1
+
+    grown = store.extend({"軒数": pd.DataFrame({"市町村": ["A"], "年": [2022], "軒数": [15]})})
+    assert grown.stacked().dtype == np.float32
+    assert np.shares_memory(grown.stacked(), grown.values["客室数"])
@@ -0,0 +1,68 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from lodging.figcache import figure_key
+from lodging.tables import (
+    TableCache, page, page_count, to_csv_bytes, to_parquet_bytes,
+)
+
+
+def pivot(rows: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        np.arange(rows * 3, dtype=np.int64).reshape(rows, 3),
+        index=pd.Index([f"m{i:03d}" for i in range(rows)], name="市町村"),
+        columns=pd.Index([2021, 2022, 2023], name="年"),
+    )
+
+
+def test_get_or_build_builds_once_with_string_columns():
+    cache = TableCache()
+    key = figure_key("municipality", "軒数", ["m001", "m000"], (2021, 2023))
+    calls = []
+
+    def build():
+        calls.append(1)
+        return pivot(2)
+
+    first = cache.get_or_build(key, build)
+    second = cache.get_or_build(key, build)
+    assert len(calls) == 1
+    assert first is second
+    assert list(first.columns) == ["2021", "2022", "2023"]
+    assert first.columns.name == "年"
+    assert cache.nbytes == first.memory_usage(index=True, deep=True).sum()
+
+
+def test_get_or_build_leaves_the_built_frame_alone():
+    built = pivot(2)
+    table = TableCache().get_or_build("key", lambda: built)
+    assert list(built.columns) == [2021, 2022, 2023]
+    assert list(table.columns) == ["2021", "2022", "2023"]
+
+
+def test_lru_counts_frame_bytes():
+    small = pivot(2)
+    cache = TableCache(max_bytes=int(small.memory_usage(deep=True).sum()) * 2)
+    cache.get_or_build("a", lambda: pivot(2))
+    cache.get_or_build("b", lambda: pivot(2))
+    cache.get_or_build("c", lambda: pivot(2))
+    assert "a" not in cache and "c" in cache
+
+
+def test_page_clamps_to_range():
+    tbl = pivot(250)
+    assert page_count(tbl, 100) == 3
+    assert page_count(pivot(0), 100) == 1
+    assert list(page(tbl, 3, 100).index[[0, -1]]) == ["m200", "m249"]
+    assert page(tbl, 9, 100).index[0] == "m200"
+    assert page(tbl, 0, 100).index[0] == "m000"
+
+
+def test_downloads_roundtrip():
+    tbl = pivot(3)
+    tbl.columns = tbl.columns.map(str)
+    assert to_csv_bytes(tbl).startswith("\ufeff市町村,2021".encode("utf-8"))
+    back = pd.read_parquet(io.BytesIO(to_parquet_bytes(tbl)))
+    pd.testing.assert_frame_equal(back, tbl)
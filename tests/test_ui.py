@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import pandas as pd
+
+from lodging.figcache import figure_key
+from lodging.figures import selection_figure
+from lodging.store import MetricStore
+from lodging import ui
+from lodging.ui import TrendOverlay
+
+
+def make_store():
+    df = pd.DataFrame({"市町村": ["A"] * 4, "年": [2020, 2021, 2022, 2023],
+                       "軒数": [10, 12, 14, 16]})
+    return MetricStore.from_frames({"軒数": df})
+
+
+def test_trend_overlay_keys_and_traces():
+    store = make_store()
+    key = figure_key("municipality", "軒数", ["A"], (2020, 2023))
+    off, linear = TrendOverlay(), TrendOverlay("linear", 3)
+    assert off.key(key) == key
+    assert linear.key(key).kind == "municipality+linear3"
+    assert linear.key(key)._replace(kind=key.kind) == key
+
+    fig = selection_figure(store, "市町村", "軒数", ["A"], (2020, 2023))
+    assert off.apply(fig, store, "軒数", (2020, 2023)) is fig and len(fig.data) == 1
+    linear.apply(fig, store, "軒数", (2020, 2023))
+    assert len(fig.data) > 1
+
+
+def test_add_to_selection_adds_only_newly_picked_rows(monkeypatch):
+    state = {"municipalities-X": ["B"]}
+    monkeypatch.setattr(ui.st, "session_state", state)
+    names = ["A", "B", "C"]
+
+    state["board"] = SimpleNamespace(selection=SimpleNamespace(rows=[0, 1]))
+    ui.add_to_selection("board", "municipalities-X", names)
+    assert state["municipalities-X"] == ["B", "A"]
+    assert state.pop("board-added")
+
+    # 選んだままの A を選択から外しても、次に C を選んだときに戻さない
+    state["municipalities-X"] = ["B"]
+    state["board"] = SimpleNamespace(selection=SimpleNamespace(rows=[0, 1, 2]))
+    ui.add_to_selection("board", "municipalities-X", names)
+    assert state["municipalities-X"] == ["B", "C"]